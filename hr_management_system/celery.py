@@ -1,6 +1,7 @@
 # Import the necessary libraries.
 import os
 from celery import Celery
+from celery.signals import worker_init, worker_process_init
 
 # --- Django Integration ---
 # This line is crucial for Celery to work with Django.
@@ -28,6 +29,27 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 # This is the standard way to organize your tasks and keep them modular.
 app.autodiscover_tasks()
 
+# --- Per-Process Setup ---
+# The 'worker_process_init' signal fires once in every worker process, right after it has been
+# started (forked) by the main Celery process. We build the shared AI client here, so:
+# - it is created once per process instead of once per CV, and
+# - its network connections belong to this process (connections opened before a fork must not be shared).
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    # We import here because Django is only fully set up once the worker is running.
+    from portal.llm import init_llm_client
+    init_llm_client()
+
+# The 'worker_init' signal fires once in the main Celery process, BEFORE it starts (forks) the worker
+# processes. A database connection pool must never be shared between processes, so we close any pool
+# the main process has created; every worker process then opens its own pool on its first query.
+@worker_init.connect
+def close_database_pools_before_fork(**kwargs):
+    from django.db import connections
+    for connection in connections.all():
+        if hasattr(connection, 'close_pool'): # Only the PostgreSQL backend has a pool.
+            connection.close_pool()
+
 # --- Example Debug Task ---
 # This is a simple example task to test if Celery is working correctly.
 # The '@app.task' decorator registers this function as a Celery task.
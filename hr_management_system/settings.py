@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres', # PostgreSQL-specific features, e.g. the full-text candidate search.
     'accounts',
     'portal',
 
@@ -78,6 +79,10 @@ WSGI_APPLICATION = 'hr_management_system.wsgi.application'
 # --- Database Configuration ---
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# APP_ROLE tells the settings which kind of process is running: 'web' (Gunicorn) or 'worker' (Celery).
+# It is set for each service in docker-compose.yml.
+APP_ROLE = os.getenv('APP_ROLE', 'web')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -88,9 +93,58 @@ DATABASES = {
         # CRITICAL FOR DOCKER: The 'HOST' is the service name 'db' as defined in docker-compose.yml, not 'localhost'.
         'HOST': os.getenv('SQL_HOST'), 
         'PORT': os.getenv('SQL_PORT'),
+        'OPTIONS': {
+            # Shown in PostgreSQL's 'pg_stat_activity', so we can see which kind of process holds each connection.
+            'application_name': f"hr-{APP_ROLE}",
+        },
     }
 }
 
+# --- Database Connections ---
+# Opening a PostgreSQL connection (network, TLS and password check) takes several milliseconds,
+# so we open connections once and reuse them. DB_CONNECTION_MODE chooses how:
+# - 'pool' (the default): every process keeps a small pool of open connections (psycopg 3's pool,
+#   built into Django). A request or a Celery task borrows a connection and gives it back at the end.
+# - 'persistent': every Celery worker keeps its own connection open for DB_CONN_MAX_AGE seconds
+#   (web processes open one connection per request, see below).
+# - 'pgbouncer': SQL_HOST/SQL_PORT point to PgBouncer in 'transaction' pooling mode, which shares a
+#   few real PostgreSQL connections between ALL processes. PgBouncer does the pooling, so Django only
+#   keeps its own connection to PgBouncer open. Server-side cursors do not work through transaction
+#   pooling, so they are turned off. (Django already turns off prepared statements for psycopg 3.)
+DB_CONNECTION_MODE = os.getenv('DB_CONNECTION_MODE', 'pool')
+# The pool size of ONE process. A Celery worker process runs one task at a time, so it never needs
+# more than one connection; a web process may also run a few threads (e.g. backfill_cv_text --workers).
+# Every process has its own pool, so PostgreSQL needs at least
+# (number of processes x DB_POOL_MAX_SIZE) connections; see the /portal/api/metrics/db/ endpoint.
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '1'))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '4' if APP_ROLE == 'web' else '2'))
+# How long (in seconds) a request waits for a free connection before it fails.
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+# How long (in seconds) a connection is kept open in 'persistent' and 'pgbouncer' mode.
+# Only Celery workers keep their connection: the web processes serve ASGI, where every sync view runs
+# in a thread of a thread pool and Django's connections belong to the thread. A long-lived connection
+# would stay open for each of those threads (one leaked connection per thread), so a web process
+# closes its connection at the end of every request instead. ('pool' mode has no such problem.)
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', '600')) if APP_ROLE == 'worker' else 0
+
+# HEALTH CHECK: a reused connection is tested before it is used (in 'pool' mode: before the pool
+# hands it out), so a connection closed by a database restart is replaced instead of failing the request.
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+if DB_CONNECTION_MODE == 'pool':
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': DB_POOL_MIN_SIZE,
+        'max_size': DB_POOL_MAX_SIZE,
+        'timeout': DB_POOL_TIMEOUT,
+        # Idle connections above 'min_size' are closed after 5 minutes, and every connection is
+        # replaced after an hour, so PostgreSQL can free the memory a long-lived session collects.
+        'max_idle': 300,
+        'max_lifetime': 3600,
+    }
+elif DB_CONNECTION_MODE in ('persistent', 'pgbouncer'):
+    DATABASES['default']['CONN_MAX_AGE'] = DB_CONN_MAX_AGE
+    if DB_CONNECTION_MODE == 'pgbouncer':
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+
 
 # --- Password Validation ---
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -122,6 +176,150 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# --- Staged CV Uploads ---
+# Uploaded CVs are written here once (named by their SHA-256 hash) while they are parsed and reviewed.
+# It must be on the same disk as MEDIA_ROOT, so saving a candidate can simply move the file into 'resumes/'.
+CV_STAGING_ROOT = MEDIA_ROOT / 'staging'
+# Staged files that were never saved as a candidate are deleted after this many hours.
+CV_STAGING_MAX_AGE_HOURS = int(os.getenv('CV_STAGING_MAX_AGE_HOURS', '24'))
+
+# --- Dashboard ---
+# The number of rows per page in the dashboard's tables. More rows are loaded while the user scrolls.
+DASHBOARD_PAGE_SIZE = int(os.getenv('DASHBOARD_PAGE_SIZE', '50'))
+# The number of results per page of the candidate search API.
+CANDIDATE_SEARCH_PAGE_SIZE = int(os.getenv('CANDIDATE_SEARCH_PAGE_SIZE', '20'))
+# The number of applications per page on a job posting's page.
+JOB_APPLICATIONS_PAGE_SIZE = int(os.getenv('JOB_APPLICATIONS_PAGE_SIZE', '50'))
+
+# --- Bulk Applications ---
+# Up to this many candidates are applied to a job right away, within the request;
+# longer lists are handed to a Celery worker (the 'bulk_apply_candidates' task).
+BULK_APPLY_SYNC_LIMIT = int(os.getenv('BULK_APPLY_SYNC_LIMIT', '500'))
+# The largest number of candidates that one bulk application request may contain.
+BULK_APPLY_MAX_CANDIDATES = int(os.getenv('BULK_APPLY_MAX_CANDIDATES', '20000'))
+# The largest number of applications whose status one bulk status request may change.
+BULK_STATUS_MAX_APPLICATIONS = int(os.getenv('BULK_STATUS_MAX_APPLICATIONS', '20000'))
+
+# --- Candidate Ranking ---
+# How many of the best matching candidates the job posting page shows (see ranking.py).
+JOB_RANKING_TOP_N = int(os.getenv('JOB_RANKING_TOP_N', '20'))
+# How long (in seconds) the ranking of a posting is kept in the cache. Edits to the posting or
+# new CV texts give a new cache key anyway, so this only limits how long unused entries stay.
+JOB_RANKING_CACHE_TIMEOUT = int(os.getenv('JOB_RANKING_CACHE_TIMEOUT', '3600'))
+# How long (in seconds) the prebuilt candidate index of a company is kept in the cache. New CV texts
+# give a new key (and a new build) anyway; an index that has expired is simply built again.
+JOB_RANKING_INDEX_CACHE_TIMEOUT = int(os.getenv('JOB_RANKING_INDEX_CACHE_TIMEOUT', str(7 * 24 * 3600)))
+
+# --- Bulk CV Upload ---
+# The bulk upload page sends the selected files in batches of CV_UPLOAD_BATCH_SIZE files per request,
+# with at most CV_UPLOAD_CONCURRENCY requests in flight at the same time.
+CV_UPLOAD_BATCH_SIZE = int(os.getenv('CV_UPLOAD_BATCH_SIZE', '10'))
+CV_UPLOAD_CONCURRENCY = int(os.getenv('CV_UPLOAD_CONCURRENCY', '3'))
+# The maximum number of job ids the batch status API answers in one request.
+CV_STATUS_BATCH_LIMIT = 100
+# When CVs are only parsed for review, up to CV_LLM_BATCH_SIZE CVs of one upload request are sent
+# to the AI in a single prompt, with at most CV_LLM_BATCH_TEXT_LIMIT characters of each CV.
+# This cuts the number of AI requests (and the pressure on its rate limits) on large imports.
+CV_LLM_BATCH_SIZE = int(os.getenv('CV_LLM_BATCH_SIZE', '10'))
+CV_LLM_BATCH_TEXT_LIMIT = int(os.getenv('CV_LLM_BATCH_TEXT_LIMIT', '3000'))
+# The fast local extractor (portal/extraction.py) gives every CV a confidence score between 0 and 1.
+# At or above this score its answer is used and the AI is not asked; set it above 1 to always ask the AI.
+CV_LOCAL_CONFIDENCE_THRESHOLD = float(os.getenv('CV_LOCAL_CONFIDENCE_THRESHOLD', '0.9'))
+# Reading a CV's PDF stops after CV_PDF_MAX_CHARS characters of text, CV_PDF_MAX_PAGES pages or
+# CV_PDF_TIME_LIMIT seconds, whichever comes first, so a huge or broken PDF cannot tie up a worker.
+CV_PDF_MAX_CHARS = int(os.getenv('CV_PDF_MAX_CHARS', '10000'))
+CV_PDF_MAX_PAGES = int(os.getenv('CV_PDF_MAX_PAGES', '10'))
+CV_PDF_TIME_LIMIT = float(os.getenv('CV_PDF_TIME_LIMIT', '20'))
+# The stored CV text of a candidate (the CandidateCVText model) covers at most this many pages and characters.
+CV_TEXT_MAX_PAGES = int(os.getenv('CV_TEXT_MAX_PAGES', '50'))
+CV_TEXT_MAX_CHARS = int(os.getenv('CV_TEXT_MAX_CHARS', '200000'))
+# Every PDF is read in a separate child process with these CPU and memory limits (portal/pdf_sandbox.py),
+# so a malformed PDF cannot hang or exhaust a Celery worker. It can be switched off with CV_PDF_SANDBOX=0.
+CV_PDF_SANDBOX = os.getenv('CV_PDF_SANDBOX', '1') == '1'
+CV_PDF_SANDBOX_CPU_SECONDS = int(os.getenv('CV_PDF_SANDBOX_CPU_SECONDS', '15'))
+CV_PDF_SANDBOX_MEMORY_MB = int(os.getenv('CV_PDF_SANDBOX_MEMORY_MB', '512'))
+# The time limits of the CV parsing tasks, in seconds (the soft limit lets the task report the failure).
+CV_PARSE_SOFT_TIME_LIMIT = int(os.getenv('CV_PARSE_SOFT_TIME_LIMIT', '90'))
+CV_PARSE_TIME_LIMIT = int(os.getenv('CV_PARSE_TIME_LIMIT', '120'))
+CV_BATCH_PARSE_SOFT_TIME_LIMIT = int(os.getenv('CV_BATCH_PARSE_SOFT_TIME_LIMIT', '300'))
+CV_BATCH_PARSE_TIME_LIMIT = int(os.getenv('CV_BATCH_PARSE_TIME_LIMIT', '360'))
+
+
+# --- LLM (AI) Client Configuration ---
+# Which AI backend the CV parser uses (see portal/llm.py): 'gemini' or 'stub'.
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'gemini')
+LLM_MODEL = os.getenv('LLM_MODEL', 'gemini-2.5-flash')
+# The address of the local stub server, used when LLM_BACKEND is 'stub'.
+LLM_STUB_URL = os.getenv('LLM_STUB_URL', 'http://localhost:8765/generate')
+# How long (in seconds) we wait for an answer from an HTTP-based backend.
+LLM_TIMEOUT = int(os.getenv('LLM_TIMEOUT', '60'))
+
+# --- Job Title Generation (Hugging Face) ---
+# The summarization model that turns a job description into a title (see generate_job_title_view).
+HUGGING_FACE_API_KEY = os.getenv('HUGGING_FACE_API_KEY')
+AI_SUMMARIZATION_MODEL_URL = os.getenv(
+    'AI_SUMMARIZATION_MODEL_URL', 'https://api-inference.huggingface.co/models/facebook/bart-large-cnn'
+)
+# How long (in seconds) we wait for the model's answer.
+AI_TITLE_TIMEOUT = int(os.getenv('AI_TITLE_TIMEOUT', '30'))
+# How long (in seconds) a generated title is kept in the cache. The default is 7 days.
+AI_TITLE_CACHE_TIMEOUT = int(os.getenv('AI_TITLE_CACHE_TIMEOUT', str(7 * 24 * 3600)))
+# How many times a failed model call is tried again (see portal/title_generation.py).
+AI_TITLE_MAX_RETRIES = int(os.getenv('AI_TITLE_MAX_RETRIES', '2'))
+# How long (in seconds, in total) we wait for a model that is warming up, before telling the user to try later.
+AI_TITLE_MAX_WARMUP_WAIT = float(os.getenv('AI_TITLE_MAX_WARMUP_WAIT', '30'))
+# How many requests to AI services one web process may have open at the same time (see portal/ai_http.py).
+# A waiting request costs almost nothing in an async view, so this can be much higher than the number of workers.
+AI_HTTP_MAX_CONNECTIONS = int(os.getenv('AI_HTTP_MAX_CONNECTIONS', '200'))
+
+
+# --- Cache Configuration ---
+# 'cv_parse' stores the fields already parsed from each CV (see portal/cv_cache.py), so uploading
+# the same PDF again costs no PDF extraction and no AI call.
+# In Docker it lives in the Redis service (CV_PARSE_CACHE_URL, e.g. redis://redis:6379/2), which evicts
+# the least recently used entries when it is full. Without that variable, an in-memory cache is used.
+CV_PARSE_CACHE_URL = os.getenv('CV_PARSE_CACHE_URL')
+# How long a parsed CV stays in the cache (in seconds). The default is 30 days.
+CV_PARSE_CACHE_TIMEOUT = int(os.getenv('CV_PARSE_CACHE_TIMEOUT', str(30 * 24 * 3600)))
+
+# 'default' is the cache shared by all Gunicorn workers and Celery workers: the companies' cache
+# versions (see portal/fragment_cache.py), the candidate rankings and the tier counters of CV parsing.
+# 'fragments' holds the rendered page fragments of the {% cache %} template tags.
+# In Docker both live in the Redis service (CACHE_URL, e.g. redis://redis:6379/1). Without that
+# variable, 'default' is an in-memory cache of each process, which is fine for development and tests,
+# and 'fragments' caches nothing: a cache version changed in ONE process (e.g. by a Celery task) is
+# never seen by the others, so an in-memory fragment could show outdated data until it expires.
+CACHE_URL = os.getenv('CACHE_URL')
+# How long (in seconds) a rendered page fragment is kept. A change to the company's data makes
+# its fragments outdated right away anyway, so this only limits how long unused ones take up memory.
+FRAGMENT_CACHE_TIMEOUT = int(os.getenv('FRAGMENT_CACHE_TIMEOUT', '600'))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_URL,
+    } if CACHE_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_URL,
+    } if CACHE_URL else {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    },
+    'cv_parse': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CV_PARSE_CACHE_URL,
+        'TIMEOUT': CV_PARSE_CACHE_TIMEOUT,
+    } if CV_PARSE_CACHE_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'cv-parse',
+        'TIMEOUT': CV_PARSE_CACHE_TIMEOUT,
+        # The in-memory fallback is bounded by the number of entries instead.
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
 
 # --- Default primary key field type ---
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -146,13 +344,32 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+# Report the 'STARTED' state while a task is running, so the CV parsing status API
+# can tell "waiting in the queue" apart from "being processed".
+CELERY_TASK_TRACK_STARTED = True
+# CV parsing tasks go to their own 'cv_parsing' queue, served by a dedicated worker (see docker-compose.yml).
+# Everything else (e.g. the scheduled tasks) stays on the default 'celery' queue, so a flood of
+# uploads or a slow PDF can never delay the light work.
+CELERY_TASK_ROUTES = {
+    'portal.tasks.process_single_cv': {'queue': 'cv_parsing'},
+    'portal.tasks.process_cv_batch': {'queue': 'cv_parsing'},
+    'portal.tasks.store_candidate_cv_texts': {'queue': 'cv_parsing'},
+}
 
 # --- Celery Beat Scheduler Configuration ---
 # This defines all the periodic tasks that Celery Beat should run.
 CELERY_BEAT_SCHEDULE = {
-    'deactivate-expired-postings-every-day': {
+    'deactivate-expired-postings-every-minute': {
         'task': 'portal.tasks.deactivate_expired_postings',
-        # crontab(hour=6, minute=0) means "run every day at 6:00 AM".
-        'schedule': crontab(hour=6, minute=0),
+        # crontab() with no arguments means "run every minute", so postings close at most a minute late.
+        # Each run only reads the due postings from a partial index (see the JobPosting model).
+        'schedule': crontab(),
+        # A run that waited in the queue for a minute is dropped: the next one does the same work.
+        'options': {'expires': 55},
+    },
+    'purge-staged-cv-uploads-every-hour': {
+        'task': 'portal.tasks.purge_staged_cv_uploads',
+        # crontab(minute=30) means "run every hour at minute 30".
+        'schedule': crontab(minute=30),
     },
 }
@@ -0,0 +1,62 @@
+"""
+The shared HTTP client of our async views that call AI services (e.g. generate_job_title_view).
+
+A normal (sync) view that waits 30 seconds for an AI model blocks its whole worker for those
+30 seconds. An async view 'awaits' the answer instead: while it waits, the same process serves
+other requests, so one Uvicorn worker can have hundreds of model calls in flight at once.
+
+For this, the HTTP requests must be made with an async client (httpx.AsyncClient). Creating a
+client is not free (it sets up TLS and a pool of connections), so we create it ONCE and every
+request reuses it, together with its open connections.
+
+An AsyncClient belongs to the event loop it is used in. Under Uvicorn every worker process has
+one event loop, so there is one client per process. (The development server and the tests run each
+async view in a new, short-lived event loop; each one gets its own client.)
+
+Every client is closed (with its open connections) when its event loop shuts down. asyncio has no
+"on shutdown" callback, but asyncio.run() and Django's async_to_sync() finish every unfinished async
+generator right before they close the loop, while it still runs. So each client gets a small async
+generator that is paused until then, and closes the client in its 'finally' block.
+"""
+import asyncio
+import weakref
+
+import httpx
+from django.conf import settings
+
+# The client of each event loop, with the async generator that closes it.
+# An entry disappears together with its event loop.
+_clients = weakref.WeakKeyDictionary()
+
+
+async def _close_on_loop_shutdown(client):
+    """
+    Waits at 'yield' until the event loop shuts down, then closes the client.
+    """
+    try:
+        yield
+    finally:
+        await client.aclose()
+
+
+def get_async_http_client():
+    """
+    Returns the AsyncClient of the running event loop, creating it on first use.
+    It must be called from inside an async view (or another coroutine).
+    """
+    loop = asyncio.get_running_loop()
+    entry = _clients.get(loop)
+    if entry is None:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.AI_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=20,
+            ),
+            timeout=httpx.Timeout(settings.AI_TITLE_TIMEOUT, connect=5),
+        )
+        closer = _close_on_loop_shutdown(client)
+        # Running the generator up to its 'yield' registers it with the loop (see the module docstring).
+        loop.create_task(closer.__anext__())
+        # The generator is kept here as well: otherwise it would be garbage collected (and close the client) right away.
+        entry = _clients[loop] = (client, closer)
+    return entry[0]
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class PortalConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'portal'
+
+    def ready(self):
+        # Connects the signal receivers that keep the pipeline counters and the page fragment cache up to date.
+        from . import fragment_cache, pipeline  # noqa: F401
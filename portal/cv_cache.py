@@ -0,0 +1,40 @@
+"""
+A cache for the fields that were parsed from a CV.
+
+Recruiters often upload the same PDF several times (on the auto-fill form, on the
+bulk upload page, or again after an error). Parsing it again would repeat the PDF
+extraction and a paid Gemini call for an answer we already know.
+
+The cache key combines:
+- the SHA-256 hash of the PDF bytes (which is also the file's staged key, see staging.py), and
+- the parser version (a hash of the prompt and the model name), so changing the prompt
+  or the model automatically ignores everything parsed with the old one.
+
+The entries live in the 'cv_parse' cache (see CACHES in settings.py). In production this
+is Redis: every entry expires after CV_PARSE_CACHE_TIMEOUT seconds, and Redis evicts
+the least recently used entries when it reaches its memory limit (see docker-compose.yml).
+"""
+from django.conf import settings
+from django.core.cache import caches
+
+# Only these fields are stored; everything else in a parse result belongs to a single upload.
+CACHED_FIELDS = ('first_name', 'last_name', 'email')
+
+
+def _cache_key(content_hash, parser_version):
+    return f"cv-parse:{parser_version}:{content_hash}"
+
+
+def get_cached_parse(content_hash, parser_version):
+    """
+    Returns the cached fields for this PDF as a dictionary, or None if it was not parsed before.
+    """
+    return caches['cv_parse'].get(_cache_key(content_hash, parser_version))
+
+
+def set_cached_parse(content_hash, parser_version, parsed_fields):
+    """
+    Stores the parsed fields for this PDF.
+    """
+    entry = {field: parsed_fields.get(field) for field in CACHED_FIELDS}
+    caches['cv_parse'].set(_cache_key(content_hash, parser_version), entry, settings.CV_PARSE_CACHE_TIMEOUT)
@@ -0,0 +1,61 @@
+"""
+Numbers about our database connections, to size PostgreSQL and the connection pools correctly.
+
+Every Gunicorn worker and every Celery worker process has its OWN pool (see DB_CONNECTION_MODE in
+settings.py), so two kinds of numbers are useful:
+- the pool of the process that answers the request: how many connections it holds, how many are
+  free and how often a request had to wait for one, and
+- the server's view, from PostgreSQL's 'pg_stat_activity': how many connections ALL our processes
+  hold together, grouped by role (the 'application_name', e.g. 'hr-web' or 'hr-worker') and state.
+"""
+from django.conf import settings
+from django.db import connection
+
+
+def pool_stats():
+    """
+    Returns the statistics of this process's connection pool, or None if no pool is used.
+    """
+    pool = getattr(connection, 'pool', None)
+    return pool.get_stats() if pool else None
+
+
+def server_connection_counts():
+    """
+    Returns the connections to our database as a list of {'application_name', 'state', 'count'},
+    plus the server's 'max_connections' limit, with two queries.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT application_name, COALESCE(state, 'unknown'), COUNT(*)
+            FROM pg_stat_activity
+            WHERE datname = current_database()
+            GROUP BY 1, 2
+            ORDER BY 1, 2
+            """
+        )
+        rows = [
+            {'application_name': application_name, 'state': state, 'count': count}
+            for application_name, state, count in cursor.fetchall()
+        ]
+        cursor.execute("SHOW max_connections")
+        max_connections = int(cursor.fetchone()[0])
+    return rows, max_connections
+
+
+def database_connection_stats():
+    """
+    Returns all connection numbers as one dictionary, ready to be sent as JSON.
+    """
+    connections_by_role, max_connections = server_connection_counts()
+    return {
+        'mode': settings.DB_CONNECTION_MODE,
+        'role': settings.APP_ROLE,
+        'pool': pool_stats(),
+        'server': {
+            'max_connections': max_connections,
+            'total': sum(row['count'] for row in connections_by_role),
+            'connections': connections_by_role,
+        },
+    }
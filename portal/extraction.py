@@ -0,0 +1,169 @@
+"""
+The fast, local first tier of our CV parsing.
+
+Most CVs start with the candidate's name on its own line and contain exactly one email
+address. For those, asking the AI is slow and costs money for an answer we can see right
+away. So before any AI call, we run a quick local pass over the text:
+
+- the email: all addresses in the text, found with one precompiled pattern,
+- the name: the first short line in the header (the first few lines) that looks like a name,
+- a confidence score between 0 and 1 that says how sure we are about both.
+
+If the confidence reaches CV_LOCAL_CONFIDENCE_THRESHOLD, the local answer is used and the
+AI is skipped. Otherwise the AI is asked, with the RegEx parser as the last fallback (see tasks.py).
+
+Every parsed CV is also counted by the tier that produced its answer ('cache', 'local', 'ai'
+or 'regex'). The counters live in the shared 'cv_parse' cache, so every worker adds to the
+same numbers; they are shown by the CV parsing stats API.
+"""
+import re
+import unicodedata
+
+from django.core.cache import caches
+
+# --- The Precompiled Patterns ---
+# Compiling them once, when the module is imported, saves the work on every CV.
+EMAIL_PATTERN = re.compile(r'[\w\.+-]+@[\w-]+(?:\.[\w-]+)*\.[A-Za-z]{2,}')
+# One word of a name: letters of any alphabet, optionally joined by a hyphen or an apostrophe
+# (e.g. 'Şahin', 'Jean-Luc', "O'Neil").
+NAME_WORD_PATTERN = re.compile(r"^[^\W\d_]+(?:['’-][^\W\d_]+)*$")
+
+# Only the first lines of a CV are searched for the name.
+HEADER_LINE_COUNT = 6
+# Header lines that are document titles, CV sections or job titles, not names
+# (e.g. 'Key Skills', 'Senior Software Engineer', 'Python Developer').
+NOT_A_NAME_WORDS = {
+    # Document titles and sections.
+    'curriculum', 'vitae', 'resume', 'résumé', 'cv', 'profile', 'contact', 'personal', 'information',
+    'summary', 'skills', 'key', 'core', 'technical', 'experience', 'work', 'employment', 'history',
+    'education', 'objective', 'career', 'professional', 'projects', 'certifications', 'languages',
+    'references', 'interests', 'achievements', 'about', 'me', 'details', 'overview',
+    # Job titles and their usual first words.
+    'senior', 'junior', 'lead', 'principal', 'chief', 'head', 'staff', 'software', 'engineer', 'developer',
+    'programmer', 'manager', 'director', 'designer', 'analyst', 'consultant', 'specialist', 'architect',
+    'administrator', 'scientist', 'officer', 'assistant', 'coordinator', 'technician', 'intern',
+    'accountant', 'recruiter', 'executive', 'representative', 'associate', 'full', 'stack', 'frontend',
+    'backend', 'data', 'web', 'mobile', 'product', 'project', 'sales', 'marketing', 'hr', 'it',
+}
+
+# The confidence points for each piece of evidence. The local answer reaches the default
+# threshold (0.9) only when a single email ALSO contains the name found in the header
+# (0.5 + 0.3 + 0.2): a capitalized header line on its own may still be a title we do not know.
+EMAIL_UNIQUE_SCORE = 0.5
+EMAIL_IN_HEADER_SCORE = 0.3
+EMAIL_GUESSED_SCORE = 0.1
+NAME_LINE_SCORE = 0.3
+NAME_IN_EMAIL_SCORE = 0.2
+
+# The names of the tiers, in the order they are tried.
+EXTRACTION_TIERS = ('cache', 'local', 'ai', 'regex')
+
+
+def _find_name_line(header_lines):
+    """
+    Returns the words of the first header line that looks like a person's name
+    (two to four capitalized words, e.g. 'Ayşe Yılmaz' or 'JOHN DOE'), or None.
+    """
+    for line in header_lines:
+        words = line.split()
+        if not 2 <= len(words) <= 4:
+            continue
+        if any(word.lower() in NOT_A_NAME_WORDS for word in words):
+            continue
+        if all(NAME_WORD_PATTERN.match(word) and (word.istitle() or word.isupper()) for word in words):
+            # Names written in capitals ('JOHN DOE') are turned into 'John Doe'.
+            return [word.title() if word.isupper() else word for word in words]
+    return None
+
+
+def _plain_letters(text):
+    """
+    Lowercases a word and removes its accents, so 'Ayşe Yılmaz' can be compared with 'ayse.yilmaz@...'.
+    """
+    text = unicodedata.normalize('NFKD', text.lower().replace('ı', 'i'))
+    return ''.join(character for character in text if not unicodedata.combining(character))
+
+
+def local_extract(extracted_text):
+    """
+    Extracts the first_name, last_name and email from the CV text without any AI call.
+    Returns a dictionary with the three fields, the 'source' ('local') and a 'confidence'
+    between 0 and 1.
+    """
+    header_lines = [line.strip() for line in extracted_text.splitlines() if line.strip()][:HEADER_LINE_COUNT]
+    confidence = 0.0
+
+    # --- Step 1: The Email ---
+    # dict.fromkeys removes duplicates (the same address in the header and the footer) but keeps the order.
+    emails = list(dict.fromkeys(match.group(0) for match in EMAIL_PATTERN.finditer(extracted_text)))
+    email = None
+    if len(emails) == 1:
+        email = emails[0]
+        confidence += EMAIL_UNIQUE_SCORE
+    elif emails:
+        # With several addresses (e.g. a referee's), the one in the header is most likely the candidate's.
+        header_text = "\n".join(header_lines)
+        header_emails = [address for address in emails if address in header_text]
+        if len(header_emails) == 1:
+            email = header_emails[0]
+            confidence += EMAIL_IN_HEADER_SCORE
+        else:
+            email = emails[0]
+            confidence += EMAIL_GUESSED_SCORE
+
+    # --- Step 2: The Name ---
+    first_name = None
+    last_name = None
+    name_words = _find_name_line(header_lines)
+    if name_words:
+        first_name = " ".join(name_words[:-1])
+        last_name = name_words[-1]
+        confidence += NAME_LINE_SCORE
+        # An address like 'jane.doe@...' confirms that we picked the right line.
+        # Only the part before the '@' counts: 'info@engineer.com' says nothing about the name.
+        if email:
+            local_part = _plain_letters(email.split('@')[0])
+            if _plain_letters(last_name) in local_part or _plain_letters(name_words[0]) in local_part:
+                confidence += NAME_IN_EMAIL_SCORE
+
+    return {
+        'first_name': first_name,
+        'last_name': last_name,
+        'email': email,
+        'source': 'local',
+        'confidence': round(min(confidence, 1.0), 2),
+    }
+
+
+# --- The Tier Statistics ---
+
+def _tier_key(tier):
+    return f"cv-extract-tier:{tier}"
+
+
+def record_tier_win(tier):
+    """
+    Adds one to the counter of the tier that produced a CV's answer.
+    """
+    cache = caches['cv_parse']
+    # The counters never expire. (Redis only evicts keys that have an expiry time, see docker-compose.yml.)
+    cache.add(_tier_key(tier), 0, timeout=None)
+    try:
+        cache.incr(_tier_key(tier))
+    except ValueError:
+        # The counter was removed between the two calls (e.g. the cache was cleared); we skip this count.
+        pass
+
+
+def get_tier_stats():
+    """
+    Returns how many CVs each tier has answered, plus the total and each tier's share in percent.
+    """
+    counts = caches['cv_parse'].get_many([_tier_key(tier) for tier in EXTRACTION_TIERS])
+    tiers = {tier: counts.get(_tier_key(tier), 0) for tier in EXTRACTION_TIERS}
+    total = sum(tiers.values())
+    return {
+        'tiers': tiers,
+        'total': total,
+        'share_percent': {tier: round(100 * count / total, 1) if total else 0.0 for tier, count in tiers.items()},
+    }
@@ -1,5 +1,7 @@
 
 from django import forms
+from django.urls import reverse
+from django.utils.http import urlencode
 from .models import JobPosting, Candidate, Application # Import all necessary models
 
 # --- Job Posting Form ---
@@ -48,6 +50,45 @@ class CandidateForm(forms.ModelForm):
 
 #------------------------------------------------------------------------------------------------------------------------
 
+# --- Candidate Search Widget ---
+class CandidateSearchWidget(forms.Widget):
+    """
+    A candidate picker that searches as the user types, instead of a dropdown with every candidate.
+    A dropdown would load and send ALL of the company's candidates with every page view; this
+    widget only loads the matching candidates, one page at a time, from the candidate search API.
+    The chosen candidate's id is sent in a hidden input, so the form receives it like a normal choice.
+    'queryset' holds the candidates that can be chosen; it is used to show the name of the chosen
+    candidate when the form is shown again (e.g. after a validation error).
+    """
+    template_name = 'portal/widgets/candidate_search.html'
+
+    def __init__(self, attrs=None, search_url='', queryset=None):
+        super().__init__(attrs)
+        self.search_url = search_url
+        self.queryset = queryset
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['search_url'] = self.search_url
+        context['widget']['selected_label'] = self.selected_label(value)
+        return context
+
+    def selected_label(self, value):
+        """
+        Returns "First Last (email)" of the chosen candidate, or None if nothing (valid) is chosen.
+        Only the candidates of the queryset are looked up, so another company's candidate is never shown.
+        """
+        if value in (None, '') or self.queryset is None:
+            return None
+        try:
+            candidate = self.queryset.only('first_name', 'last_name', 'email').filter(pk=int(value)).first()
+        except (TypeError, ValueError):
+            return None
+        if candidate is None:
+            return None
+        return f"{candidate.first_name} {candidate.last_name} ({candidate.email})"
+
+
 # --- Application Form ---
 class ApplicationForm(forms.ModelForm):
     """
@@ -58,7 +99,7 @@ class ApplicationForm(forms.ModelForm):
         model = Application
         fields = ['candidate']
         widgets = {
-            'candidate': forms.Select(attrs={'class': 'form-select'}),
+            'candidate': CandidateSearchWidget(),
         }
 
     # --- YENİ EKLENEN METOT ---
@@ -80,7 +121,16 @@ class ApplicationForm(forms.ModelForm):
             # This is a great feature: it ensures that the dropdown menu for candidates
             # will only show candidates that belong to the SAME company as the job posting.
             # This prevents accidentally applying a candidate from Company A to a job in Company B.
-            self.fields['candidate'].queryset = Candidate.objects.filter(company=job_posting.company)
+            # Candidates who already applied to this job are left out as well.
+            # Only the ONE chosen candidate is ever loaded from this queryset (when the form is validated).
+            self.fields['candidate'].queryset = (
+                Candidate.objects
+                .filter(company_id=job_posting.company_id)
+                .exclude(applications__job_posting=job_posting)
+            )
+            # The widget searches the same candidates through the candidate search API.
+            self.fields['candidate'].widget.search_url = f"{reverse('api-candidate-search')}?{urlencode({'exclude_job': job_posting.pk})}"
+            self.fields['candidate'].widget.queryset = self.fields['candidate'].queryset
 #------------------------------------------------------------------------------------------------------------------------
 
 # --- Application Status Form ---
@@ -0,0 +1,100 @@
+"""
+Versioned, per-company ("per-tenant") keys for the cached parts of our pages.
+
+The dashboard tables and the job posting page are cached as rendered HTML fragments
+(with Django's {% cache ... using="fragments" %} template tag) in the shared 'fragments' cache
+(Redis in Docker), so every Gunicorn worker can use what another worker has rendered.
+Without CACHE_URL, the 'fragments' cache stores nothing (see settings.py): the versions below
+would then live in each process's own memory, and a change made by a Celery worker would
+never reach the web workers' fragments.
+
+Every company has a version number in the cache, and each fragment's key contains it:
+
+    dashboard_job_postings / <company id> / <version>
+
+When anything of a company changes (a job posting, a candidate, an application or a CV text),
+its version is increased. The old fragments are simply never asked for again (they expire on
+their own), and the next request renders and caches fresh ones. Nothing has to find and delete
+the old keys, and a company's changes never touch another company's cache.
+
+The version is increased AFTER the database transaction is committed. If it were increased
+before, a request running at the same moment could still read the old rows and cache them
+under the NEW version, which would then be served until the next change.
+
+Most changes are noticed by the signal receivers below (connected in PortalConfig.ready(), see
+apps.py). Bulk operations that send no signals (bulk_create(), queryset.update()) call
+invalidate_company_cache() themselves.
+"""
+import time
+from functools import lru_cache
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Application, Candidate, CandidateCVText, JobPosting
+
+
+def _version_key(company_id):
+    return f"company-cache-version:{company_id}"
+
+
+def _new_version():
+    # A version based on the current time (in milliseconds). If the version key is ever lost,
+    # the new one is still larger than every version used before, so no old fragment comes back.
+    return int(time.time() * 1000)
+
+
+def company_cache_version(company_id):
+    """
+    Returns the current cache version of a company, to be used in its fragment keys.
+    """
+    # The version never expires. (Redis only evicts keys that have an expiry time, see docker-compose.yml.)
+    return cache.get_or_set(_version_key(company_id), _new_version, timeout=None)
+
+
+def _bump_version(company_id):
+    try:
+        cache.incr(_version_key(company_id))
+    except ValueError:
+        # There is no version yet (or it was evicted): start a new one.
+        cache.set(_version_key(company_id), _new_version(), timeout=None)
+
+
+def invalidate_company_cache(*company_ids):
+    """
+    Makes all cached fragments of the given companies outdated, as soon as the current
+    database transaction is committed (or right away, if there is no transaction).
+    """
+    for company_id in set(company_ids):
+        if company_id is not None:
+            transaction.on_commit(lambda company_id=company_id: _bump_version(company_id))
+
+
+@lru_cache(maxsize=4096)
+def _company_of_job_posting(job_posting_id):
+    # A job posting never moves to another company, so this answer can be remembered.
+    return JobPosting.objects.filter(pk=job_posting_id).values_list('company_id', flat=True).first()
+
+
+# --- The Signal Receivers ---
+
+@receiver([post_save, post_delete], sender=JobPosting)
+@receiver([post_save, post_delete], sender=Candidate)
+def invalidate_on_company_object_change(sender, instance, **kwargs):
+    invalidate_company_cache(instance.company_id)
+
+
+@receiver([post_save, post_delete], sender=Application)
+def invalidate_on_application_change(sender, instance, **kwargs):
+    if Application.job_posting.is_cached(instance):
+        invalidate_company_cache(instance.job_posting.company_id)
+    else:
+        invalidate_company_cache(_company_of_job_posting(instance.job_posting_id))
+
+
+@receiver([post_save, post_delete], sender=CandidateCVText)
+def invalidate_on_cv_text_change(sender, instance, **kwargs):
+    # A new CV text can change the "best matching candidates" of the company's job postings.
+    invalidate_company_cache(Candidate.objects.filter(pk=instance.candidate_id).values_list('company_id', flat=True).first())
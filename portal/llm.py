@@ -0,0 +1,88 @@
+"""
+The LLM client layer used by our CV parsing tasks.
+
+Creating an AI client is not free: it reads the API key, sets up the transport
+and opens a connection. Instead of doing that for every CV, each Celery worker
+process builds ONE client when it starts (see the 'worker_process_init' signal in
+hr_management_system/celery.py), and every parsing task in that process reuses it.
+
+The backend is chosen with the LLM_BACKEND setting:
+- 'gemini': the Google Gemini API (the default).
+- 'stub':   a local HTTP server at LLM_STUB_URL. It is used by tests and offline runs,
+            e.g. with 'python manage.py llm_stub_server'.
+
+Every backend offers the same single method: generate(prompt) -> text.
+"""
+import os
+
+import google.generativeai as genai # The official Google Gemini Python library.
+import requests
+from django.conf import settings
+
+
+class GeminiBackend:
+    """
+    Sends prompts to the Google Gemini API.
+    The API key is configured and the model object is created only once, so the
+    underlying connection is kept open and reused by every call.
+    """
+    def __init__(self, model_name):
+        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+        self.model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt):
+        response = self.model.generate_content(prompt)
+        return response.text
+
+
+class StubBackend:
+    """
+    Sends prompts to a local stub server instead of a real AI service.
+    The server receives {"model": ..., "prompt": ...} as JSON and answers {"text": ...}.
+    A requests.Session keeps the HTTP connection alive between calls.
+    """
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.url = settings.LLM_STUB_URL
+        self.session = requests.Session()
+
+    def generate(self, prompt):
+        response = self.session.post(
+            self.url,
+            json={'model': self.model_name, 'prompt': prompt},
+            timeout=settings.LLM_TIMEOUT
+        )
+        response.raise_for_status()
+        return response.json()['text']
+
+
+# The available backends, by the name used in the LLM_BACKEND setting.
+LLM_BACKENDS = {
+    'gemini': GeminiBackend,
+    'stub': StubBackend,
+}
+
+# The client of the current process. It is created once and then shared by all tasks.
+_llm_client = None
+
+
+def init_llm_client():
+    """
+    Builds the LLM client of the current process from the settings.
+    It is called when a Celery worker process starts, and again whenever
+    a fresh client is needed (e.g. after changing the settings in a test).
+    """
+    global _llm_client
+    backend_class = LLM_BACKENDS[settings.LLM_BACKEND]
+    _llm_client = backend_class(settings.LLM_MODEL)
+    return _llm_client
+
+
+def get_llm_client():
+    """
+    Returns the shared LLM client of the current process, creating it on first use
+    (e.g. in the web server or a 'manage.py' command, where no worker signal runs).
+    """
+    if _llm_client is None:
+        return init_llm_client()
+    return _llm_client
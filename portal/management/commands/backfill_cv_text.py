@@ -0,0 +1,85 @@
+"""
+Stores the CV text of every existing candidate whose resume has not been read yet.
+
+Usage:
+    python manage.py backfill_cv_text --batch-size 200 --workers 4
+
+- Bounded memory: candidates are loaded in batches of '--batch-size', ordered by id;
+  only the id and the resume name of each candidate are read.
+- Parallel: each batch is split between '--workers' threads. The PDFs are read in the
+  PDF sandbox's child processes (see pdf_sandbox.py), so the threads really work in parallel.
+- Connections: every thread needs its own database connection. In 'pool' mode (see settings.py)
+  '--workers' is capped at the pool size of this process, and the main thread gives its
+  connection back before the threads start, so no thread has to wait for a free connection.
+- Resumable: only candidates WITHOUT a stored text are selected, so the command can be
+  stopped at any time and simply started again; it continues with the remaining candidates.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from portal.models import Candidate
+from portal.tasks import store_cv_texts
+
+
+def _store_chunk(candidates):
+    """
+    Runs in a worker thread. Every thread gets its own database connection from Django,
+    which we close when the thread's work is done.
+    """
+    try:
+        return store_cv_texts(candidates)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = "Extracts and stores the CV text of existing candidates that do not have one yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help="How many candidates are loaded at a time.")
+        parser.add_argument('--workers', type=int, default=4, help="How many resumes are read in parallel.")
+        parser.add_argument('--company', type=int, help="Only process the candidates of this company id.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        workers = max(options['workers'], 1)
+        if settings.DB_CONNECTION_MODE == 'pool' and workers > settings.DB_POOL_MAX_SIZE:
+            # More threads than pooled connections would only wait for each other (or time out).
+            self.stdout.write(self.style.WARNING(
+                f"Using {settings.DB_POOL_MAX_SIZE} worker(s), the database pool size of this process (DB_POOL_MAX_SIZE)."
+            ))
+            workers = settings.DB_POOL_MAX_SIZE
+
+        pending = Candidate.objects.filter(cv_text__isnull=True).exclude(resume__isnull=True).exclude(resume='')
+        if options['company']:
+            pending = pending.filter(company_id=options['company'])
+
+        last_id = 0
+        stored_total = 0
+        processed_total = 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                # Keyset pagination: every batch starts after the last id of the previous one,
+                # so candidates whose resume could not be read are not selected again in this run.
+                batch = list(pending.filter(id__gt=last_id).order_by('id').only('id', 'resume')[:batch_size])
+                if not batch:
+                    break
+                last_id = batch[-1].id
+
+                if workers == 1:
+                    # With a single worker we stay in this thread (and on its database connection).
+                    stored_total += store_cv_texts(batch)
+                else:
+                    # We split the batch into one chunk per worker thread.
+                    chunks = [batch[i::workers] for i in range(workers) if batch[i::workers]]
+                    # The batch is already loaded, so the main thread gives its connection back to the pool
+                    # for the threads; the next batch query simply takes one again.
+                    connection.close()
+                    stored_total += sum(executor.map(_store_chunk, chunks))
+                processed_total += len(batch)
+                self.stdout.write(f"Processed {processed_total} candidate(s), stored {stored_total} CV text(s)...")
+
+        self.stdout.write(self.style.SUCCESS(f"Done. Stored the CV text of {stored_total} candidate(s)."))
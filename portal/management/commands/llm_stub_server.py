@@ -0,0 +1,86 @@
+"""
+Runs a tiny local stand-in for the AI service, for tests and offline development.
+
+Usage:
+    python manage.py llm_stub_server --port 8765
+
+Then start the Celery worker with LLM_BACKEND=stub (and LLM_STUB_URL, if you changed the port).
+The server speaks the protocol of portal.llm.StubBackend: it receives {"model": ..., "prompt": ...}
+and answers {"text": ...}. The text is a JSON object with the first email and the first
+"Firstname Lastname" pair found in the CV text of the prompt. For a batched prompt (several
+'### CV <id>' sections), it is a JSON array with one such object per CV.
+"""
+import json
+import re
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+EMAIL_PATTERN = re.compile(r'[\w\.-]+@[\w\.-]+\.\w+')
+NAME_PATTERN = re.compile(r'([A-Z][a-z]+)\s+([A-Z][a-z]+)')
+
+
+BATCH_SECTION_PATTERN = re.compile(r'^### CV (\d+)$', re.MULTILINE)
+
+
+def _stub_fields(cv_text):
+    email_match = EMAIL_PATTERN.search(cv_text)
+    name_match = NAME_PATTERN.search(cv_text)
+    return {
+        'first_name': name_match.group(1) if name_match else None,
+        'last_name': name_match.group(2) if name_match else None,
+        'email': email_match.group(0) if email_match else None,
+    }
+
+
+def build_stub_answer(prompt):
+    """
+    Builds the fake AI answer for one prompt, using simple patterns instead of a model.
+    """
+    # A batched prompt splits into: [instructions, id, cv text, id, cv text, ...].
+    sections = BATCH_SECTION_PATTERN.split(prompt)
+    if len(sections) > 1:
+        return json.dumps([
+            {'id': int(cv_id), **_stub_fields(cv_text)} for cv_id, cv_text in zip(sections[1::2], sections[2::2])
+        ])
+
+    # Our prompts put the CV after a 'CV Text:' marker; we ignore the instructions before it.
+    return json.dumps(_stub_fields(prompt.split('CV Text:', 1)[-1]))
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 lets the client keep its connection open between requests, like a real API.
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        content_length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(content_length))
+        body = json.dumps({'text': build_stub_answer(payload.get('prompt', ''))}).encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Keep the console quiet; every request would otherwise print a line.
+        pass
+
+
+class Command(BaseCommand):
+    help = "Runs a local stub of the AI service for tests and offline CV parsing (use with LLM_BACKEND=stub)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help="The address to listen on.")
+        parser.add_argument('--port', type=int, default=8765, help="The port to listen on.")
+
+    def handle(self, *args, **options):
+        server = ThreadingHTTPServer((options['host'], options['port']), StubRequestHandler)
+        self.stdout.write(f"LLM stub server listening on http://{options['host']}:{options['port']}/generate")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
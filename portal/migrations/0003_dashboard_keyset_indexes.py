@@ -0,0 +1,35 @@
+# Generated by Django 5.2.3 on 2026-10-18 01:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('portal', '0002_jobposting_closing_date'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='candidate',
+            options={'ordering': ['last_name', 'first_name', 'id'], 'verbose_name': 'Candidate', 'verbose_name_plural': 'Candidates'},
+        ),
+        migrations.AlterModelOptions(
+            name='jobposting',
+            options={'ordering': ['-created_at', '-id'], 'verbose_name': 'Job Posting', 'verbose_name_plural': 'Job Postings'},
+        ),
+        migrations.AlterField(
+            model_name='jobposting',
+            name='closing_date',
+            field=models.DateTimeField(blank=True, help_text='The date and time when this job posting will expire.', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='candidate',
+            index=models.Index(fields=['company', 'last_name', 'first_name', 'id'], name='candidate_company_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='jobposting',
+            index=models.Index(fields=['company', '-created_at', '-id'], name='jobposting_company_created_idx'),
+        ),
+    ]
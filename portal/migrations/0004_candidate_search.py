@@ -0,0 +1,52 @@
+# Generated by Django 5.2.3 on 2026-10-18 02:00
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import F, Func, Value
+
+
+def fill_search_vectors(apps, schema_editor):
+    """
+    Calculates the search vector of every existing candidate with ONE UPDATE query.
+    (This is the same expression as portal.search.candidate_search_vector(), without the CV text.)
+    """
+    Candidate = apps.get_model('portal', 'Candidate')
+    email_parts = Func(F('email'), Value(r'[@._+-]+'), Value(' '), Value('g'), function='regexp_replace')
+    Candidate.objects.update(search_vector=(
+        SearchVector('first_name', 'last_name', weight='A', config='simple')
+        + SearchVector('email', email_parts, weight='B', config='simple')
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('portal', '0003_dashboard_keyset_indexes'),
+    ]
+
+    operations = [
+        # The trigram indexes below need PostgreSQL's 'pg_trgm' extension.
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='candidate',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='candidate',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='candidate_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='candidate',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['first_name'], name='candidate_first_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='candidate',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['last_name'], name='candidate_last_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.RunPython(fill_search_vectors, migrations.RunPython.noop),
+    ]
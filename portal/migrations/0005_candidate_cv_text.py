@@ -0,0 +1,27 @@
+# Generated by Django 5.2.3 on 2026-10-18 02:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0004_candidate_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CandidateCVText',
+            fields=[
+                ('candidate', models.OneToOneField(help_text='The candidate whose resume this text was extracted from.', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='cv_text', serialize=False, to='portal.candidate')),
+                ('text', models.TextField(help_text="The text extracted from the candidate's resume.")),
+                ('page_count', models.PositiveIntegerField(default=0, help_text='The number of resume pages that were read.')),
+                ('extracted_at', models.DateTimeField(auto_now=True, help_text='The date and time when the text was extracted.')),
+            ],
+            options={
+                'verbose_name': 'Candidate CV Text',
+                'verbose_name_plural': 'Candidate CV Texts',
+            },
+        ),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 5.2.3 on 2026-10-18 02:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+# The same mapping as portal.models.PIPELINE_COUNT_FIELDS, copied so this migration never changes.
+PIPELINE_COUNT_FIELDS = {
+    'Pending': 'pending_count',
+    'Reviewed': 'reviewed_count',
+    'Interviewed': 'interviewed_count',
+    'Rejected': 'rejected_count',
+    'Hired': 'hired_count',
+}
+
+
+def fill_pipeline_counts(apps, schema_editor):
+    """
+    Counts the existing applications once: every job posting's counters are filled with ONE
+    UPDATE query, and every company's counters with one grouped query and one INSERT.
+    """
+    Application = apps.get_model('portal', 'Application')
+    JobPosting = apps.get_model('portal', 'JobPosting')
+    CompanyPipelineCounts = apps.get_model('portal', 'CompanyPipelineCounts')
+
+    def count_of(status):
+        counts = (
+            Application.objects
+            .filter(job_posting=OuterRef('pk'), status=status)
+            .order_by().values('job_posting')
+            .annotate(total=Count('id')).values('total')
+        )
+        return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+    JobPosting.objects.update(**{field: count_of(status) for status, field in PIPELINE_COUNT_FIELDS.items()})
+
+    per_company = (
+        Application.objects
+        .order_by().values('job_posting__company')
+        .annotate(**{field: Count('id', filter=Q(status=status)) for status, field in PIPELINE_COUNT_FIELDS.items()})
+    )
+    CompanyPipelineCounts.objects.bulk_create([
+        CompanyPipelineCounts(company_id=row.pop('job_posting__company'), **row) for row in per_company
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('portal', '0005_candidate_cv_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompanyPipelineCounts',
+            fields=[
+                ('pending_count', models.PositiveIntegerField(default=0, help_text="The number of 'Pending' applications.")),
+                ('reviewed_count', models.PositiveIntegerField(default=0, help_text="The number of 'Reviewed' applications.")),
+                ('interviewed_count', models.PositiveIntegerField(default=0, help_text="The number of 'Interviewed' applications.")),
+                ('rejected_count', models.PositiveIntegerField(default=0, help_text="The number of 'Rejected' applications.")),
+                ('hired_count', models.PositiveIntegerField(default=0, help_text="The number of 'Hired' applications.")),
+                ('company', models.OneToOneField(help_text='The company these counters belong to.', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='pipeline_counts', serialize=False, to='accounts.company')),
+            ],
+            options={
+                'verbose_name': 'Company Pipeline Counts',
+                'verbose_name_plural': 'Company Pipeline Counts',
+            },
+        ),
+        migrations.AddField(
+            model_name='jobposting',
+            name='hired_count',
+            field=models.PositiveIntegerField(default=0, help_text="The number of 'Hired' applications."),
+        ),
+        migrations.AddField(
+            model_name='jobposting',
+            name='interviewed_count',
+            field=models.PositiveIntegerField(default=0, help_text="The number of 'Interviewed' applications."),
+        ),
+        migrations.AddField(
+            model_name='jobposting',
+            name='pending_count',
+            field=models.PositiveIntegerField(default=0, help_text="The number of 'Pending' applications."),
+        ),
+        migrations.AddField(
+            model_name='jobposting',
+            name='rejected_count',
+            field=models.PositiveIntegerField(default=0, help_text="The number of 'Rejected' applications."),
+        ),
+        migrations.AddField(
+            model_name='jobposting',
+            name='reviewed_count',
+            field=models.PositiveIntegerField(default=0, help_text="The number of 'Reviewed' applications."),
+        ),
+        migrations.RunPython(fill_pipeline_counts, migrations.RunPython.noop),
+    ]
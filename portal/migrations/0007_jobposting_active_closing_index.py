@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 02:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('portal', '0006_pipeline_counts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='jobposting',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['closing_date'], name='jobposting_active_closing_idx'),
+        ),
+    ]
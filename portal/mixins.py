@@ -0,0 +1,35 @@
+"""
+Shared building blocks ("mixins") for the portal's class-based views.
+
+Django creates a new view object for every request, so anything a mixin stores on 'self'
+lives exactly as long as the request. We use that to load objects ONCE per request, even
+when several methods of the view (get_context_data, get_form_kwargs, form_valid, ...) need them.
+"""
+from django.shortcuts import get_object_or_404
+
+from .models import JobPosting
+
+
+class CompanyScopedMixin:
+    """
+    Resolves the objects a view works with, always limited to the logged-in user's company.
+
+    - get_company_id(): the id of the user's company.
+    - get_job_posting(): the job posting whose id is in the URL (the 'pk' by default).
+      SECURITY FEATURE: a posting of another company gives a 404 Not Found, exactly like a missing one.
+
+    Use it after LoginRequiredMixin, so only logged-in users ever reach these methods.
+    """
+    job_posting_url_kwarg = 'pk'
+
+    def get_company_id(self):
+        if not hasattr(self, '_company_id'):
+            self._company_id = self.request.user.employee.company_id
+        return self._company_id
+
+    def get_job_posting(self):
+        if not hasattr(self, '_job_posting'):
+            self._job_posting = get_object_or_404(
+                JobPosting, pk=self.kwargs[self.job_posting_url_kwarg], company_id=self.get_company_id()
+            )
+        return self._job_posting
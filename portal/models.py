@@ -1,8 +1,11 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Q # Builds the condition of our partial index (JobPosting).
 from django.contrib.auth.models import User # Required for User relationship (Employee)
 from accounts.models import Company # Required for Company relationships (Employee, JobPosting, Candidate)
 from django.core.validators import FileExtensionValidator, EmailValidator # Required for validation (Candidate)
 from django.utils import timezone # We need this to get the current time.
+from django.contrib.postgres.indexes import GinIndex # The index type PostgreSQL uses for full-text and trigram search.
+from django.contrib.postgres.search import SearchVectorField
 class Employee(models.Model):
     """
     It links an internal User (login capability) to a specific Company.
@@ -38,7 +41,59 @@ class Employee(models.Model):
 
 #------------------------------------------------------------------------------------------------------------------------
 
-class JobPosting(models.Model):
+# Maps each application status to the counter field that counts it (see PipelineCounts).
+PIPELINE_COUNT_FIELDS = {
+    'Pending': 'pending_count',
+    'Reviewed': 'reviewed_count',
+    'Interviewed': 'interviewed_count',
+    'Rejected': 'rejected_count',
+    'Hired': 'hired_count',
+}
+
+# The status changes that the bulk status API allows (see change_application_statuses() in pipeline.py):
+# each status maps to the set of statuses an application may move to from there.
+# A rejected application can be reopened; a hire is final.
+ALLOWED_STATUS_TRANSITIONS = {
+    'Pending': {'Reviewed', 'Interviewed', 'Rejected'},
+    'Reviewed': {'Interviewed', 'Rejected'},
+    'Interviewed': {'Hired', 'Rejected'},
+    'Rejected': {'Pending'},
+    'Hired': set(),
+}
+
+
+class PipelineCounts(models.Model):
+    """
+    An abstract base model: the number of applications in each status ("the hiring pipeline").
+    It is used by JobPosting (the counts of one posting) and CompanyPipelineCounts (the counts of
+    a whole company), so the dashboard and the job posting page can show these numbers without
+    counting the applications table every time.
+
+    The counters are kept up to date by Application.save() and by the 'post_delete' signal
+    (see pipeline.py). Code that changes applications WITHOUT calling save() or delete() on each
+    of them (e.g. bulk_create() or queryset.update()) must call update_pipeline_counts() itself.
+    """
+    pending_count = models.PositiveIntegerField(default=0, help_text="The number of 'Pending' applications.")
+    reviewed_count = models.PositiveIntegerField(default=0, help_text="The number of 'Reviewed' applications.")
+    interviewed_count = models.PositiveIntegerField(default=0, help_text="The number of 'Interviewed' applications.")
+    rejected_count = models.PositiveIntegerField(default=0, help_text="The number of 'Rejected' applications.")
+    hired_count = models.PositiveIntegerField(default=0, help_text="The number of 'Hired' applications.")
+
+    class Meta:
+        abstract = True
+
+    @property
+    def total_applications(self):
+        return sum(getattr(self, field) for field in PIPELINE_COUNT_FIELDS.values())
+
+    def pipeline(self):
+        """
+        Returns the counters as a list of (status, count) pairs, in the order of the hiring process.
+        """
+        return [(status, getattr(self, field)) for status, field in PIPELINE_COUNT_FIELDS.items()]
+
+
+class JobPosting(PipelineCounts):
     """
     Represents a job vacancy posted by a company.
     This version includes an overridden save() method for automatic status management.
@@ -69,7 +124,17 @@ class JobPosting(models.Model):
     class Meta:
         verbose_name = "Job Posting"
         verbose_name_plural = "Job Postings"
-        ordering = ['-created_at']
+        # The 'id' breaks ties between postings created at the same moment, so the order is always
+        # the same; the dashboard's keyset pagination depends on that (see selectors.py).
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # Lets the database read one company's postings, newest first, straight from the index.
+            models.Index(fields=['company', '-created_at', '-id'], name='jobposting_company_created_idx'),
+            # A "partial" index: it only contains the ACTIVE postings, ordered by closing date. The expiry
+            # task (deactivate_expired_postings) runs every minute and reads just the postings that are due
+            # from it, however many closed postings the table has collected over the years.
+            models.Index(fields=['closing_date'], condition=Q(is_active=True), name='jobposting_active_closing_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} at {self.company.name}"
@@ -89,6 +154,15 @@ class JobPosting(models.Model):
             else:
                 self.is_active = False
         
+        # The pipeline counters are changed by the database itself ('count = count + 1', see pipeline.py).
+        # Saving an existing posting (e.g. from the edit form or the admin) must not write back the
+        # counters that were read when this object was loaded, or it would undo every change made since.
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in PIPELINE_COUNT_FIELDS.values()
+            ]
+
         # After setting the status, we call the original, default save method
         # from the parent class to actually save the object to the database.
         super().save(*args, **kwargs)
@@ -146,15 +220,90 @@ class Candidate(models.Model):
         help_text="The HR Employee who created this candidate record."
     )
     created_at = models.DateTimeField(auto_now_add=True, help_text="The date and time when the candidate record was created.")
+    # The pre-processed words of the name, email and CV text, used by the candidate search (see search.py).
+    # It is filled in by refresh_candidate_search_vectors() after every save.
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
         verbose_name = "Candidate"
         verbose_name_plural = "Candidates"
-        ordering = ['last_name', 'first_name'] # Orders candidates by last then first name
+        # Orders candidates by last then first name; the 'id' breaks ties between identical names,
+        # which the dashboard's keyset pagination depends on (see selectors.py).
+        ordering = ['last_name', 'first_name', 'id']
+        indexes = [
+            # Lets the database read one company's candidates in name order straight from the index.
+            models.Index(fields=['company', 'last_name', 'first_name', 'id'], name='candidate_company_name_idx'),
+            # The full-text search index.
+            GinIndex(fields=['search_vector'], name='candidate_search_vector_idx'),
+            # The trigram indexes for fuzzy name matching (they need PostgreSQL's pg_trgm extension).
+            GinIndex(fields=['first_name'], opclasses=['gin_trgm_ops'], name='candidate_first_name_trgm_idx'),
+            GinIndex(fields=['last_name'], opclasses=['gin_trgm_ops'], name='candidate_last_name_trgm_idx'),
+        ]
 
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.email})"
 
+#------------------------------------------------------------------------------------------------------------------------
+class CandidateCVText(models.Model):
+    """
+    The text that was extracted from a candidate's resume PDF, stored once so that no
+    feature (search, matching, re-extraction with a better prompt) ever has to open and
+    parse the PDF again. It is filled in by the 'store_candidate_cv_texts' task and by
+    the 'backfill_cv_text' management command (see store_cv_texts() in tasks.py).
+
+    The text lives in its own table, so loading candidates for lists never reads it.
+    PostgreSQL compresses long text values automatically (its "TOAST" storage), and keeping
+    it as plain text lets SQL read it directly, e.g. to build the candidate's search vector.
+
+    Fields:
+    - candidate (PK, FK): One-to-One relationship with the Candidate model.
+    - text: The extracted text of the resume.
+    - page_count: The number of pages that were read.
+    - extracted_at: When the text was (last) extracted.
+    """
+    candidate = models.OneToOneField(
+        Candidate,
+        on_delete=models.CASCADE, # If the Candidate is deleted, their CV text is also deleted.
+        primary_key=True,
+        related_name='cv_text',
+        help_text="The candidate whose resume this text was extracted from."
+    )
+    text = models.TextField(help_text="The text extracted from the candidate's resume.")
+    page_count = models.PositiveIntegerField(default=0, help_text="The number of resume pages that were read.")
+    extracted_at = models.DateTimeField(auto_now=True, help_text="The date and time when the text was extracted.")
+
+    class Meta:
+        verbose_name = "Candidate CV Text"
+        verbose_name_plural = "Candidate CV Texts"
+
+    def __str__(self):
+        return f"CV text of candidate #{self.candidate_id} ({len(self.text)} characters)"
+
+#------------------------------------------------------------------------------------------------------------------------
+class CompanyPipelineCounts(PipelineCounts):
+    """
+    The number of applications in each status across ALL job postings of a company (see PipelineCounts).
+    The row of a company is created together with its first application.
+
+    Fields:
+    - company (PK, FK): One-to-One relationship with the Company model.
+    - pending_count ... hired_count: The counters (see PipelineCounts).
+    """
+    company = models.OneToOneField(
+        Company,
+        on_delete=models.CASCADE, # If the Company is deleted, its counters are also deleted.
+        primary_key=True,
+        related_name='pipeline_counts',
+        help_text="The company these counters belong to."
+    )
+
+    class Meta:
+        verbose_name = "Company Pipeline Counts"
+        verbose_name_plural = "Company Pipeline Counts"
+
+    def __str__(self):
+        return f"Pipeline of company #{self.company_id} ({self.total_applications} applications)"
+
 #------------------------------------------------------------------------------------------------------------------------
 class Application(models.Model):
     """
@@ -210,4 +359,27 @@ class Application(models.Model):
         ordering = ['-application_date'] # Orders applications by date, newest first
 
     def __str__(self):
-        return f"Application by {self.candidate.first_name} {self.candidate.last_name} for {self.job_posting.title}"
\ No newline at end of file
+        return f"Application by {self.candidate.first_name} {self.candidate.last_name} for {self.job_posting.title}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Remembers the status an application had when it was loaded from the database,
+        so that save() can tell whether the status has changed (see pipeline.py).
+        """
+        instance = super().from_db(db, field_names, values)
+        if 'status' in field_names and values[field_names.index('status')] is not models.DEFERRED:
+            instance._loaded_status = instance.status
+        return instance
+
+    def save(self, *args, **kwargs):
+        """
+        Saves the application and updates the pipeline counters of its job posting and company
+        in the same database transaction, so the counters and the applications can never disagree.
+        (The counters themselves are updated by the 'post_save' signal receiver in pipeline.py.)
+        """
+        with transaction.atomic():
+            if not self._state.adding and not hasattr(self, '_loaded_status'):
+                # This object was not loaded from the database (e.g. built with a known id), so we read its current status.
+                self._loaded_status = Application.objects.filter(pk=self.pk).values_list('status', flat=True).first()
+            super().save(*args, **kwargs)
\ No newline at end of file
@@ -0,0 +1,58 @@
+"""
+Reads PDF files in a sandboxed child process.
+
+A malformed (or deliberately crafted) PDF can make PyPDF2 loop for minutes or use gigabytes
+of memory. If that happened inside a Celery worker, the worker slot would be stuck for everyone.
+So every PDF is read by a separate, short-lived Python process (pdf_worker.py) with hard limits:
+
+- CPU time:  CV_PDF_SANDBOX_CPU_SECONDS. The operating system kills the process when it is used up.
+- Memory:    CV_PDF_SANDBOX_MEMORY_MB. Larger allocations fail inside the child, not in the worker.
+- Wall time: CV_PDF_TIME_LIMIT. A timer kills the child if it is still running after that (e.g. stuck on I/O).
+
+The child sends the text back page by page, so the caller can stop reading (and we kill the child)
+as soon as it has found what it needs.
+"""
+import json
+import os
+import subprocess
+import sys
+import threading
+
+from django.conf import settings
+
+# The child program. It is run by path, so it does not need Django at all.
+PDF_WORKER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pdf_worker.py')
+
+
+def iter_pdf_pages_sandboxed(pdf_path, max_pages, time_limit):
+    """
+    Yields the text of a PDF one page at a time, read by a sandboxed child process.
+    If the child is killed by one of its limits, the pages it sent so far are kept
+    and the rest of the document is simply skipped.
+    """
+    # The child sets its CPU and memory limits itself, before it reads anything (see pdf_worker.py).
+    # (Setting them with Popen's 'preexec_fn' is not safe when the caller has threads,
+    # e.g. the backfill_cv_text command.)
+    memory_bytes = settings.CV_PDF_SANDBOX_MEMORY_MB * 1024 * 1024
+    process = subprocess.Popen(
+        [sys.executable, PDF_WORKER_PATH, str(pdf_path), str(max_pages), str(settings.CV_PDF_SANDBOX_CPU_SECONDS), str(memory_bytes)],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    # The wall-clock limit: the timer kills the child; reading its output then ends immediately.
+    timer = threading.Timer(time_limit, process.kill)
+    timer.start()
+    reached_the_end = False
+    try:
+        for line in process.stdout:
+            yield json.loads(line)
+        reached_the_end = True
+    finally:
+        # This also runs when the caller stops early: the child is not needed anymore.
+        timer.cancel()
+        process.kill()
+        process.stdout.close()
+        return_code = process.wait()
+        # If the child ended on its own with an error code, it hit a limit or could not read the PDF.
+        if reached_the_end and return_code != 0:
+            print(f"[PDF Sandbox] Reading {pdf_path} stopped early (exit code {return_code}): a limit was reached or the PDF is unreadable.")
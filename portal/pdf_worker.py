@@ -0,0 +1,46 @@
+"""
+The child process that reads a PDF for the PDF sandbox (see pdf_sandbox.py).
+
+It is started as a separate Python program, NOT imported by Django:
+
+    python portal/pdf_worker.py <pdf_path> <max_pages> <cpu_seconds> <memory_bytes>
+
+It prints the text of each page as one JSON string per line, as soon as the page is read.
+It only imports PyPDF2, so it starts quickly and a broken PDF can only harm this process.
+"""
+import json
+import sys
+
+
+def limit_resources(cpu_seconds, memory_bytes):
+    """
+    Sets the CPU and memory limits of this process. The operating system enforces them from now on.
+    (Limits only exist on Unix, e.g. in our Docker image; elsewhere only the parent's timer applies.)
+    """
+    try:
+        import resource
+    except ImportError:
+        return
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds))
+    resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+
+
+def main():
+    pdf_path = sys.argv[1]
+    max_pages = int(sys.argv[2])
+    # The limits are set FIRST, before the PDF library is imported and before the file is opened.
+    limit_resources(int(sys.argv[3]), int(sys.argv[4]))
+
+    import PyPDF2
+
+    with open(pdf_path, 'rb') as pdf_file:
+        pdf_reader = PyPDF2.PdfReader(pdf_file)
+        for page_number, page in enumerate(pdf_reader.pages):
+            if page_number >= max_pages:
+                break
+            # 'flush=True' sends every page to the parent right away, so it can stop us early.
+            print(json.dumps(page.extract_text() or ""), flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""
+Keeps the pipeline counters (the number of applications in each status) up to date.
+
+Every job posting and every company has one counter per application status (see PipelineCounts
+in models.py). Instead of counting the applications table each time a page shows these numbers,
+we change the counters whenever an application changes:
+
+- a new application:      +1 on its status,
+- a status change:        -1 on the old status, +1 on the new one,
+- a deleted application:  -1 on its status (also when it is deleted because its candidate or job posting is).
+
+Each change is a single 'UPDATE ... SET count = count + 1' on the posting and on the company.
+The addition happens inside the database, so two requests that change counters at the same
+time can never overwrite each other's result.
+
+The signal receivers below are connected in PortalConfig.ready() (see apps.py).
+bulk_create() and queryset.update() do not send these signals, so apply_candidates_to_job() and
+change_application_statuses() update the counters themselves.
+"""
+from collections import Counter, defaultdict
+
+from django.db import connection, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .fragment_cache import invalidate_company_cache
+from .models import ALLOWED_STATUS_TRANSITIONS, Application, CompanyPipelineCounts, JobPosting, PIPELINE_COUNT_FIELDS
+
+
+def update_pipeline_counts(job_posting_id, changes):
+    """
+    Adds the given amounts to the counters of a job posting and of its company.
+    'changes' maps statuses to amounts, e.g. {'Pending': -1, 'Reviewed': 1}.
+    """
+    updates = {}
+    for status, amount in changes.items():
+        if not amount:
+            continue
+        field = PIPELINE_COUNT_FIELDS[status]
+        # A counter never goes below zero, even if it was already wrong.
+        updates[field] = Greatest(F(field) + amount, Value(0))
+    if not updates:
+        return
+
+    JobPosting.objects.filter(pk=job_posting_id).update(**updates)
+    # The company is found through the posting inside the same UPDATE query.
+    company_counts = CompanyPipelineCounts.objects.filter(company__job_postings=job_posting_id)
+    if not company_counts.update(**updates) and any(amount > 0 for amount in changes.values()):
+        # This is the company's first application, so its row of counters does not exist yet.
+        # (Removing from a company without a row needs no row: its counters would stay at zero.)
+        company_id = JobPosting.objects.filter(pk=job_posting_id).values_list('company_id', flat=True).first()
+        if company_id is not None:
+            CompanyPipelineCounts.objects.get_or_create(company_id=company_id)
+            company_counts.update(**updates)
+
+
+@receiver(post_save, sender=Application)
+def count_saved_application(sender, instance, created, **kwargs):
+    """
+    Counts a new application, or moves an application whose status changed to its new counter.
+    """
+    old_status = None if created else getattr(instance, '_loaded_status', None)
+    if old_status != instance.status:
+        changes = {instance.status: 1}
+        if old_status:
+            changes[old_status] = -1
+        update_pipeline_counts(instance.job_posting_id, changes)
+    # The saved status is the "loaded" status for the next save of the same object.
+    instance._loaded_status = instance.status
+
+
+@receiver(post_delete, sender=Application)
+def count_deleted_application(sender, instance, **kwargs):
+    """
+    Removes a deleted application from the counters.
+    """
+    update_pipeline_counts(instance.job_posting_id, {instance.status: -1})
+
+
+def apply_candidates_to_job(job_posting_id, candidate_ids):
+    """
+    Applies many candidates to one job posting at once and returns {'created': ..., 'skipped': ...}.
+    Candidates who already applied are skipped. The caller must make sure that all candidates
+    belong to the posting's company.
+
+    - ONE query finds the candidates who already applied, and the new applications are inserted
+      in a few large INSERTs (1,000 rows each) instead of one INSERT per candidate.
+    - 'ON CONFLICT DO NOTHING' lets the database's 'unique_application_for_job' constraint skip any
+      application that was created in the meantime (e.g. by a recruiter's form), instead of failing
+      the whole INSERT. 'RETURNING' tells us which rows were REALLY inserted, and only those are
+      counted: the skipped ones were already counted by whoever created them.
+    - The posting's row is locked until the end of the transaction, so two bulk applications to
+      the same posting run one after the other and each one counts exactly what it created.
+    """
+    candidate_ids = list(dict.fromkeys(candidate_ids)) # Removes duplicates, keeps the order.
+    with transaction.atomic():
+        job_posting = JobPosting.objects.select_for_update().only('id', 'company_id').get(pk=job_posting_id)
+        already_applied = set(
+            Application.objects
+            .filter(job_posting_id=job_posting_id, candidate_id__in=candidate_ids)
+            .values_list('candidate_id', flat=True)
+        )
+        new_ids = [candidate_id for candidate_id in candidate_ids if candidate_id not in already_applied]
+        created_count = _insert_applications(job_posting_id, new_ids)
+        # Every new application starts as 'Pending' (the field's default).
+        update_pipeline_counts(job_posting_id, {'Pending': created_count})
+        if created_count:
+            invalidate_company_cache(job_posting.company_id)
+    return {'created': created_count, 'skipped': len(candidate_ids) - created_count}
+
+
+def _insert_applications(job_posting_id, candidate_ids, batch_size=1000):
+    """
+    Inserts a 'Pending' application of every candidate to the job posting and returns how many
+    rows were actually inserted. Candidates who have an application already are skipped.
+    (Django's bulk_create() with ignore_conflicts=True cannot tell us which rows it skipped.)
+    """
+    table = connection.ops.quote_name(Application._meta.db_table)
+    now = timezone.now()
+    created_count = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(candidate_ids), batch_size):
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (job_posting_id, candidate_id, application_date, status)
+                SELECT %s, candidate_id, %s, 'Pending' FROM unnest(%s::bigint[]) AS candidate_id
+                ON CONFLICT DO NOTHING
+                RETURNING id
+                """,
+                [job_posting_id, now, candidate_ids[start:start + batch_size]],
+            )
+            created_count += len(cursor.fetchall())
+    return created_count
+
+
+def change_application_statuses(company_id, application_ids, new_status):
+    """
+    Moves many applications of one company to 'new_status' with ONE UPDATE query,
+    and returns the outcome of every id, in the order they were given:
+    - 'updated':     the status was changed,
+    - 'unchanged':   the application already had that status,
+    - 'not_allowed': the change is not in ALLOWED_STATUS_TRANSITIONS (e.g. from 'Hired'),
+    - 'not_found':   there is no such application in the user's company.
+    """
+    application_ids = list(dict.fromkeys(application_ids)) # Removes duplicates, keeps the order.
+    # The statuses from which the change is allowed, as one set, e.g. for 'Rejected': {'Pending', 'Reviewed', 'Interviewed'}.
+    allowed_from = {status for status, targets in ALLOWED_STATUS_TRANSITIONS.items() if new_status in targets}
+
+    with transaction.atomic():
+        # Step 1: ONE query reads the current status of all applications, and locks their rows until
+        # the end of the transaction, so nobody can change them between this check and the UPDATE.
+        # SECURITY FEATURE: only applications to the company's own job postings are found.
+        current = {
+            application_id: (status, job_posting_id)
+            for application_id, status, job_posting_id in (
+                Application.objects
+                .select_for_update()
+                .filter(id__in=application_ids, job_posting__company_id=company_id)
+                .order_by()
+                .values_list('id', 'status', 'job_posting_id')
+            )
+        }
+
+        results = []
+        to_update = []
+        for application_id in application_ids:
+            if application_id not in current:
+                results.append({'id': application_id, 'outcome': 'not_found'})
+                continue
+            old_status = current[application_id][0]
+            if old_status == new_status:
+                outcome = 'unchanged'
+            elif old_status in allowed_from:
+                outcome = 'updated'
+                to_update.append(application_id)
+            else:
+                outcome = 'not_allowed'
+            results.append({'id': application_id, 'outcome': outcome, 'from': old_status})
+
+        # Step 2: ONE UPDATE for all allowed changes. The status filter repeats the transition rule
+        # inside the database, as a second safety net.
+        Application.objects.filter(id__in=to_update, status__in=allowed_from).update(status=new_status)
+
+        # Step 3: Move the pipeline counters, grouped by job posting (one change per posting, not per application).
+        moved = defaultdict(Counter)
+        for application_id in to_update:
+            old_status, job_posting_id = current[application_id]
+            moved[job_posting_id][old_status] -= 1
+            moved[job_posting_id][new_status] += 1
+        for job_posting_id, changes in moved.items():
+            update_pipeline_counts(job_posting_id, changes)
+        if to_update:
+            invalidate_company_cache(company_id)
+
+    return results
@@ -0,0 +1,250 @@
+"""
+Ranks a company's candidates by how well their CV matches a job posting.
+
+The match is calculated with TF-IDF, the classic text-similarity method of search engines:
+- Every CV becomes a vector with one number per word: how often the word appears in the CV
+  (TF), multiplied by how rare the word is across all of the company's CVs (IDF). A word like
+  'kubernetes' that only a few CVs contain counts much more than 'experience', which all of them contain.
+- The job posting's title and description become a vector in the same way.
+- The score of a candidate is the cosine similarity of the two vectors: 1.0 for the same
+  words in the same proportions, 0.0 for no common word at all.
+
+The vectors of all CVs of a company are kept in ONE sparse matrix (scipy.sparse): a row per
+candidate, a column per word, and only the non-zero numbers are stored. Scoring every candidate
+against a posting is then a single matrix-vector multiplication in NumPy, which takes a few
+milliseconds even for tens of thousands of candidates.
+
+Building the matrix of a company ("the index") reads all of its CV texts, so it is never done
+while a user waits for a page:
+- A Celery task builds the index whenever the company's CV texts change (see
+  schedule_candidate_index_build()) and stores it in the shared default cache (Redis in Docker),
+  under a key that contains a fingerprint of the CV texts (see _index_fingerprint()).
+- The job posting page only LOADS the index of the current fingerprint. Each worker process also
+  keeps the last few loaded indexes in memory. While the index is still being built, the page shows
+  the candidates unranked, and it is refreshed as soon as the task has finished.
+- The top-N result of each posting is stored in the default cache. Its key contains a digest of
+  the posting's title and description, so editing the posting automatically gives a new result.
+"""
+import hashlib
+import math
+import re
+from collections import Counter, OrderedDict
+
+import numpy as np
+from scipy import sparse
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+
+from .models import CandidateCVText
+
+# A word starts with a letter and is at least two characters long, so plain numbers and single letters are skipped.
+# '+', '#', '.' and '-' may appear inside a word, so 'c++', 'c#' and 'node.js' are kept whole.
+TOKEN_PATTERN = re.compile(r'[^\W\d_][\w+#.-]*[\w+#]')
+
+# Very common English words that say nothing about a candidate's skills.
+STOP_WORDS = {
+    'and', 'the', 'for', 'with', 'you', 'our', 'are', 'will', 'from', 'this', 'that', 'have', 'has',
+    'was', 'were', 'not', 'but', 'all', 'can', 'who', 'your', 'their', 'they', 'its', 'into', 'also',
+    'of', 'to', 'in', 'on', 'at', 'by', 'an', 'as', 'or', 'is', 'be', 'we', 'it', 'my', 'me', 'am',
+}
+
+# How many company indexes each worker process keeps in memory (the least recently used one is dropped).
+MAX_CACHED_INDEXES = 8
+_company_indexes = OrderedDict()
+
+# How long (in seconds) a queued index build blocks the next one for the same CV texts.
+INDEX_BUILD_LOCK_TIMEOUT = 300
+
+
+def tokenize(text):
+    """
+    Splits a text into its lowercased words, without the stop words.
+    """
+    return [word for word in TOKEN_PATTERN.findall(text.lower()) if word not in STOP_WORDS]
+
+
+class CandidateIndex:
+    """
+    The TF-IDF vectors of all CVs of one company.
+    - candidate_ids: a NumPy array with the candidate id of each row.
+    - matrix: the sparse (candidates x words) matrix; every row has length 1.
+    - vocabulary: maps each word to its column.
+    - idf: a NumPy array with the IDF weight of each column.
+    """
+
+    def __init__(self, candidate_ids, matrix, vocabulary, idf):
+        self.candidate_ids = candidate_ids
+        self.matrix = matrix
+        self.vocabulary = vocabulary
+        self.idf = idf
+
+    @classmethod
+    def build(cls, documents):
+        """
+        Builds the index from (candidate_id, text) pairs.
+        The matrix is assembled directly in the CSR format (row pointers, column numbers, values),
+        so no dense (candidates x words) table is ever created.
+        """
+        candidate_ids = []
+        vocabulary = {}
+        indptr = [0]
+        indices = []
+        term_counts = []
+        for candidate_id, text in documents:
+            counts = Counter(tokenize(text))
+            if not counts:
+                continue
+            candidate_ids.append(candidate_id)
+            for word, count in counts.items():
+                indices.append(vocabulary.setdefault(word, len(vocabulary)))
+                term_counts.append(count)
+            indptr.append(len(indices))
+
+        shape = (len(candidate_ids), len(vocabulary))
+        # The raw counts are damped (1 + log), so a word that is repeated 20 times does not
+        # count 20 times as much as a word that appears once.
+        tf = 1.0 + np.log(np.asarray(term_counts, dtype=np.float64))
+        matrix = sparse.csr_matrix((tf, np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int64)), shape=shape)
+
+        # The document frequency of each word: in how many CVs it appears.
+        document_frequency = np.bincount(matrix.indices, minlength=shape[1])
+        idf = np.log((1.0 + shape[0]) / (1.0 + document_frequency)) + 1.0
+        matrix = matrix.multiply(idf).tocsr()
+        return cls(np.asarray(candidate_ids, dtype=np.int64), _normalize_rows(matrix), vocabulary, idf)
+
+    def query_vector(self, text):
+        """
+        Turns a text into a vector of the same shape as the rows, with length 1.
+        Words that appear in no CV are left out: they cannot match anyone.
+        """
+        vector = np.zeros(len(self.vocabulary), dtype=np.float64)
+        for word, count in Counter(tokenize(text)).items():
+            column = self.vocabulary.get(word)
+            if column is not None:
+                vector[column] = (1.0 + math.log(count)) * self.idf[column]
+        length = np.linalg.norm(vector)
+        return vector / length if length else vector
+
+    def top_matches(self, text, limit):
+        """
+        Returns the best 'limit' candidates for the text as a list of (candidate_id, score),
+        best first. Candidates with no common word at all are left out.
+        """
+        if not len(self.candidate_ids) or limit <= 0:
+            return []
+        scores = self.matrix @ self.query_vector(text)
+        # argpartition finds the best 'limit' rows without sorting all of them; only those are sorted.
+        if limit < len(scores):
+            best_rows = np.argpartition(-scores, limit - 1)[:limit]
+        else:
+            best_rows = np.arange(len(scores))
+        best_rows = best_rows[np.argsort(-scores[best_rows], kind='stable')]
+        return [(int(self.candidate_ids[row]), round(float(scores[row]), 4)) for row in best_rows if scores[row] > 0]
+
+
+def _normalize_rows(matrix):
+    """
+    Divides every row of a sparse matrix by its length, so the dot product of two rows is their cosine similarity.
+    """
+    lengths = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    lengths[lengths == 0] = 1.0
+    return sparse.diags(1.0 / lengths).dot(matrix).tocsr()
+
+
+def _index_fingerprint(company_id):
+    """
+    A short summary of the company's CV texts, read with ONE aggregate query.
+    It changes whenever a CV text is added, replaced or removed (including when a candidate is deleted),
+    which tells us that the index must be rebuilt.
+    """
+    summary = CandidateCVText.objects.filter(candidate__company_id=company_id).aggregate(
+        count=Count('candidate_id'), last_id=Max('candidate_id'), last_extracted=Max('extracted_at')
+    )
+    last_extracted = summary['last_extracted'].isoformat() if summary['last_extracted'] else ''
+    return f"{summary['count']}-{summary['last_id']}-{last_extracted}"
+
+
+def _index_cache_key(company_id, fingerprint):
+    return f"candidate-index:{company_id}:{fingerprint}"
+
+
+def _remember_index(company_id, fingerprint, index):
+    # Keeps the index in this process's memory, so it is not loaded from the cache again for every posting.
+    _company_indexes[company_id] = (fingerprint, index)
+    _company_indexes.move_to_end(company_id)
+    while len(_company_indexes) > MAX_CACHED_INDEXES:
+        _company_indexes.popitem(last=False)
+
+
+def build_candidate_index(company_id):
+    """
+    Builds the CandidateIndex of a company from its CV texts and stores it in the shared cache.
+    It runs in a Celery worker (see the build_company_candidate_index task in tasks.py).
+    """
+    fingerprint = _index_fingerprint(company_id)
+    # The texts are streamed from the database in chunks, so they are never all in memory at once.
+    documents = (
+        CandidateCVText.objects
+        .filter(candidate__company_id=company_id)
+        .order_by('candidate_id')
+        .values_list('candidate_id', 'text')
+        .iterator(chunk_size=500)
+    )
+    index = CandidateIndex.build(documents)
+    cache.set(_index_cache_key(company_id, fingerprint), index, settings.JOB_RANKING_INDEX_CACHE_TIMEOUT)
+    _remember_index(company_id, fingerprint, index)
+    return index
+
+
+def schedule_candidate_index_build(company_id, fingerprint=None):
+    """
+    Queues the task that builds the company's index, once the current transaction is committed.
+    A build that is already queued for the same CV texts is not queued again.
+    """
+    # tasks.py imports this module, so the task can only be imported here.
+    from .tasks import build_company_candidate_index
+
+    fingerprint = fingerprint or _index_fingerprint(company_id)
+    if cache.add(f"candidate-index-build:{company_id}:{fingerprint}", 1, timeout=INDEX_BUILD_LOCK_TIMEOUT):
+        transaction.on_commit(lambda: build_company_candidate_index.delay(company_id))
+
+
+def get_candidate_index(company_id, fingerprint=None):
+    """
+    Returns the CandidateIndex of a company for its current CV texts, or None while it is still being
+    built. A missing index is queued for building; it is never built here.
+    """
+    fingerprint = fingerprint or _index_fingerprint(company_id)
+    cached = _company_indexes.get(company_id)
+    if cached and cached[0] == fingerprint:
+        _company_indexes.move_to_end(company_id)
+        return cached[1]
+
+    index = cache.get(_index_cache_key(company_id, fingerprint))
+    if index is None:
+        schedule_candidate_index_build(company_id, fingerprint)
+        return None
+    _remember_index(company_id, fingerprint, index)
+    return index
+
+
+def rank_candidates_for_job(job_posting, limit=20, cache_timeout=3600):
+    """
+    Returns the best matching candidates of the posting's company as a list of (candidate_id, score), best first,
+    or None while the company's index is still being built.
+    """
+    fingerprint = _index_fingerprint(job_posting.company_id)
+    posting_digest = hashlib.sha256(f"{job_posting.title}\n{job_posting.description}".encode('utf-8')).hexdigest()[:16]
+    cache_key = f"job-ranking:{job_posting.pk}:{posting_digest}:{fingerprint}:{limit}"
+
+    ranking = cache.get(cache_key)
+    if ranking is None:
+        index = get_candidate_index(job_posting.company_id, fingerprint)
+        if index is None:
+            return None
+        ranking = index.top_matches(f"{job_posting.title}\n{job_posting.description}", limit)
+        cache.set(cache_key, ranking, cache_timeout)
+    return ranking
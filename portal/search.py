@@ -0,0 +1,113 @@
+"""
+Server-side search over a company's candidates, backed by PostgreSQL indexes.
+
+Every candidate has a 'search_vector' column: a pre-processed list of the words in their
+name, email and CV text (a PostgreSQL 'tsvector'). A GIN index on it lets the database find
+all candidates that contain a word without reading the whole table. Each word is weighted:
+a match in the name counts more than a match in the email, which counts more than the CV text.
+
+Typos in names ("Jonatan" for "Jonathan") are handled by trigram matching: PostgreSQL's
+pg_trgm extension compares names by their 3-letter pieces, using the trigram indexes on
+first_name and last_name (see models.py).
+
+The search vector is NOT recalculated by the database on its own. Every place that creates
+or changes candidates calls refresh_candidate_search_vectors() right after saving them.
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db.models import F, Func, OuterRef, Q, Subquery, TextField, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Candidate, CandidateCVText
+
+# All our text is indexed with the 'simple' configuration: it lowercases words but does not
+# reduce them to an English stem, which suits names, emails and CVs in any language.
+SEARCH_CONFIG = 'simple'
+
+SEARCH_WORD_PATTERN = re.compile(r'\w+')
+
+
+def candidate_search_vector():
+    """
+    Builds the SQL expression that calculates a candidate's search vector from the database.
+    - 'A' weight: first and last name.
+    - 'B' weight: the email, both as a whole and split into its parts ('jane', 'doe', 'test', 'com').
+    - 'D' weight: the stored text of their CV (see the CandidateCVText model), if there is one.
+    """
+    email_parts = Func(F('email'), Value(r'[@._+-]+'), Value(' '), Value('g'), function='regexp_replace')
+    cv_text = Subquery(CandidateCVText.objects.filter(candidate=OuterRef('pk')).values('text')[:1])
+    return (
+        SearchVector('first_name', 'last_name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('email', email_parts, weight='B', config=SEARCH_CONFIG)
+        + SearchVector(Coalesce(cv_text, Value(''), output_field=TextField()), weight='D', config=SEARCH_CONFIG)
+    )
+
+
+def refresh_candidate_search_vectors(candidate_ids):
+    """
+    Recalculates the search vector of the given candidates with ONE UPDATE query, whatever their number.
+    The CV text is read inside the database, so it never travels to Python and back.
+    """
+    Candidate.objects.filter(id__in=candidate_ids).update(search_vector=candidate_search_vector())
+
+
+def _prefix_query(text):
+    """
+    Turns the user's text into a full-text query where every word may be the START of a
+    word in the candidate's data, so 'jan do' already finds 'Jane Doe'.
+    Only letters and digits are kept, so the user cannot inject query syntax.
+    """
+    words = SEARCH_WORD_PATTERN.findall(text.lower())
+    if not words:
+        return None
+    return SearchQuery(" & ".join(f"{word}:*" for word in words), search_type='raw', config=SEARCH_CONFIG)
+
+
+def candidate_search_queryset(company, text, exclude_job_posting_id=None):
+    """
+    Builds the search over the candidates of one company, best matches first, or returns None
+    if the text contains no searchable word.
+    A candidate matches if all words are found in their name, email or CV text, OR if
+    their first or last name is similar to the search text (for typos).
+    With 'exclude_job_posting_id', candidates who already applied to that job posting are left out.
+    """
+    text = text.strip()
+    query = _prefix_query(text)
+    if query is None:
+        return None
+
+    name_similarity = Greatest(TrigramSimilarity('first_name', text), TrigramSimilarity('last_name', text))
+    matches = Q(search_vector=query)
+    # The '%' operator (trigram_similar) is the one that can use the trigram indexes.
+    # It matches names that are at least 30% similar (PostgreSQL's default 'pg_trgm.similarity_threshold').
+    matches |= Q(first_name__trigram_similar=text) | Q(last_name__trigram_similar=text)
+
+    queryset = (
+        Candidate.objects
+        .filter(company=company)
+        .filter(matches)
+        .annotate(rank=SearchRank(F('search_vector'), query) + name_similarity)
+        .order_by('-rank', 'id')
+    )
+    if exclude_job_posting_id is not None:
+        queryset = queryset.exclude(applications__job_posting_id=exclude_job_posting_id)
+    return queryset
+
+
+def search_candidates(company, text, page=1, page_size=20, exclude_job_posting_id=None):
+    """
+    Searches the candidates of one company and returns one page of them as (rows, has_next_page).
+    (See candidate_search_queryset() for what matches.) This is used by the candidate search
+    API, e.g. for the application form's candidate picker.
+    """
+    queryset = candidate_search_queryset(company, text, exclude_job_posting_id)
+    if queryset is None:
+        return [], False
+    queryset = queryset.only('first_name', 'last_name', 'email')
+
+    # We read one row more than the page needs; if it exists, there is a next page.
+    # This avoids a separate (and, for big result sets, slow) COUNT query.
+    offset = (page - 1) * page_size
+    rows = list(queryset[offset:offset + page_size + 1])
+    return rows[:page_size], len(rows) > page_size
@@ -0,0 +1,163 @@
+"""
+The data loaders ("selectors") for our list pages.
+
+A template that shows a list often needs data from related tables as well, e.g. the dashboard
+shows the username of the employee who created each job posting: job.created_by.user.username.
+With a plain queryset, Django runs one extra query for EVERY row to get that data (the
+"N+1 queries" problem), so a company with 5,000 candidates needed over 10,000 queries.
+
+The selectors below load each list with a fixed number of queries, no matter how many rows it has:
+- select_related() fetches the related rows in the same query, using SQL JOINs.
+- only() loads just the columns the page actually shows, which keeps every row small.
+
+The dashboard also never loads a whole list at once. It shows one page at a time and loads the
+next page while the user scrolls, using keyset ("cursor") pagination: instead of 'OFFSET 5000',
+which makes the database count through 5,000 rows first, every page continues right AFTER the
+last row of the previous one ("created before this posting"). With the matching composite
+indexes (see models.py) every page costs the same, however large the company is.
+"""
+import base64
+import json
+from datetime import datetime
+
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from .models import Application, JobPosting, Candidate, PIPELINE_COUNT_FIELDS
+
+
+class InvalidCursor(ValueError):
+    """
+    Raised when a page cursor sent by the browser cannot be decoded.
+    """
+
+
+def encode_cursor(values):
+    """
+    Turns the sort values of the last row on a page into a short, URL-safe string.
+    """
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    The reverse of encode_cursor(). Raises InvalidCursor for anything it cannot read.
+    """
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, UnicodeError) as error:
+        raise InvalidCursor("Invalid page cursor.") from error
+
+
+def _keyset_page(queryset, page_size, cursor_values_of):
+    """
+    Reads one page from a queryset that is already filtered to start after the cursor.
+    We ask for one row more than we need: if it exists, there is a next page.
+    Returns (rows, next_cursor), where next_cursor is None on the last page.
+    """
+    rows = list(queryset[:page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, encode_cursor(cursor_values_of(rows[-1]))
+
+
+def dashboard_job_postings(company):
+    """
+    Returns the job postings of a company for the dashboard table, in ONE query.
+    The pipeline counters are loaded too, so the table can show each posting's number of applicants.
+    """
+    return (
+        JobPosting.objects
+        .filter(company=company)
+        .select_related('created_by__user')
+        .only('title', 'is_active', 'created_at', 'closing_date', 'created_by__user__username', *PIPELINE_COUNT_FIELDS.values())
+    )
+
+
+def dashboard_candidates(company):
+    """
+    Returns the candidates of a company for the dashboard table, in ONE query.
+    """
+    return (
+        Candidate.objects
+        .filter(company=company)
+        .select_related('created_by__user')
+        .only('first_name', 'last_name', 'email', 'resume', 'created_at', 'created_by__user__username')
+    )
+
+
+def job_postings_page(company, cursor=None, page_size=50):
+    """
+    Returns one page of a company's job postings, newest first, and the cursor of the next page.
+    The order is (created_at, id) descending, so a page starts with the postings that come
+    after the cursor's posting in that order.
+    """
+    queryset = dashboard_job_postings(company).order_by('-created_at', '-id')
+    if cursor:
+        try:
+            created_at, last_id = decode_cursor(cursor)
+            # The cursor comes from the browser, so we check every value before it reaches the query.
+            created_at = datetime.fromisoformat(created_at)
+            last_id = int(last_id)
+        except (TypeError, ValueError) as error:
+            raise InvalidCursor("Invalid page cursor.") from error
+        # 'created_at <= cursor' comes first, on its own: PostgreSQL can START the index scan there and
+        # skip every row before the cursor. (The OR that breaks ties between equal dates alone could
+        # only be checked row by row, so a deep page would read all the rows before it.)
+        queryset = queryset.filter(Q(created_at__lte=created_at) & (Q(created_at__lt=created_at) | Q(id__lt=last_id)))
+    return _keyset_page(queryset, page_size, lambda job: [job.created_at.isoformat(), job.id])
+
+
+def candidates_page(company, cursor=None, page_size=50):
+    """
+    Returns one page of a company's candidates in name order, and the cursor of the next page.
+    The order is (last_name, first_name, id) ascending.
+    """
+    queryset = dashboard_candidates(company).order_by('last_name', 'first_name', 'id')
+    if cursor:
+        try:
+            last_name, first_name, last_id = decode_cursor(cursor)
+            # The cursor comes from the browser, so we check every value before it reaches the query.
+            if not isinstance(last_name, str) or not isinstance(first_name, str):
+                raise TypeError("The names in a cursor must be text.")
+            last_id = int(last_id)
+        except (TypeError, ValueError) as error:
+            raise InvalidCursor("Invalid page cursor.") from error
+        # As in job_postings_page(): 'last_name >= cursor' lets the index scan start at the cursor.
+        queryset = queryset.filter(
+            Q(last_name__gte=last_name) & (
+                Q(last_name__gt=last_name)
+                | Q(last_name=last_name, first_name__gt=first_name)
+                | Q(last_name=last_name, first_name=first_name, id__gt=last_id)
+            )
+        )
+    return _keyset_page(queryset, page_size, lambda candidate: [candidate.last_name, candidate.first_name, candidate.id])
+
+
+def job_posting_applications_page(job_posting, page=1, page_size=50):
+    """
+    Returns one page of a job posting's applications and the number of pages, as (rows, page, num_pages).
+    - The candidate of each application is loaded in the same query (select_related), with only
+      the columns the page shows, so the whole page costs ONE query however many rows it has.
+    - The applications are ordered by their status, in the order of the hiring process
+      (Pending first, Hired last), and the newest first within each status.
+    - The number of pages comes from the posting's pipeline counters (see pipeline.py),
+      so no COUNT query over the applications table is needed.
+    """
+    num_pages = max(1, -(-job_posting.total_applications // page_size)) # Rounds up.
+    page = min(max(page, 1), num_pages)
+    stage_order = Case(
+        *[When(status=status, then=Value(position)) for position, status in enumerate(PIPELINE_COUNT_FIELDS)],
+        default=Value(len(PIPELINE_COUNT_FIELDS)),
+        output_field=IntegerField(),
+    )
+    queryset = (
+        Application.objects
+        .filter(job_posting=job_posting)
+        .select_related('candidate')
+        .only('status', 'application_date', 'candidate__first_name', 'candidate__last_name', 'candidate__email', 'candidate__resume')
+        .order_by(stage_order, '-application_date', '-id')
+    )
+    offset = (page - 1) * page_size
+    # The sliced queryset does not run until the page's rows are actually used.
+    return queryset[offset:offset + page_size], page, num_pages
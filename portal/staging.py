@@ -0,0 +1,124 @@
+"""
+The staging area for uploaded CV files.
+
+When a CV is uploaded for parsing, we write it to disk exactly once, into a
+temporary folder under MEDIA_ROOT, and name it after the SHA-256 hash of its
+content (the "staged key"). From then on, only this short key travels between
+the browser, the Celery tasks and the save API, instead of the whole file.
+
+When the candidate is finally saved, the staged file is simply moved (renamed)
+into the 'resumes/' folder. Because the staging folder lives on the same disk
+as the media files, this costs no extra copy.
+
+Layout on disk:  MEDIA_ROOT/staging/<company_id>/<sha256>.pdf
+"""
+import hashlib
+import os
+import re
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils.text import get_valid_filename
+
+# A staged key is always a SHA-256 hex digest. We validate every key we receive
+# from the outside world against this pattern, so a key can never be used to
+# point at another path on the disk (e.g. '../../settings.py').
+STAGED_KEY_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+def _company_staging_dir(company_id):
+    """
+    Returns the folder that holds the staged files of one company.
+    Each company has its own folder, so a key can only be used by the company that uploaded the file.
+    """
+    return os.path.join(settings.CV_STAGING_ROOT, str(int(company_id)))
+
+
+def staged_path(company_id, staged_key):
+    """
+    Returns the absolute path of a staged file.
+    Raises ValueError if the key is not a valid SHA-256 hex digest.
+    """
+    if not isinstance(staged_key, str) or not STAGED_KEY_PATTERN.match(staged_key):
+        raise ValueError("Invalid staged file key.")
+    return os.path.join(_company_staging_dir(company_id), f"{staged_key}.pdf")
+
+
+def stage_upload(uploaded_file, company_id):
+    """
+    Writes an uploaded file into the staging area and returns its staged key.
+
+    The file is read only once: each chunk is hashed and written to a temporary
+    file at the same time. At the end, the temporary file is renamed to its final,
+    content-addressed name. If the same CV was already staged, the rename replaces the
+    existing copy with identical content, which also makes it "new" again for the
+    clean-up of stale staged files.
+    """
+    staging_dir = _company_staging_dir(company_id)
+    os.makedirs(staging_dir, exist_ok=True)
+
+    hasher = hashlib.sha256()
+    # We create the temporary file inside the staging folder itself, so the final rename stays on the same disk.
+    with tempfile.NamedTemporaryFile(dir=staging_dir, suffix='.part', delete=False) as temp_file:
+        for chunk in uploaded_file.chunks():
+            hasher.update(chunk)
+            temp_file.write(chunk)
+
+    staged_key = hasher.hexdigest()
+    # os.replace is atomic: readers see either no file or the complete file, never a half-written one.
+    os.replace(temp_file.name, staged_path(company_id, staged_key))
+    return staged_key
+
+
+def promote_staged(company_id, staged_key, original_filename):
+    """
+    Moves a staged file into the 'resumes/' media folder and returns the name
+    that should be stored in the Candidate's 'resume' field.
+    Raises FileNotFoundError if the staged file no longer exists.
+    """
+    source_path = staged_path(company_id, staged_key)
+    if not os.path.exists(source_path):
+        raise FileNotFoundError(f"The uploaded file for '{original_filename}' has expired. Please upload it again.")
+
+    # We ask the storage for a free name, exactly like FileField.save() would do.
+    resume_name = default_storage.get_available_name(
+        os.path.join('resumes', get_valid_filename(original_filename or 'resume.pdf'))
+    )
+    target_path = default_storage.path(resume_name)
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    os.replace(source_path, target_path)
+    return resume_name
+
+
+def restore_staged(company_id, staged_key, resume_name):
+    """
+    Undoes promote_staged(): moves a resume file back into the staging area.
+    It is used when the database work that the file was promoted for has failed,
+    so the user can simply try to save the candidate again.
+    """
+    os.replace(default_storage.path(resume_name), staged_path(company_id, staged_key))
+
+
+def purge_stale_staged_uploads(max_age_seconds):
+    """
+    Deletes staged files that were never saved as a candidate (e.g. rejected in the
+    review list, or the user closed the page). Returns the number of deleted files.
+    """
+    if not os.path.isdir(settings.CV_STAGING_ROOT):
+        return 0
+
+    cutoff = time.time() - max_age_seconds
+    deleted_count = 0
+    for folder, _subfolders, filenames in os.walk(settings.CV_STAGING_ROOT):
+        for filename in filenames:
+            file_path = os.path.join(folder, filename)
+            try:
+                if os.path.getmtime(file_path) < cutoff:
+                    os.remove(file_path)
+                    deleted_count += 1
+            except FileNotFoundError:
+                # The file was promoted or deleted by someone else in the meantime.
+                continue
+    return deleted_count
@@ -3,19 +3,27 @@
 from celery import shared_task
 import time
 from django.utils import timezone
-from .models import JobPosting, Candidate, Company # We need the Candidate model to create new profiles.
+from .models import JobPosting, Candidate, CandidateCVText, Company # We need the Candidate model to create new profiles.
 import PyPDF2 # The PDF library we just installed.
 
-import io # A library to handle file streams in memory.
-import base64 # A library to encode/decode binary data into text.
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
 import os      # To safely access environment variables (like API keys).
 import requests# To make HTTP requests to the external AI API.
 import json    # To parse the JSON response from the AI.
-from django.core.files.base import ContentFile # To save the in-memory file to the model.
 import re
+import hashlib
+from .cv_cache import get_cached_parse, set_cached_parse # The cache of already parsed CVs.
+from .staging import staged_path, promote_staged, purge_stale_staged_uploads # The staging area for uploaded CV files.
 
-import google.generativeai as genai # The official Google Gemini Python library.
+from .llm import get_llm_client # The shared AI client of this worker process.
+from .extraction import EMAIL_PATTERN, local_extract, record_tier_win # The fast local first tier of CV parsing.
+from .search import refresh_candidate_search_vectors # Keeps the candidate search index up to date.
+from .fragment_cache import invalidate_company_cache # Marks the cached page fragments of a company as outdated.
+from .pipeline import apply_candidates_to_job # Inserts many applications at once and updates the pipeline counters.
+from .pdf_sandbox import iter_pdf_pages_sandboxed # Reads PDFs in a child process with CPU, memory and time limits.
+from .ranking import build_candidate_index, schedule_candidate_index_build # The prebuilt candidate ranking index of each company.
 #----------------------------------------------------------------------------------------
 
 # The '@shared_task' decorator registers this function as a Celery task.
@@ -42,37 +50,41 @@ def deactivate_expired_postings():
     """
     This task finds all active job postings whose closing date has passed
     and deactivates them.
+
+    It runs EVERY MINUTE (see CELERY_BEAT_SCHEDULE), so a posting closes at most a minute after
+    its closing date. That is cheap because of the partial index 'jobposting_active_closing_idx':
+    it only contains active postings, so the query below reads just the postings that are due,
+    and finding none (the usual case) is a single, tiny index lookup.
+    A changed closing date needs no extra work: the task always reads the current one.
     """
     # Get the current time. timezone.now() is Django's way of getting the current
     # time, and it's aware of the project's time zone settings.
     now = timezone.now()
-    
-    # Print a message to the worker's console so we know the task has started.
-    print(f"Running deactivate_expired_postings task at {now}...")
-    
-    # This is the core of our logic. We query the database for JobPosting objects.
-    # We are looking for postings that meet two conditions:
+
+    # This is the core of our logic. We look for postings that meet two conditions:
     # 1. is_active=True  -> The posting is currently active.
-    # 2. closing_date__lt=now -> The posting's closing date is less than (lt) the current time.
-    #    '__lt' is Django's syntax for 'less than'.
-    expired_postings = JobPosting.objects.filter(is_active=True, closing_date__lt=now)
-    
-    # We check if the query found any expired postings.
-    if expired_postings.exists():
-        # .update() is a very efficient way to update multiple objects at once.
-        # It performs a single database query to set 'is_active' to False for all
-        # found postings, instead of looping through them one by one.
-        count = expired_postings.update(is_active=False)
-        
-        # We print a success message showing how many postings were updated.
-        message = f"Successfully deactivated {count} expired job posting(s)."
-        print(message)
-        return message
-    else:
-        # If no expired postings were found, we also print a message.
-        message = "No expired job postings to deactivate."
-        print(message)
-        return message
+    # 2. closing_date__lte=now -> The posting's closing date has been reached.
+    # ONE query reads the ids and companies of the due postings from the partial index.
+    expired = list(
+        JobPosting.objects.filter(is_active=True, closing_date__lte=now)
+        .order_by()
+        .values_list('id', 'company_id')
+    )
+    if not expired:
+        return "No expired job postings to deactivate."
+
+    # .update() is a very efficient way to update multiple objects at once.
+    # It performs a single database query to set 'is_active' to False for all
+    # found postings, instead of looping through them one by one.
+    # 'is_active=True' is checked again, in case a posting was changed in the meantime.
+    count = JobPosting.objects.filter(id__in=[job_posting_id for job_posting_id, company_id in expired], is_active=True).update(is_active=False)
+    # .update() sends no signals, so we also tell the page cache which companies changed.
+    invalidate_company_cache(*[company_id for job_posting_id, company_id in expired])
+
+    # We print a success message showing how many postings were updated.
+    message = f"Successfully deactivated {count} expired job posting(s)."
+    print(message)
+    return message
     
 #-----------------------------------------------------------------------------------------
 """
@@ -196,90 +208,308 @@ def process_single_cv(file_content_b64, original_filename, company_id, created_b
         return f"Failed: {e}"
 """
 
-# We add the 'create_candidate=True' argument. The '=True' part makes it an
-# optional argument with a default value. This means if the argument is not
-# provided, it will assume we want to create a candidate.
-@shared_task
-def process_single_cv(file_content_b64, original_filename, company_id, created_by_id, create_candidate=True):
+# --- The AI Extraction Settings ---
+# The prompt we use to extract the candidate's details from a CV. The model is set by LLM_MODEL in settings.py.
+CV_EXTRACTION_PROMPT = (
+    "You are an expert HR assistant. From the following CV text, extract the "
+    "first_name, last_name, and email into a valid JSON object. "
+    "If a piece of information cannot be found, set its value to null. "
+    "Return ONLY the JSON object and nothing else. \n\nCV Text: ```{cv_text}```"
+)
+# The prompt used by bulk imports, which sends SEVERAL CVs in one AI request (see process_cv_batch).
+# Every CV gets a numeric id, and the AI must repeat that id in its answer, so we can map each
+# object of the JSON array back to its file even if the AI skips a CV or changes the order.
+CV_BATCH_EXTRACTION_PROMPT = (
+    "You are an expert HR assistant. Below are several CVs, each starting with a '### CV <id>' header. "
+    "For EACH CV, extract the first_name, last_name, and email. "
+    "If a piece of information cannot be found, set its value to null. "
+    "Return ONLY a valid JSON array with one object per CV, like "
+    '[{{"id": 0, "first_name": ..., "last_name": ..., "email": ...}}], and nothing else.'
+    "\n\n{cv_sections}"
+)
+CV_BATCH_SECTION = "### CV {id}\nCV Text: ```{cv_text}```\n\n"
+# A short fingerprint of the backend, the model and the prompts. It is part of the parse cache key,
+# so changing any of them (e.g. from the 'stub' backend to 'gemini') means old cached answers are no longer used.
+CV_PARSER_VERSION = hashlib.sha256(
+    f"{settings.LLM_BACKEND}\n{settings.LLM_MODEL}\n{CV_EXTRACTION_PROMPT}\n{CV_BATCH_EXTRACTION_PROMPT}".encode('utf-8')
+).hexdigest()[:16]
+
+NAME_PATTERN = re.compile(r'([A-Z][a-z]+)\s+([A-Z][a-z]+)')
+
+
+def iter_cv_pages(pdf_path, max_pages, time_limit):
     """
-    Processes a single CV using an AI-first approach with a RegEx fallback.
-    If 'create_candidate' is True, it saves the profile to the database.
-    Otherwise, it returns the extracted data as a dictionary.
+    Yields the text of a PDF one page at a time, so a caller can stop reading as soon as it
+    has what it needs. It never reads more than 'max_pages' pages, and it stops starting new
+    pages once 'time_limit' seconds have passed (a page that is already being read still finishes).
+    With CV_PDF_SANDBOX switched on (the default), the PDF is read in a separate child process
+    with hard CPU, memory and time limits instead (see pdf_sandbox.py).
     """
-    print(f"--- [Celery Task] Starting to PARSE CV: {original_filename} ---")
-    try:
-        # --- Step 1: Decode the File and Extract Raw Text ---
-        file_content = base64.b64decode(file_content_b64)
-        pdf_file = io.BytesIO(file_content)
+    if settings.CV_PDF_SANDBOX:
+        yield from iter_pdf_pages_sandboxed(pdf_path, max_pages, time_limit)
+        return
+
+    started_at = time.monotonic()
+    # PyPDF2 reads the file straight from the disk; we never load a second copy into memory.
+    with open(pdf_path, 'rb') as pdf_file:
         pdf_reader = PyPDF2.PdfReader(pdf_file)
-        extracted_text = ""
-        for page in pdf_reader.pages:
-            extracted_text += page.extract_text() or ""
+        for page_number, page in enumerate(pdf_reader.pages):
+            if page_number >= max_pages:
+                print(f"[Celery Task] Stopped reading {pdf_path} after {max_pages} pages.")
+                return
+            if time.monotonic() - started_at > time_limit:
+                print(f"[Celery Task] Stopped reading {pdf_path} after {time_limit} seconds.")
+                return
+            yield page.extract_text() or ""
+
+
+def read_cv_text(pdf_path):
+    """
+    Reads the text of a PDF that we need for parsing, and no more. It stops at the first of:
+    - CV_PDF_MAX_CHARS characters (the AI never sees more than that anyway),
+    - the point where the local extractor is sure about the name and the email,
+    - CV_PDF_MAX_PAGES pages or CV_PDF_TIME_LIMIT seconds (e.g. a 60-page portfolio).
+    """
+    pages = iter_cv_pages(pdf_path, settings.CV_PDF_MAX_PAGES, settings.CV_PDF_TIME_LIMIT)
+    page_texts = []
+    character_count = 0
+    try:
+        for page_text in pages:
+            page_texts.append(page_text)
+            character_count += len(page_text)
+            if character_count >= settings.CV_PDF_MAX_CHARS:
+                break
+            # The name and the email are usually on the first page, so this check often ends the loop early.
+            if local_extract("".join(page_texts))['confidence'] >= settings.CV_LOCAL_CONFIDENCE_THRESHOLD:
+                break
+    finally:
+        # Closing the generator also closes the PDF file, even when we stopped before the last page.
+        pages.close()
+    return "".join(page_texts)[:settings.CV_PDF_MAX_CHARS]
+
+
+def relevant_cv_text(extracted_text, limit):
+    """
+    Returns the part of a CV that the AI needs to find the name and the email.
+    Both are almost always in the header, so we keep the first 'limit' characters.
+    If the email only appears further down (e.g. in a footer), we add that line too.
+    """
+    relevant_text = extracted_text[:limit]
+    if not EMAIL_PATTERN.search(relevant_text):
+        email_match = EMAIL_PATTERN.search(extracted_text)
+        if email_match:
+            line_start = extracted_text.rfind('\n', 0, email_match.start()) + 1
+            line_end = extracted_text.find('\n', email_match.end())
+            relevant_text += "\n...\n" + extracted_text[line_start:line_end if line_end != -1 else None]
+    return relevant_text
+
+
+def regex_cv_fields(extracted_text, original_filename):
+    """
+    The RegEx fallback parser: finds the first email address and the first
+    "Firstname Lastname" pair in the CV text.
+    """
+    email = None
+    first_name = None
+    last_name = None
+
+    email_match = EMAIL_PATTERN.search(extracted_text)
+    if email_match:
+        email = email_match.group(0)
+        print(f"[Celery Task] Found email using RegEx fallback for {original_filename}: {email}")
+
+    name_match = NAME_PATTERN.search(extracted_text)
+    if name_match:
+        first_name = name_match.group(1)
+        last_name = name_match.group(2)
+        print(f"[Celery Task] Found potential name using RegEx fallback for {original_filename}: {first_name} {last_name}")
 
+    return {'first_name': first_name, 'last_name': last_name, 'email': email, 'source': 'regex'}
+
+
+def extract_cv_fields(pdf_path, original_filename):
+    """
+    Reads the text of a PDF and extracts the first_name, last_name and email.
+    The fast local extractor runs first (see extraction.py); only if it is not confident
+    enough is the AI (Gemini by default) asked, with a RegEx parser as the fallback.
+    Returns a dictionary with the three fields and the 'source' ('local', 'ai' or 'regex'),
+    or a dictionary with an 'error' key if the PDF contains no text.
+    """
+    # --- Step 1: Extract Raw Text ---
+    extracted_text = read_cv_text(pdf_path)
+
+    if not extracted_text.strip():
+        print(f"[Celery Task] Could not extract text from {original_filename}.")
+        return {'error': f"Failed: No text found in {original_filename}"}
+
+    # --- Step 2 (Fast Tier): Try the Local Extractor First ---
+    # Most CVs have one obvious email and the name on the first lines; for them we skip the AI.
+    local_fields = local_extract(extracted_text)
+    if local_fields['confidence'] >= settings.CV_LOCAL_CONFIDENCE_THRESHOLD:
+        print(f"[Celery Task] Parsed {original_filename} locally (confidence {local_fields['confidence']}). Skipping AI.")
+        record_tier_win('local')
+        return local_fields
+
+    # This inner try...except block is for the AI part specifically.
+    try:
+        # --- Step 3 (Primary Method): Parse Information with the AI ---
+        print(f"[Celery Task] Attempting to parse with the {settings.LLM_BACKEND} LLM backend for {original_filename}...")
+        prompt = CV_EXTRACTION_PROMPT.format(cv_text=extracted_text)
+        
+        # The client is created once per worker process and shared by every task (see llm.py).
+        generated_text = get_llm_client().generate(prompt)
+        
+        json_match = re.search(r'\{.*\}', generated_text, re.DOTALL)
+        if not json_match:
+            raise ValueError("No valid JSON found in AI response.")
+            
+        parsed_data = json.loads(json_match.group(0))
+        print(f"[Celery Task] Successfully parsed data using AI for {original_filename}.")
+        record_tier_win('ai')
+        return {
+            'first_name': parsed_data.get('first_name'),
+            'last_name': parsed_data.get('last_name'),
+            'email': parsed_data.get('email'),
+            'source': 'ai',
+        }
+
+    except Exception as api_error:
+        # --- Step 3 (Fallback Method): If the AI method fails, this code runs. ---
+        print(f"[Celery Task] AI processing failed: {api_error}. Falling back to RegEx parser.")
+        record_tier_win('regex')
+        return regex_cv_fields(extracted_text, original_filename)
+
+
+def extract_cv_fields_batch(cv_files):
+    """
+    The batched version of extract_cv_fields(): 'cv_files' is a list of (pdf_path, original_filename)
+    pairs, and ALL of them are sent to the AI in a single request.
+    Returns one dictionary per file, in the same order. CVs the local extractor is sure about
+    are not sent to the AI at all. Any CV that is missing from the AI's
+    answer (or the whole answer, if the request fails) falls back to the RegEx parser on its own.
+    """
+    # --- Step 1: Extract the Text of Every CV ---
+    # The fast local extractor answers the obvious CVs right away; only the others go to the AI.
+    results = [None] * len(cv_files)
+    cv_texts = {}
+    for index, (pdf_path, original_filename) in enumerate(cv_files):
+        extracted_text = read_cv_text(pdf_path)
         if not extracted_text.strip():
             print(f"[Celery Task] Could not extract text from {original_filename}.")
-            return {'error': f"Failed: No text found in {original_filename}"}
+            results[index] = {'error': f"Failed: No text found in {original_filename}"}
+            continue
+        local_fields = local_extract(extracted_text)
+        if local_fields['confidence'] >= settings.CV_LOCAL_CONFIDENCE_THRESHOLD:
+            record_tier_win('local')
+            results[index] = local_fields
+        else:
+            cv_texts[index] = extracted_text
 
-        # --- Initialize variables to hold the data we find ---
-        email = None
-        first_name = None
-        last_name = None
+    if not cv_texts:
+        return results
 
-        # This inner try...except block is for the AI part specifically.
-        try:
-            # --- Step 2 (Primary Method): Parse Information with the Google Gemini API ---
-            print(f"[Celery Task] Attempting to parse with Google Gemini API for {original_filename}...")
-            genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+    # --- Step 2: Ask the AI About All CVs at Once ---
+    # Only the relevant part of each CV is sent, so many CVs fit into one request.
+    answers = {}
+    try:
+        print(f"[Celery Task] Attempting to parse {len(cv_texts)} CVs in one request with the {settings.LLM_BACKEND} LLM backend...")
+        cv_sections = "".join(
+            CV_BATCH_SECTION.format(id=index, cv_text=relevant_cv_text(extracted_text, settings.CV_LLM_BATCH_TEXT_LIMIT))
+            for index, extracted_text in cv_texts.items()
+        )
+        generated_text = get_llm_client().generate(CV_BATCH_EXTRACTION_PROMPT.format(cv_sections=cv_sections))
 
-            prompt = (
-                "You are an expert HR assistant. From the following CV text, extract the "
-                "first_name, last_name, and email into a valid JSON object. "
-                "If a piece of information cannot be found, set its value to null. "
-                f"Return ONLY the JSON object and nothing else. \n\nCV Text: ```{extracted_text[:10000]}```"
-            )
-            
-            model = genai.GenerativeModel('gemini-2.5-flash')
-            response = model.generate_content(prompt)
-            generated_text = response.text
-            
-            json_match = re.search(r'\{.*\}', generated_text, re.DOTALL)
-            if not json_match:
-                raise ValueError("No valid JSON found in AI response.")
-                
-            parsed_data = json.loads(json_match.group(0))
-            email = parsed_data.get('email')
-            first_name = parsed_data.get('first_name')
-            last_name = parsed_data.get('last_name')
-            print(f"[Celery Task] Successfully parsed data using AI for {original_filename}.")
+        json_match = re.search(r'\[.*\]', generated_text, re.DOTALL)
+        if not json_match:
+            raise ValueError("No valid JSON array found in AI response.")
 
-        except Exception as api_error:
-            # --- Step 2 (Fallback Method): If the AI method fails, this code runs. ---
-            print(f"[Celery Task] AI processing failed: {api_error}. Falling back to RegEx parser.")
-            
-            email_match = re.search(r'[\w\.-]+@[\w\.-]+\.\w+', extracted_text)
-            if email_match:
-                email = email_match.group(0)
-                print(f"[Celery Task] Found email using RegEx fallback: {email}")
+        for item in json.loads(json_match.group(0)):
+            # We only trust objects that carry the id of a CV we actually sent.
+            if isinstance(item, dict) and item.get('id') in cv_texts:
+                answers[item['id']] = item
+    except Exception as api_error:
+        print(f"[Celery Task] Batched AI processing failed: {api_error}. Falling back to RegEx parser for every CV.")
+
+    # --- Step 3: Map the Answers Back to the Files ---
+    for index, extracted_text in cv_texts.items():
+        original_filename = cv_files[index][1]
+        item = answers.get(index)
+        if item is None:
+            print(f"[Celery Task] The AI answer has no entry for {original_filename}. Falling back to RegEx parser.")
+            record_tier_win('regex')
+            results[index] = regex_cv_fields(extracted_text, original_filename)
+        else:
+            record_tier_win('ai')
+            results[index] = {
+                'first_name': item.get('first_name'),
+                'last_name': item.get('last_name'),
+                'email': item.get('email'),
+                'source': 'ai',
+            }
+    return results
+
+
+def build_parse_result(parsed_fields, staged_key, original_filename, company_id):
+    """
+    Builds the dictionary a parse-only job returns to the status API: the parsed fields,
+    the staged file they belong to, and the company that uploaded it.
+    """
+    if not parsed_fields['email']:
+        print(f"[Celery Task] Could not find an email in {original_filename} using any method.")
+        return {'error': f"Failed: Email not found in {original_filename}", 'company_id': company_id}
+
+    return {
+        'first_name': parsed_fields['first_name'],
+        'last_name': parsed_fields['last_name'],
+        'email': parsed_fields['email'],
+        'staged_key': staged_key,
+        'original_filename': original_filename,
+        # The company id lets the status API check that a job's result is only read by its own company.
+        'company_id': company_id,
+    }
 
-            name_match = re.search(r'([A-Z][a-z]+)\s+([A-Z][a-z]+)', extracted_text)
-            if name_match:
-                first_name = name_match.group(1)
-                last_name = name_match.group(2)
-                print(f"[Celery Task] Found potential name using RegEx fallback: {first_name} {last_name}")
+
+# We add the 'create_candidate=True' argument. The '=True' part makes it an
+# optional argument with a default value. This means if the argument is not
+# provided, it will assume we want to create a candidate.
+# The time limits stop a task that is stuck (e.g. on a broken PDF or a hanging AI request).
+# After the soft limit, Celery raises an exception inside the task, which our 'except' block reports
+# as a failed job; after the hard limit, the worker process running it is replaced.
+@shared_task(soft_time_limit=settings.CV_PARSE_SOFT_TIME_LIMIT, time_limit=settings.CV_PARSE_TIME_LIMIT)
+def process_single_cv(staged_key, original_filename, company_id, created_by_id, create_candidate=True):
+    """
+    Processes a single CV using an AI-first approach with a RegEx fallback.
+    The CV is not passed to the task itself; 'staged_key' points to the copy
+    that the web server already wrote into the staging area (see staging.py).
+    If the same PDF was parsed before, the answer comes from the parse cache (see cv_cache.py).
+    If 'create_candidate' is True, it saves the profile to the database.
+    Otherwise, it returns the extracted data as a dictionary.
+    """
+    print(f"--- [Celery Task] Starting to PARSE CV: {original_filename} ---")
+    try:
+        # --- Step 1: Check the Parse Cache ---
+        # The staged key is the SHA-256 hash of the PDF, so it identifies the file's content.
+        parsed_fields = get_cached_parse(staged_key, CV_PARSER_VERSION)
+        if parsed_fields is not None:
+            print(f"[Celery Task] Found {original_filename} in the parse cache. Skipping PDF extraction and AI.")
+            record_tier_win('cache')
+        else:
+            # --- Step 2: Extract the Fields from the PDF ---
+            parsed_fields = extract_cv_fields(staged_path(company_id, staged_key), original_filename)
+            if 'error' in parsed_fields:
+                return {'error': parsed_fields['error'], 'company_id': company_id}
+            # We only cache confident answers (the AI's or a sure local one). A RegEx fallback result (e.g. after
+            # a temporary API outage) should not stop the AI from having another go at this file next time.
+            if parsed_fields['source'] in ('ai', 'local') and parsed_fields['email']:
+                set_cached_parse(staged_key, CV_PARSER_VERSION, parsed_fields)
 
         # --- Step 3: Decide What to Do with the Data ---
-        
-        if not email:
-            print(f"[Celery Task] Could not find an email in {original_filename} using any method.")
-            return {'error': f"Failed: Email not found in {original_filename}"}
-
-        parsed_result = {
-            'first_name': first_name,
-            'last_name': last_name,
-            'email': email,
-            'file_content_b64': file_content_b64,
-            'original_filename': original_filename,
-        }
+        parsed_result = build_parse_result(parsed_fields, staged_key, original_filename, company_id)
+        if 'error' in parsed_result:
+            return parsed_result
+        email = parsed_result['email']
+        first_name = parsed_result['first_name']
+        last_name = parsed_result['last_name']
 
         # If the task was called only to parse data (for the interactive UI)...
         if not create_candidate:
@@ -297,19 +527,187 @@ def process_single_cv(file_content_b64, original_filename, company_id, created_b
         company = Company.objects.get(id=company_id)
         created_by_user = User.objects.get(id=created_by_id)
         
+        # The staged file is moved into 'resumes/', so the resume is set in the same INSERT.
         new_candidate = Candidate.objects.create(
             company=company,
             first_name=first_name or "Unknown",
             last_name=last_name or "Unknown",
             email=email,
-            created_by=created_by_user.employee
+            created_by=created_by_user.employee,
+            resume=promote_staged(company_id, staged_key, original_filename)
         )
-        
-        new_candidate.resume.save(original_filename, ContentFile(file_content), save=True)
+
+        # We are already in a worker, so we store the full CV text right away. This also makes
+        # the new candidate findable by the candidate search, including the words of their CV.
+        store_cv_texts([new_candidate])
 
         print(f"[Celery Task] Successfully created new candidate: {new_candidate.first_name} {new_candidate.last_name}")
         return f"Successfully processed and created a new candidate for {original_filename}."
 
     except Exception as e:
         print(f"[Celery Task] CRITICAL ERROR processing {original_filename}: {e}")
-        return {'error': str(e)}
+        return {'error': str(e), 'company_id': company_id}
+
+#-----------------------------------------------------------------------------------------
+
+@shared_task(soft_time_limit=settings.CV_BATCH_PARSE_SOFT_TIME_LIMIT, time_limit=settings.CV_BATCH_PARSE_TIME_LIMIT)
+def process_cv_batch(staged_files, company_id):
+    """
+    Parses SEVERAL CVs with a single AI request (used by the bulk upload review flow).
+    'staged_files' is a list of [staged_key, original_filename] pairs. The task returns a
+    list with one result per file, in the same order, each shaped exactly like the result
+    of a parse-only process_single_cv task, so the status API can hand out each item separately.
+    Files that are already in the parse cache are not sent to the AI at all.
+    """
+    print(f"--- [Celery Task] Starting to PARSE a batch of {len(staged_files)} CVs ---")
+    results = [None] * len(staged_files)
+    try:
+        # --- Step 1: Check the Parse Cache for Every File ---
+        to_extract = []
+        for index, (staged_key, original_filename) in enumerate(staged_files):
+            parsed_fields = get_cached_parse(staged_key, CV_PARSER_VERSION)
+            if parsed_fields is not None:
+                print(f"[Celery Task] Found {original_filename} in the parse cache. Skipping PDF extraction and AI.")
+                record_tier_win('cache')
+                results[index] = build_parse_result(parsed_fields, staged_key, original_filename, company_id)
+            else:
+                to_extract.append(index)
+
+        # --- Step 2: Extract the Remaining Files with One AI Request ---
+        if to_extract:
+            extracted = extract_cv_fields_batch([
+                (staged_path(company_id, staged_files[index][0]), staged_files[index][1]) for index in to_extract
+            ])
+            for index, parsed_fields in zip(to_extract, extracted):
+                staged_key, original_filename = staged_files[index]
+                if 'error' in parsed_fields:
+                    results[index] = {'error': parsed_fields['error'], 'company_id': company_id}
+                    continue
+                # Like in process_single_cv, only confident answers are cached.
+                if parsed_fields['source'] in ('ai', 'local') and parsed_fields['email']:
+                    set_cached_parse(staged_key, CV_PARSER_VERSION, parsed_fields)
+                results[index] = build_parse_result(parsed_fields, staged_key, original_filename, company_id)
+
+        return results
+
+    except Exception as e:
+        print(f"[Celery Task] CRITICAL ERROR processing a CV batch: {e}")
+        # Files that were already finished keep their result; only the others are marked as failed.
+        return [result or {'error': str(e), 'company_id': company_id} for result in results]
+
+#-----------------------------------------------------------------------------------------
+
+def read_full_cv_text(pdf_path):
+    """
+    Reads the text of a resume for storing it (see the CandidateCVText model).
+    Unlike read_cv_text(), which stops as soon as the name and email are found, this reads
+    the whole document, up to CV_TEXT_MAX_PAGES pages and CV_TEXT_MAX_CHARS characters.
+    Returns the text and the number of pages that were read.
+    """
+    pages = iter_cv_pages(pdf_path, settings.CV_TEXT_MAX_PAGES, settings.CV_PDF_TIME_LIMIT)
+    page_texts = []
+    character_count = 0
+    try:
+        for page_text in pages:
+            page_texts.append(page_text)
+            character_count += len(page_text)
+            if character_count >= settings.CV_TEXT_MAX_CHARS:
+                break
+    finally:
+        pages.close()
+    # PostgreSQL text cannot contain NUL characters, which some PDFs produce.
+    return "".join(page_texts)[:settings.CV_TEXT_MAX_CHARS].replace("\x00", ""), len(page_texts)
+
+
+def store_cv_texts(candidates):
+    """
+    Extracts and stores the CV text of the given candidates (objects with 'pk' and 'resume'),
+    then refreshes their search vectors so the candidate search can find words from their CV.
+    A resume with no readable text is stored as an empty text, so it is not tried again and again.
+    Returns the number of stored texts.
+    """
+    cv_texts = []
+    for candidate in candidates:
+        if not candidate.resume:
+            continue
+        try:
+            text, page_count = read_full_cv_text(default_storage.path(candidate.resume.name))
+        except Exception as e:
+            print(f"[Celery Task] Could not read the resume of candidate #{candidate.pk}: {e}")
+            continue
+        cv_texts.append(CandidateCVText(candidate_id=candidate.pk, text=text, page_count=page_count))
+
+    # One INSERT for all texts; a candidate that already had a text (e.g. a replaced resume) gets the new one.
+    CandidateCVText.objects.bulk_create(
+        cv_texts,
+        update_conflicts=True,
+        unique_fields=['candidate'],
+        update_fields=['text', 'page_count', 'extracted_at']
+    )
+    candidate_ids = [candidate.pk for candidate in candidates]
+    refresh_candidate_search_vectors(candidate_ids)
+    # bulk_create() sends no signals, so we tell the page cache ourselves: the new texts can change
+    # the "best matching candidates" of the companies' job postings.
+    if cv_texts:
+        company_ids = list(Candidate.objects.filter(id__in=candidate_ids).values_list('company_id', flat=True).order_by().distinct())
+        invalidate_company_cache(*company_ids)
+        # The ranking index of these companies is rebuilt in the background right away,
+        # so the job posting pages find it ready.
+        for company_id in company_ids:
+            schedule_candidate_index_build(company_id)
+    return len(cv_texts)
+
+
+@shared_task(soft_time_limit=settings.CV_BATCH_PARSE_SOFT_TIME_LIMIT, time_limit=settings.CV_BATCH_PARSE_TIME_LIMIT)
+def store_candidate_cv_texts(candidate_ids):
+    """
+    Stores the CV text of newly saved candidates in the background (see store_cv_texts()).
+    It is queued by the views that save candidates with a resume.
+    """
+    candidates = Candidate.objects.filter(id__in=candidate_ids).only('id', 'resume')
+    stored_count = store_cv_texts(candidates)
+    message = f"Stored the CV text of {stored_count} candidate(s)."
+    print(message)
+    return message
+
+#-----------------------------------------------------------------------------------------
+
+@shared_task
+def build_company_candidate_index(company_id):
+    """
+    Builds the candidate ranking index of a company and stores it in the shared cache (see ranking.py).
+    It is queued whenever the company's CV texts change, or when a job posting page finds no index.
+    """
+    index = build_candidate_index(company_id)
+    # The job posting pages may have cached their "unranked" list while the index was missing.
+    invalidate_company_cache(company_id)
+    message = f"Built the candidate index of company #{company_id} ({len(index.candidate_ids)} CV(s))."
+    print(message)
+    return message
+
+#-----------------------------------------------------------------------------------------
+
+@shared_task
+def bulk_apply_candidates(job_posting_id, candidate_ids, company_id):
+    """
+    Applies a long list of candidates to a job posting in the background (see apply_candidates_to_job()).
+    It is queued by the bulk application API when the list is longer than BULK_APPLY_SYNC_LIMIT.
+    The result contains the company id, so the status API can check who may read it.
+    """
+    result = apply_candidates_to_job(job_posting_id, candidate_ids)
+    print(f"[Celery Task] Bulk application to job posting #{job_posting_id}: {result['created']} created, {result['skipped']} skipped.")
+    return {'company_id': company_id, **result}
+
+#-----------------------------------------------------------------------------------------
+
+# This task is run periodically by Celery Beat (see CELERY_BEAT_SCHEDULE in settings.py).
+@shared_task
+def purge_staged_cv_uploads():
+    """
+    Deletes staged CV files that were uploaded but never saved as a candidate,
+    so the staging area does not grow forever.
+    """
+    deleted_count = purge_stale_staged_uploads(settings.CV_STAGING_MAX_AGE_HOURS * 3600)
+    message = f"Deleted {deleted_count} stale staged CV file(s)."
+    print(message)
+    return message
@@ -5,15 +5,66 @@ from django.contrib.auth.models import User
 from django.core.files.uploadedfile import SimpleUploadedFile
 # We need ContentFile to save file content directly to a model field in tests.
 from django.core.files.base import ContentFile
+# CaptureQueriesContext records every SQL query run inside a 'with' block, so we can count them.
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from io import StringIO
+from django.conf import settings
+from django.utils import timezone
+from datetime import timedelta
+from django.test import override_settings
+from django.http import QueryDict
+from http.server import ThreadingHTTPServer
+import threading
+import asyncio
+import time
+import httpx
 from accounts.models import Company
-from .models import Employee, JobPosting, Candidate, Application
+from .models import Employee, JobPosting, Candidate, CandidateCVText, Application
 from unittest.mock import patch, MagicMock # The library for "mocking" external services.
-from .tasks import process_single_cv # We import our Celery task to test it directly.
-import base64 # Needed to encode fake file content for the task.
+from .tasks import process_single_cv, process_cv_batch, deactivate_expired_postings, build_company_candidate_index # We import our Celery tasks to test them directly.
+from .extraction import local_extract
+from .tasks import read_cv_text
+from .search import refresh_candidate_search_vectors
+from . import pipeline, ranking, title_generation
+from .forms import ApplicationForm
+from .selectors import candidates_page, encode_cursor, job_postings_page
+from .staging import stage_upload, staged_path # To put fake CV files into the staging area.
+from .llm import init_llm_client, get_llm_client
+from .ai_http import get_async_http_client
+from .pdf_sandbox import iter_pdf_pages_sandboxed
+from .management.commands.llm_stub_server import StubRequestHandler
+import json
+import re
+import os
+import shutil
+import tempfile
 
 # All test classes must inherit from django.test.TestCase.
 # This provides a rich set of tools and sets up a clean test database for each run.
-class PortalViewsTestCase(TestCase):
+class TemporaryMediaRootMixin:
+    """
+    Saves the files a test class writes (resumes, staged CV uploads) into a temporary folder
+    instead of the project's 'media' folder, and removes that folder when the class is done.
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp(prefix='hr-test-media-')
+        # CV_STAGING_ROOT is calculated from MEDIA_ROOT in settings.py, so it must be moved as well.
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media_root, CV_STAGING_ROOT=os.path.join(cls.media_root, 'staging'))
+        cls.media_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+
+class PortalViewsTestCase(TemporaryMediaRootMixin, TestCase):
     """
     Test suite for the views in the 'portal' application.
     A test suite is a collection of tests that are run together.
@@ -133,6 +184,457 @@ class PortalViewsTestCase(TestCase):
         #   - "Company A": The specific text we are looking for.
         self.assertContains(response, "Company A", msg_prefix="The company name should be displayed.")
 
+    def test_dashboard_view_user_without_employee_profile(self):
+        """
+        Test that a logged in user without an employee profile (e.g. a superuser) gets the
+        empty dashboard instead of a server error.
+        """
+        admin = User.objects.create_superuser(username='admin', password='password123')
+        self.client.force_login(admin)
+        response = self.client.get(self.dashboard_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.context['company'])
+
+#-------------------------------------------------------------------------------------------------------------------------------
+
+    # The dashboard must be rendered with this many queries, however many rows it shows:
+    # session, user, employee, company, job postings and candidates.
+    DASHBOARD_QUERY_BUDGET = 6
+
+    def test_dashboard_query_count_stays_within_budget(self):
+        """
+        Test that the dashboard does not run extra queries per row (the "N+1" problem),
+        e.g. to show the username of the employee who created each job posting or candidate.
+        """
+        self.client.login(username='user_a', password='password123')
+
+        def add_rows(count):
+            JobPosting.objects.bulk_create([
+                JobPosting(title=f"Job {i}", description="...", company=self.company_a, created_by=self.employee_a)
+                for i in range(count)
+            ])
+            Candidate.objects.bulk_create([
+                Candidate(first_name="Cand", last_name=str(i), email=f"cand{JobPosting.objects.count()}-{i}@test.com",
+                          company=self.company_a, created_by=self.employee_a)
+                for i in range(count)
+            ])
+
+        # The tables are cached as fragments; this test measures a render without the cache.
+        add_rows(2)
+        cache.clear()
+        with self.assertNumQueries(self.DASHBOARD_QUERY_BUDGET):
+            self.client.get(self.dashboard_url)
+
+        add_rows(20)
+        cache.clear()
+        with self.assertNumQueries(self.DASHBOARD_QUERY_BUDGET):
+            response = self.client.get(self.dashboard_url)
+        self.assertContains(response, "user_a")
+
+    # The job posting page must be rendered with this many queries, however many applicants it has:
+    # session, user, employee, job posting (with its creator), the ranking's CV fingerprint and the applications.
+    JOB_DETAIL_QUERY_BUDGET = 6
+
+    @override_settings(JOB_APPLICATIONS_PAGE_SIZE=3)
+    def test_job_posting_page_lists_applications_with_fixed_query_count(self):
+        """
+        Test that the job posting page loads its applicants with a fixed number of queries,
+        ordered by status and split into pages.
+        """
+        self.client.login(username='user_b', password='password123')
+        detail_url = reverse('job-detail', kwargs={'pk': self.job_posting_b.pk})
+
+        def add_applicants(count, status):
+            for i in range(count):
+                candidate = Candidate.objects.create(first_name="App", last_name=status, email=f"{status}{i}@test.com", company=self.company_b)
+                candidate.resume.save("resume.pdf", ContentFile(self.dummy_pdf_content))
+                Application.objects.create(candidate=candidate, job_posting=self.job_posting_b, status=status)
+
+        # The page's lists are cached as fragments; this test measures a render without the cache.
+        add_applicants(1, 'Hired')
+        build_company_candidate_index(self.company_b.pk) # The Celery task builds the ranking index beforehand.
+        cache.clear()
+        with self.assertNumQueries(self.JOB_DETAIL_QUERY_BUDGET):
+            self.client.get(detail_url)
+
+        add_applicants(3, 'Pending')
+        cache.clear()
+        with self.assertNumQueries(self.JOB_DETAIL_QUERY_BUDGET):
+            response = self.client.get(detail_url)
+        self.assertEqual([a.status for a in response.context['applications']], ['Pending'] * 3)
+        self.assertEqual(response.context['num_pages'], 2)
+
+        response = self.client.get(detail_url, {'page': 2})
+        self.assertEqual([a.candidate.email for a in response.context['applications']], ['Hired0@test.com'])
+
+    # In the tests the fragments are kept in memory, as if CACHE_URL pointed to a shared Redis.
+    @override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'fragments': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'fragments'},
+        'cv_parse': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'cv-parse'},
+    })
+    def test_dashboard_tables_are_cached_per_company_until_a_change(self):
+        """
+        Test that a repeated dashboard request takes its tables from the fragment cache without
+        querying them, and that a change in the company shows up on the next request.
+        """
+        self.client.login(username='user_a', password='password123')
+        cache.clear()
+        self.client.get(self.dashboard_url)
+        # Only session, user, employee and company: the two table queries are skipped.
+        with self.assertNumQueries(self.DASHBOARD_QUERY_BUDGET - 2):
+            response = self.client.get(self.dashboard_url)
+        self.assertNotContains(response, "cached.new@test.com")
+
+        # A change in ANOTHER company leaves Company A's cache alone.
+        with self.captureOnCommitCallbacks(execute=True):
+            Candidate.objects.create(first_name="Other", last_name="Co", email="other.co@test.com", company=self.company_b)
+        with self.assertNumQueries(self.DASHBOARD_QUERY_BUDGET - 2):
+            self.client.get(self.dashboard_url)
+
+        # The cache version is increased when the transaction is committed.
+        with self.captureOnCommitCallbacks(execute=True):
+            Candidate.objects.create(first_name="Cached", last_name="New", email="cached.new@test.com", company=self.company_a)
+        self.assertContains(self.client.get(self.dashboard_url), "cached.new@test.com")
+
+    def test_fragments_are_not_cached_without_a_shared_cache(self):
+        """
+        Test that without CACHE_URL (as in these tests) the dashboard tables are rendered on every
+        request, instead of being kept in one process's memory where other processes cannot outdate them.
+        """
+        self.client.login(username='user_a', password='password123')
+        self.client.get(self.dashboard_url)
+        with self.assertNumQueries(self.DASHBOARD_QUERY_BUDGET):
+            self.client.get(self.dashboard_url)
+
+#-------------------------------------------------------------------------------------------------------------------------------
+
+    @override_settings(DASHBOARD_PAGE_SIZE=2)
+    def test_dashboard_tables_are_loaded_page_by_page(self):
+        """
+        Test that the dashboard only renders the first page of candidates, and that following
+        the API's 'next_url' returns every other candidate exactly once, in name order.
+        """
+        self.client.login(username='user_a', password='password123')
+        # Two candidates share the same name, so the order must also use the id to stay stable.
+        names = [("Ada", "Zed"), ("Bob", "Young"), ("Bob", "Young"), ("Cem", "Kaya"), ("Deniz", "Arslan")]
+        for i, (first_name, last_name) in enumerate(names):
+            Candidate.objects.create(first_name=first_name, last_name=last_name, email=f"page{i}@test.com",
+                                     company=self.company_a, created_by=self.employee_a)
+
+        response = self.client.get(self.dashboard_url)
+        self.assertEqual([c.last_name for c in response.context['candidates']], ["Arslan", "Kaya"])
+
+        seen_emails = [c.email for c in response.context['candidates']]
+        next_url = response.context['candidates_next_url']
+        while next_url:
+            page = self.client.get(next_url).json()
+            seen_emails += re.findall(r'<td>(page\d+@test\.com)</td>', page['html'])
+            next_url = page['next_url']
+        self.assertEqual(sorted(seen_emails), sorted(f"page{i}@test.com" for i in range(5)))
+        self.assertEqual(seen_emails[-1], "page0@test.com") # 'Zed' comes last.
+
+        response = self.client.get(reverse('api-dashboard-candidates'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_dashboard_pages_start_the_index_scan_at_the_cursor(self):
+        """
+        Test that PostgreSQL can use the cursor as the START of the index scan (an 'Index Cond'),
+        so a deep page does not read and throw away every row before it.
+        """
+        checks = [
+            (job_postings_page, encode_cursor([timezone.now().isoformat(), 10]), 'jobposting_company_created_idx', r'created_at\)? <='),
+            (candidates_page, encode_cursor(["Kaya", "Cem", 10]), 'candidate_company_name_idx', r'last_name\)(::text)? >='),
+        ]
+        for load_page, cursor_value, index_name, index_condition in checks:
+            with self.subTest(index_name=index_name):
+                with CaptureQueriesContext(connection) as queries:
+                    load_page(self.company_a, cursor=cursor_value)
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off") # The test table is tiny; we only ask whether the index CAN be used.
+                    cursor.execute(f"EXPLAIN {queries[-1]['sql']}")
+                    plan = "\n".join(row[0] for row in cursor.fetchall())
+                self.assertIn(index_name, plan)
+                self.assertRegex(plan, rf"Index Cond: .*{index_condition}")
+
+    def test_dashboard_apis_reject_cursors_with_wrong_values(self):
+        """
+        Test that a cursor which decodes fine but holds values of the wrong type is answered
+        with 400, instead of crashing the query with a 500.
+        """
+        self.client.login(username='user_a', password='password123')
+        bad_cursors = {
+            'api-dashboard-job-postings': [["2020-01-01T00:00:00", "x"], ["a", "b"], [{"k": 1}, 1], ["2020-01-01T00:00:00", [1]]],
+            'api-dashboard-candidates': [["a", "b", {"k": 1}], ["a", "b", "x"], [1, "b", 1], ["a", ["b"], 1]],
+        }
+        for url_name, cursors in bad_cursors.items():
+            for values in cursors:
+                with self.subTest(url_name=url_name, values=values):
+                    response = self.client.get(reverse(url_name), {'cursor': encode_cursor(values)})
+                    self.assertEqual(response.status_code, 400)
+
+#-------------------------------------------------------------------------------------------------------------------------------
+
+    def test_candidate_search_is_ranked_fuzzy_and_company_scoped(self):
+        """
+        Test that the search API finds candidates by name prefix, email and misspelled name,
+        ranks name matches first, and never returns candidates of another company.
+        """
+        self.client.login(username='user_a', password='password123')
+        search_url = reverse('api-candidate-search')
+
+        # A candidate created through the normal form is indexed right away.
+        self.client.post(reverse('candidate-create'), {'first_name': 'Jonathan', 'last_name': 'Smith', 'email': 'j.smith@test.com'})
+        emails = [("Maria", "Jonas", "maria@test.com"), ("Ali", "Veli", "jonathan.fan@test.com")]
+        for first_name, last_name, email in emails:
+            candidate = Candidate.objects.create(first_name=first_name, last_name=last_name, email=email, company=self.company_a)
+            refresh_candidate_search_vectors([candidate.pk])
+        other = Candidate.objects.create(first_name="Jonathan", last_name="Other", email="other@test.com", company=self.company_b)
+        refresh_candidate_search_vectors([other.pk])
+
+        results = self.client.get(search_url, {'q': 'jonath'}).json()['results']
+        # The first-name match outranks the email match, which outranks the merely similar name 'Jonas'.
+        # Company B's Jonathan is not visible.
+        self.assertEqual([r['email'] for r in results], ['j.smith@test.com', 'jonathan.fan@test.com', 'maria@test.com'])
+
+        results = self.client.get(search_url, {'q': 'Jonatan'}).json()['results']
+        self.assertEqual(results[0]['last_name'], 'Smith') # Found despite the typo.
+
+        self.assertEqual(self.client.get(search_url, {'q': 'veli'}).json()['results'][0]['first_name'], 'Ali')
+        self.assertEqual(self.client.get(search_url, {'q': '&|!'}).json()['results'], [])
+
+    def test_job_posting_page_ranks_candidates_by_cv_match(self):
+        """
+        Test that the job posting page lists the company's candidates whose CV best matches the
+        posting, best first, and that editing the posting gives a new ranking.
+        """
+        self.client.login(username='user_a', password='password123')
+        job = JobPosting.objects.create(
+            title="Python Developer", description="Django and PostgreSQL, Kubernetes is a plus.",
+            company=self.company_a, created_by=self.employee_a
+        )
+        cv_texts = [
+            ("Best", "Python Django PostgreSQL Kubernetes developer"),
+            ("Good", "Python developer, some Django"),
+            ("None", "Accountant with Excel experience"),
+        ]
+        for last_name, text in cv_texts:
+            candidate = Candidate.objects.create(first_name="Ada", last_name=last_name, email=f"{last_name}@test.com", company=self.company_a)
+            CandidateCVText.objects.create(candidate=candidate, text=text)
+        # Company B's candidate matches perfectly, but must never be shown to Company A.
+        other = Candidate.objects.create(first_name="Ada", last_name="Other", email="other@test.com", company=self.company_b)
+        CandidateCVText.objects.create(candidate=other, text="Python Developer Django PostgreSQL Kubernetes")
+
+        detail_url = reverse('job-detail', kwargs={'pk': job.pk})
+        # The index is not built during the request: the page queues the build and shows the candidates unranked.
+        with patch('portal.tasks.build_company_candidate_index.delay') as mock_delay, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(detail_url)
+        mock_delay.assert_called_once_with(self.company_a.pk)
+        self.assertTrue(response.context['ranking_pending'])
+        self.assertEqual([candidate.last_name for candidate in response.context['ranked_candidates']], ['Best', 'Good', 'None'])
+
+        # Once the Celery task has built it, the page only loads the index from the cache.
+        build_company_candidate_index(self.company_a.pk)
+        ranking._company_indexes.clear() # As in another web worker process.
+        with patch('portal.ranking.CandidateIndex.build') as mock_build:
+            response = self.client.get(detail_url)
+        mock_build.assert_not_called()
+        self.assertFalse(response.context['ranking_pending'])
+        ranked = response.context['ranked_candidates']
+        self.assertEqual([candidate.last_name for candidate in ranked], ['Best', 'Good'])
+        self.assertGreater(ranked[0].match_percent, ranked[1].match_percent)
+
+        job.title, job.description = "Accountant", "Excel experience required."
+        with self.captureOnCommitCallbacks(execute=True):
+            job.save()
+        ranked = self.client.get(detail_url).context['ranked_candidates']
+        self.assertEqual([candidate.last_name for candidate in ranked], ['None'])
+
+#-------------------------------------------------------------------------------------------------------------------------------
+
+    def test_database_metrics_are_only_shown_to_staff(self):
+        """
+        Test that the database metrics endpoint shows the server's connections grouped by role,
+        and that it is closed to users who are not staff members.
+        """
+        metrics_url = reverse('api-db-metrics')
+        self.client.login(username='user_a', password='password123')
+        self.assertEqual(self.client.get(metrics_url).status_code, 403)
+
+        self.user_a.is_staff = True
+        self.user_a.save()
+        metrics = self.client.get(metrics_url).json()
+        self.assertEqual(metrics['role'], settings.APP_ROLE)
+        # At least the test's own connection is visible, under this process's role.
+        roles = {row['application_name'] for row in metrics['server']['connections']}
+        self.assertIn(f"hr-{settings.APP_ROLE}", roles)
+        self.assertGreaterEqual(metrics['server']['max_connections'], metrics['server']['total'])
+        if settings.DB_CONNECTION_MODE == 'pool':
+            self.assertEqual(metrics['pool']['pool_max'], settings.DB_POOL_MAX_SIZE)
+
+#-------------------------------------------------------------------------------------------------------------------------------
+
+    @staticmethod
+    def _mock_ai_client(delay=0):
+        """
+        Returns an httpx client whose "AI service" answers with a fixed summary after 'delay' seconds.
+        """
+        async def answer(request):
+            await asyncio.sleep(delay)
+            return httpx.Response(200, json=[{'summary_text': "Senior Python Developer. Builds our APIs."}])
+        return httpx.AsyncClient(transport=httpx.MockTransport(answer))
+
+    def test_ai_http_client_is_shared_per_event_loop_and_closed_with_it(self):
+        """
+        Test that every event loop reuses one AI HTTP client, and that the client is closed
+        when its event loop shuts down (e.g. the short-lived loops of the development server).
+        """
+        async def get_client_twice():
+            client = get_async_http_client()
+            self.assertIs(get_async_http_client(), client)
+            return client
+
+        first_client = asyncio.run(get_client_twice())
+        second_client = asyncio.run(get_client_twice())
+        self.assertIsNot(first_client, second_client)
+        self.assertTrue(first_client.is_closed)
+        self.assertTrue(second_client.is_closed)
+
+    def test_generate_job_title_keeps_the_first_sentence(self):
+        """
+        Test that the async title view returns the first sentence of the AI's summary.
+        """
+        self.client.login(username='user_a', password='password123')
+        url = reverse('api-generate-title')
+        cache.clear() # The titles are cached; this test needs a real call to the (mock) AI service.
+        with patch('portal.title_generation.get_async_http_client', return_value=self._mock_ai_client()):
+            response = self.client.post(url, json.dumps({'description': "We need a Python developer."}), content_type='application/json')
+        self.assertEqual(response.json(), {'title': "Senior Python Developer."})
+
+        response = self.client.post(url, json.dumps({'description': ""}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        # A description of only spaces and line breaks never reaches the AI service.
+        with patch('portal.title_generation.get_async_http_client') as mock_get_client:
+            response = self.client.post(url, json.dumps({'description': " \n\t "}), content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+            with self.assertRaises(title_generation.TitleGenerationError):
+                asyncio.run(title_generation.generate_title("   "))
+        mock_get_client.assert_not_called()
+
+    async def test_generate_job_title_requests_wait_for_the_ai_at_the_same_time(self):
+        """
+        Test that many title requests to one process wait for the AI service together,
+        instead of one after the other.
+        """
+        await self.async_client.aforce_login(self.user_a)
+        url = reverse('api-generate-title')
+        with patch('portal.title_generation.get_async_http_client', return_value=self._mock_ai_client(delay=0.5)):
+            started = time.monotonic()
+            # Different descriptions, so neither the cache nor the de-duplication can help.
+            responses = await asyncio.gather(*[
+                self.async_client.post(url, json.dumps({'description': f"Python {i}"}), content_type='application/json')
+                for i in range(20)
+            ])
+            elapsed = time.monotonic() - started
+        self.assertTrue(all(response.status_code == 200 for response in responses))
+        # One after the other, 20 requests would take at least 10 seconds.
+        self.assertLess(elapsed, 5)
+
+    async def test_generate_job_title_calls_the_ai_once_per_description(self):
+        """
+        Test that identical descriptions requested at the same time share ONE call to the AI service,
+        and that a later request for the same description (with other spaces) comes from the cache.
+        """
+        await self.async_client.aforce_login(self.user_a)
+        url = reverse('api-generate-title')
+        calls = []
+
+        async def answer(request):
+            calls.append(request)
+            await asyncio.sleep(0.2)
+            return httpx.Response(200, json=[{'summary_text': "Data Engineer."}])
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(answer))
+        with patch('portal.title_generation.get_async_http_client', return_value=client):
+            responses = await asyncio.gather(*[
+                self.async_client.post(url, json.dumps({'description': "Build our data pipelines."}), content_type='application/json')
+                for _ in range(5)
+            ])
+            again = await self.async_client.post(url, json.dumps({'description': "  Build our\ndata   pipelines. "}), content_type='application/json')
+        self.assertEqual({response.json()['title'] for response in responses}, {"Data Engineer."})
+        self.assertEqual(again.json()['title'], "Data Engineer.")
+        self.assertEqual(len(calls), 1)
+
+    async def test_generate_job_title_leaves_another_process_lock_alone(self):
+        """
+        Test that a request which stopped waiting for another process calls the AI itself, but
+        does not remove that process's lock, and that the lock lasts as long as all the AI's retries.
+        """
+        description = "Keep our servers running."
+        key = f"job-title:{title_generation._description_hash(description)}"
+        # Another process holds the lock and never writes a title.
+        await cache.aset(f"{key}:lock", 'other-process', timeout=60)
+
+        with patch('portal.title_generation._lock_timeout', return_value=0.5), \
+             patch('portal.title_generation.get_async_http_client', return_value=self._mock_ai_client()):
+            title = await title_generation.generate_title(description)
+        self.assertEqual(title, "Senior Python Developer.")
+        self.assertEqual(await cache.aget(f"{key}:lock"), 'other-process')
+
+        retries = settings.AI_TITLE_MAX_RETRIES
+        self.assertGreater(title_generation._lock_timeout(), (retries + 1) * settings.AI_TITLE_TIMEOUT + settings.AI_TITLE_MAX_WARMUP_WAIT)
+
+    @override_settings(AI_TITLE_MAX_WARMUP_WAIT=1)
+    def test_generate_job_title_waits_for_a_warming_up_model(self):
+        """
+        Test that a "model is loading" answer is retried after the model's 'estimated_time', and that
+        an estimate longer than we are willing to wait goes straight back to the user.
+        """
+        self.client.login(username='user_a', password='password123')
+        url = reverse('api-generate-title')
+        answers = [
+            httpx.Response(503, json={'error': "Model is currently loading", 'estimated_time': 0.1}),
+            httpx.Response(200, json=[{'summary_text': "QA Engineer."}]),
+            httpx.Response(503, json={'error': "Model is currently loading", 'estimated_time': 120}),
+        ]
+
+        async def answer(request):
+            return answers.pop(0)
+
+        with patch('portal.title_generation.get_async_http_client', side_effect=lambda: httpx.AsyncClient(transport=httpx.MockTransport(answer))):
+            response = self.client.post(url, json.dumps({'description': "Test our product."}), content_type='application/json')
+            self.assertEqual(response.json(), {'title': "QA Engineer."})
+
+            response = self.client.post(url, json.dumps({'description': "Test our other product."}), content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("120 seconds", response.json()['error'])
+        self.assertEqual(answers, []) # The long estimate was not retried.
+
+    def test_expired_postings_are_deactivated_from_the_partial_index(self):
+        """
+        Test that the expiry task closes exactly the active postings whose closing date has passed,
+        with one query when nothing is due, and that PostgreSQL can answer it from the partial index.
+        """
+        now = timezone.now()
+        due = JobPosting.objects.create(title="Due", description="...", company=self.company_a, closing_date=now + timedelta(minutes=5))
+        later = JobPosting.objects.create(title="Later", description="...", company=self.company_a, closing_date=now + timedelta(days=1))
+        # The closing date passes without the posting being saved again (that is what the task is for).
+        JobPosting.objects.filter(pk=due.pk).update(closing_date=now - timedelta(seconds=30))
+
+        with self.assertNumQueries(2):
+            deactivate_expired_postings()
+        self.assertFalse(JobPosting.objects.get(pk=due.pk).is_active)
+        self.assertTrue(JobPosting.objects.get(pk=later.pk).is_active)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(deactivate_expired_postings(), "No expired job postings to deactivate.")
+
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off") # The test table is tiny; we only ask whether the index CAN be used.
+            query = JobPosting.objects.filter(is_active=True, closing_date__lte=now).order_by().values_list('id', 'company_id')
+            self.assertIn('jobposting_active_closing_idx', query.explain())
+
 #-------------------------------------------------------------------------------------------------------------------------------
 
     def test_user_cannot_edit_other_company_job_posting(self):
@@ -258,6 +760,205 @@ class PortalViewsTestCase(TestCase):
         self.assertEqual(new_application.candidate, candidate_b)
         self.assertEqual(new_application.job_posting, self.job_posting_b)
 
+    def test_application_form_is_company_scoped_and_picks_candidates_by_search(self):
+        """
+        Test that the "add application" page loads its job posting once and only for the user's own
+        company, renders no candidate list of its own, and that its candidate search leaves out
+        candidates who already applied.
+        """
+        applicant = Candidate.objects.create(first_name="Zeynep", last_name="Applied", email="zeynep.applied@test.com", company=self.company_b)
+        newcomer = Candidate.objects.create(first_name="Zeynep", last_name="New", email="zeynep.new@test.com", company=self.company_b)
+        refresh_candidate_search_vectors([applicant.pk, newcomer.pk])
+        Application.objects.create(candidate=applicant, job_posting=self.job_posting_b)
+        create_url = reverse('application-create', kwargs={'pk': self.job_posting_b.pk})
+
+        # Company A's user cannot open the form of Company B's posting.
+        self.client.login(username='user_a', password='password123')
+        self.assertEqual(self.client.get(create_url).status_code, 404)
+
+        # Session, user, employee and the job posting: the candidates are not loaded at all.
+        self.client.login(username='user_b', password='password123')
+        with self.assertNumQueries(4):
+            response = self.client.get(create_url)
+        self.assertNotContains(response, "zeynep.new@test.com")
+
+        search_url = response.context['form'].fields['candidate'].widget.search_url
+        # Like the widget's JavaScript, we add 'q' to the parameters that the search URL already has.
+        path, _, query_string = search_url.partition('?')
+        results = self.client.get(path, {**QueryDict(query_string).dict(), 'q': 'zeynep'}).json()['results']
+        self.assertEqual([result['email'] for result in results], ['zeynep.new@test.com'])
+        # The applicant cannot be submitted a second time either, and the form shown again does not show them as chosen.
+        response = self.client.post(create_url, {'candidate': applicant.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Application.objects.filter(candidate=applicant).count(), 1)
+        self.assertContains(response, "No candidate selected.")
+
+        # A form shown again with a valid choice shows the chosen candidate's name, not only their hidden id.
+        form = ApplicationForm(data={'candidate': newcomer.pk}, job_posting=self.job_posting_b)
+        self.assertIn("Selected: Zeynep New (zeynep.new@test.com)", str(form['candidate']))
+
+    def test_bulk_apply_creates_applications_in_one_request(self):
+        """
+        Test that the bulk application API applies a list of candidates (or every match of a search)
+        at once, skips those who already applied, ignores other companies' candidates, updates the
+        pipeline counters, and hands very long lists to a Celery worker.
+        """
+        self.client.login(username='user_b', password='password123')
+        bulk_url = reverse('api-bulk-apply', kwargs={'pk': self.job_posting_b.pk})
+        candidates = [
+            Candidate.objects.create(first_name="Bulk", last_name=str(i), email=f"bulk{i}@test.com", company=self.company_b)
+            for i in range(4)
+        ]
+        refresh_candidate_search_vectors([candidate.pk for candidate in candidates])
+        Application.objects.create(candidate=candidates[0], job_posting=self.job_posting_b)
+        other = Candidate.objects.create(first_name="Other", last_name="Company", email="bulk-other@test.com", company=self.company_a)
+
+        ids = [candidates[0].pk, candidates[1].pk, candidates[1].pk, candidates[2].pk, other.pk]
+        response = self.client.post(bulk_url, json.dumps({'candidate_ids': ids}), content_type='application/json')
+        self.assertEqual(response.json(), {'status': 'done', 'created': 2, 'skipped': 1, 'invalid': 1})
+
+        # A search applies every match; only the last candidate is new.
+        response = self.client.post(bulk_url, json.dumps({'search': 'bulk'}), content_type='application/json')
+        self.assertEqual(response.json(), {'status': 'done', 'created': 1, 'skipped': 3, 'invalid': 0})
+        self.job_posting_b.refresh_from_db()
+        self.assertEqual(self.job_posting_b.pending_count, 4)
+        self.assertEqual(Application.objects.filter(job_posting=self.job_posting_b).count(), 4)
+
+        with override_settings(BULK_APPLY_SYNC_LIMIT=1), patch('portal.views.bulk_apply_candidates.delay') as mock_delay:
+            mock_delay.return_value.id = 'bulk-task'
+            response = self.client.post(bulk_url, json.dumps({'candidate_ids': [c.pk for c in candidates]}), content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        mock_delay.assert_called_once_with(self.job_posting_b.pk, [c.pk for c in candidates], self.company_b.pk)
+
+        # The ids must be sent as a list: the text "123" is not the ids 1, 2 and 3.
+        response = self.client.post(bulk_url, json.dumps({'candidate_ids': str(candidates[1].pk)}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        # SECURITY TEST: without the CSRF token (e.g. a form on another site), nothing is applied.
+        csrf_client = Client(enforce_csrf_checks=True)
+        csrf_client.force_login(self.user_b)
+        response = csrf_client.post(bulk_url, json.dumps({'candidate_ids': [candidates[3].pk]}), content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_bulk_apply_counts_only_the_rows_it_inserted(self):
+        """
+        Test that an application created by someone else while a bulk application is running
+        is skipped by the INSERT and is not counted twice in the pipeline counters.
+        """
+        candidates = [
+            Candidate.objects.create(first_name="Race", last_name=str(i), email=f"race{i}@test.com", company=self.company_b)
+            for i in range(3)
+        ]
+        real_insert = pipeline._insert_applications
+
+        def insert_after_a_recruiter(job_posting_id, candidate_ids):
+            # A recruiter's form applies the first candidate just before our INSERT runs.
+            Application.objects.create(candidate=candidates[0], job_posting_id=job_posting_id)
+            return real_insert(job_posting_id, candidate_ids)
+
+        with patch('portal.pipeline._insert_applications', side_effect=insert_after_a_recruiter):
+            result = pipeline.apply_candidates_to_job(self.job_posting_b.pk, [c.pk for c in candidates])
+        self.assertEqual(result, {'created': 2, 'skipped': 1})
+        self.job_posting_b.refresh_from_db()
+        self.assertEqual(self.job_posting_b.pending_count, 3)
+        self.assertEqual(Application.objects.filter(job_posting=self.job_posting_b).count(), 3)
+
+    def test_bulk_status_change_reports_every_application(self):
+        """
+        Test that the bulk status API changes many applications with one UPDATE, refuses changes
+        that are not allowed, never touches another company's applications, and keeps the
+        pipeline counters right.
+        """
+        self.client.login(username='user_b', password='password123')
+        statuses = ['Pending', 'Reviewed', 'Hired', 'Rejected']
+        applications = []
+        for i, status in enumerate(statuses):
+            candidate = Candidate.objects.create(first_name="Status", last_name=str(i), email=f"status{i}@test.com", company=self.company_b)
+            applications.append(Application.objects.create(candidate=candidate, job_posting=self.job_posting_b, status=status))
+        job_a = JobPosting.objects.create(title="A job", description="...", company=self.company_a)
+        candidate_a = Candidate.objects.create(first_name="Other", last_name="Company", email="status-a@test.com", company=self.company_a)
+        application_a = Application.objects.create(candidate=candidate_a, job_posting=job_a)
+
+        ids = [application.pk for application in applications] + [application_a.pk]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse('api-bulk-application-status'),
+                json.dumps({'status': 'Rejected', 'application_ids': ids}), content_type='application/json'
+            )
+        self.assertEqual(response.json()['updated'], 2)
+        self.assertEqual([result['outcome'] for result in response.json()['results']], ['updated', 'updated', 'not_allowed', 'unchanged', 'not_found'])
+        self.assertEqual(sum(1 for query in queries if query['sql'].startswith('UPDATE "portal_application"')), 1)
+
+        application_a.refresh_from_db()
+        self.assertEqual(application_a.status, 'Pending')
+        self.job_posting_b.refresh_from_db()
+        self.assertEqual(self.job_posting_b.pipeline(), [('Pending', 0), ('Reviewed', 0), ('Interviewed', 0), ('Rejected', 3), ('Hired', 1)])
+
+        # A whole posting can be addressed at once; an unknown status is refused.
+        response = self.client.post(reverse('api-bulk-application-status'), json.dumps({'status': 'Pending', 'job_posting_id': self.job_posting_b.pk}), content_type='application/json')
+        self.assertEqual(response.json()['updated'], 3)
+        response = self.client.post(reverse('api-bulk-application-status'), json.dumps({'status': 'Archived', 'application_ids': ids}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        # A status or an id list of the wrong type is refused with 400, not a server error.
+        for bad_data in [{'status': ['Rejected'], 'application_ids': ids}, {'status': {'Rejected': 1}, 'application_ids': ids},
+                         {'status': 'Rejected', 'application_ids': str(ids[0])}]:
+            response = self.client.post(reverse('api-bulk-application-status'), json.dumps(bad_data), content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+
+        # SECURITY TEST: without the CSRF token (e.g. a form on another site), nothing is changed.
+        csrf_client = Client(enforce_csrf_checks=True)
+        csrf_client.force_login(self.user_b)
+        response = csrf_client.post(reverse('api-bulk-application-status'), json.dumps({'status': 'Rejected', 'application_ids': ids}), content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_pipeline_counters_follow_application_create_status_change_and_delete(self):
+        """
+        Test that the pipeline counters of a job posting and of its company are updated when an
+        application is created, changes its status and is deleted, and that the dashboard shows them.
+        """
+        self.client.login(username='user_b', password='password123')
+        candidates = [
+            Candidate.objects.create(first_name="Pip", last_name=str(i), email=f"pipeline{i}@test.com", company=self.company_b)
+            for i in range(2)
+        ]
+        for candidate in candidates:
+            self.client.post(reverse('application-create', kwargs={'pk': self.job_posting_b.pk}), {'candidate': candidate.pk})
+        application = Application.objects.get(candidate=candidates[0])
+        self.client.post(reverse('application-update', kwargs={'pk': application.pk}), {'status': 'Hired'})
+
+        self.job_posting_b.refresh_from_db()
+        self.assertEqual((self.job_posting_b.pending_count, self.job_posting_b.hired_count), (1, 1))
+        self.assertEqual(self.company_b.pipeline_counts.pipeline(), [('Pending', 1), ('Reviewed', 0), ('Interviewed', 0), ('Rejected', 0), ('Hired', 1)])
+
+        # Deleting the candidate also deletes their application, which must leave the counters.
+        candidates[1].delete()
+        self.job_posting_b.refresh_from_db()
+        self.assertEqual(self.job_posting_b.total_applications, 1)
+        response = self.client.get(self.dashboard_url)
+        self.assertEqual(response.context['pipeline'].pipeline(), [('Pending', 0), ('Reviewed', 0), ('Interviewed', 0), ('Rejected', 0), ('Hired', 1)])
+
+    def test_editing_a_job_posting_keeps_its_pipeline_counters(self):
+        """
+        Test that saving a job posting (from a copy loaded BEFORE its applications changed, and
+        from the edit form) never writes old values back over the pipeline counters.
+        """
+        self.client.login(username='user_b', password='password123')
+        loaded_earlier = JobPosting.objects.get(pk=self.job_posting_b.pk)
+        candidate = Candidate.objects.create(first_name="Edit", last_name="Safe", email="edit.safe@test.com", company=self.company_b)
+        Application.objects.create(candidate=candidate, job_posting=self.job_posting_b)
+
+        loaded_earlier.title = "Renamed"
+        loaded_earlier.save()
+        self.job_posting_b.refresh_from_db()
+        self.assertEqual((self.job_posting_b.title, self.job_posting_b.pending_count), ("Renamed", 1))
+
+        self.client.post(reverse('job-update', kwargs={'pk': self.job_posting_b.pk}), {
+            'title': "Edited", 'description': "...", 'requirements': "", 'closing_date': "", 'is_active': 'on',
+        })
+        self.job_posting_b.refresh_from_db()
+        self.assertEqual((self.job_posting_b.title, self.job_posting_b.pending_count), ("Edited", 1))
+
 #-------------------------------------------------------------------------------------------------------------------------------
 
 def test_candidate_creation_fails_with_invalid_file_type(self):
@@ -303,7 +1004,36 @@ def test_candidate_creation_fails_with_invalid_file_type(self):
     
 #-----------------------------------------------------------------------------------------
 # We use a TestCase to group related tests together.
-class CVUploadTests(TestCase):
+def make_text_pdf(lines):
+    """
+    Builds a small but real one-page PDF that contains the given lines of text,
+    for the tests that read PDFs for real (e.g. in the PDF sandbox) instead of mocking PyPDF2.
+    """
+    text_ops = " ".join(f"({line}) Tj 0 -16 Td" for line in lines)
+    stream = f"BT /F1 12 Tf 72 720 Td {text_ops} ET".encode('latin-1')
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R /Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref_offset = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    return pdf
+
+
+# Most tests below replace PyPDF2 with a mock, which only works when the PDF is read in this
+# process; so the PDF sandbox (a separate child process) is switched off for them.
+@override_settings(CV_PDF_SANDBOX=False)
+class CVUploadTests(TemporaryMediaRootMixin, TestCase):
 
     def setUp(self):
         """
@@ -322,6 +1052,9 @@ class CVUploadTests(TestCase):
         # We log in our test user.
         self.client.login(username='testuser', password='password123')
 
+        # The parse cache lives in memory during tests; we empty it so every test starts clean.
+        caches['cv_parse'].clear()
+
     # --- Test for the View ---
     
     @patch('portal.views.process_single_cv.delay') # We "mock" the Celery task's delay method.
@@ -345,8 +1078,8 @@ class CVUploadTests(TestCase):
 
     # --- Tests for the Celery Task ---
 
-    @patch('portal.tasks.genai.GenerativeModel') # We "mock" the entire Gemini Model class.
-    def test_process_single_cv_creates_candidate_on_ai_success(self, MockGenerativeModel):
+    @patch('portal.tasks.get_llm_client') # We "mock" the shared AI client of the worker process.
+    def test_process_single_cv_creates_candidate_on_ai_success(self, mock_get_llm_client):
         """
         Tests if the Celery task correctly creates a Candidate when the AI provides a valid response.
         This tests our "Plan A".
@@ -354,14 +1087,10 @@ class CVUploadTests(TestCase):
         print("Running test: test_process_single_cv_creates_candidate_on_ai_success")
         
         # --- Mocking the AI Response ---
-        # We create a fake response that looks exactly like a real one from the Gemini API.
-        mock_response = MagicMock()
-        mock_response.text = '```json\n{"first_name": "Jane", "last_name": "AI", "email": "jane.ai@test.com"}\n```'
-        
-        # We tell our mocked model's 'generate_content' method to return our fake response.
-        MockGenerativeModel.return_value.generate_content.return_value = mock_response
+        # We tell our mocked client's 'generate' method to return text that looks exactly like a real Gemini answer.
+        mock_get_llm_client.return_value.generate.return_value = '```json\n{"first_name": "Jane", "last_name": "AI", "email": "jane.ai@test.com"}\n```'
         
-        fake_file_content_b64 = base64.b64encode(b"fake pdf content").decode('utf-8')
+        staged_key = stage_upload(SimpleUploadedFile("fake_cv.pdf", b"fake pdf content"), self.company.id)
 
         # --- We now also mock the PDF reader ---
         # This prevents the "EOF marker not found" error by bypassing the actual PDF reading.
@@ -372,7 +1101,7 @@ class CVUploadTests(TestCase):
             mock_pdf_reader.return_value.pages = [mock_page]
 
             # We run the Celery task directly as a normal function inside the patch context.
-            process_single_cv(fake_file_content_b64, "fake_cv.pdf", self.company.id, self.user.id)
+            process_single_cv(staged_key, "fake_cv.pdf", self.company.id, self.user.id)
         
         # --- Assertions ---
         # We check if a new Candidate was actually created in the database with the AI's data.
@@ -381,8 +1110,8 @@ class CVUploadTests(TestCase):
         self.assertEqual(candidate.first_name, "Jane")
         self.assertEqual(candidate.last_name, "AI")
 
-    @patch('portal.tasks.genai.GenerativeModel')
-    def test_process_single_cv_uses_regex_on_ai_failure(self, MockGenerativeModel):
+    @patch('portal.tasks.get_llm_client')
+    def test_process_single_cv_uses_regex_on_ai_failure(self, mock_get_llm_client):
         """
         Tests if the Celery task falls back to RegEx and still creates a Candidate
         when the AI call fails. This tests our "Plan B".
@@ -390,13 +1119,13 @@ class CVUploadTests(TestCase):
         print("Running test: test_process_single_cv_uses_regex_on_ai_failure")
         
         # --- Mocking an AI FAILURE ---
-        # We configure the mocked 'generate_content' method to raise an exception,
+        # We configure the mocked 'generate' method to raise an exception,
         # simulating a network error or the API being down.
-        MockGenerativeModel.return_value.generate_content.side_effect = Exception("Simulating API failure")
+        mock_get_llm_client.return_value.generate.side_effect = Exception("Simulating API failure")
 
         # We create fake file content that contains information our RegEx can find.
         fake_pdf_text = "This is a test CV for John Regex. Contact him at john.regex@test.com."
-        fake_file_content_b64 = base64.b64encode(fake_pdf_text.encode('utf-8')).decode('utf-8')
+        staged_key = stage_upload(SimpleUploadedFile("fake_cv.pdf", fake_pdf_text.encode('utf-8')), self.company.id)
         
         # We need to also mock the PDF reader to return our fake text.
         with patch('portal.tasks.PyPDF2.PdfReader') as mock_pdf_reader:
@@ -407,7 +1136,7 @@ class CVUploadTests(TestCase):
             mock_pdf_reader.return_value.pages = [mock_page]
 
             # Run the task. This will trigger the exception inside the 'try' block.
-            process_single_cv(fake_file_content_b64, "fake_cv.pdf", self.company.id, self.user.id)
+            process_single_cv(staged_key, "fake_cv.pdf", self.company.id, self.user.id)
         
         # --- Assertions ---
         # We check that a Candidate was STILL created, this time with the data found by our RegEx fallback.
@@ -415,3 +1144,390 @@ class CVUploadTests(TestCase):
         candidate = Candidate.objects.get(email="john.regex@test.com")
         self.assertEqual(candidate.first_name, "John")
         self.assertEqual(candidate.last_name, "Regex")
+
+    # --- Tests for the asynchronous parsing API ---
+
+    @patch('portal.views.process_single_cv.delay')
+    def test_parse_cv_api_queues_task_and_returns_job_id(self, mock_delay):
+        """
+        Tests that the parse API does not run the task itself, but queues it
+        and immediately answers with a job id and a status URL.
+        """
+        mock_delay.return_value = MagicMock(id='job-123')
+        fake_cv = SimpleUploadedFile("cv.pdf", b"file_content", content_type="application/pdf")
+
+        response = self.client.post(reverse('api-parse-cv'), {'cv_file': fake_cv})
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(mock_delay.call_count, 1)
+        self.assertEqual(response.json()['job_id'], 'job-123')
+        self.assertEqual(response.json()['status_url'], reverse('api-parse-cv-status', kwargs={'job_id': 'job-123'}))
+
+    @patch('portal.views.AsyncResult')
+    def test_parse_cv_status_returns_result_only_to_own_company(self, MockAsyncResult):
+        """
+        Tests that the status API returns the parsed fields once the job is done,
+        and that a job belonging to another company is reported as not found.
+        """
+        mock_result = MockAsyncResult.return_value
+        mock_result.ready.return_value = True
+        mock_result.failed.return_value = False
+        mock_result.result = {'first_name': 'Jane', 'last_name': 'Doe', 'email': 'jane@test.com', 'company_id': self.company.id}
+
+        response = self.client.get(reverse('api-parse-cv-status', kwargs={'job_id': 'job-123'}))
+        self.assertEqual(response.json()['status'], 'done')
+        self.assertEqual(response.json()['result']['email'], 'jane@test.com')
+        self.assertNotIn('company_id', response.json()['result'])
+
+        # The same job, but recorded for a different company.
+        mock_result.result = {'email': 'jane@test.com', 'company_id': self.company.id + 1}
+        response = self.client.get(reverse('api-parse-cv-status', kwargs={'job_id': 'job-123'}))
+        self.assertEqual(response.status_code, 404)
+
+    # --- Tests for the staged upload store ---
+
+    def test_save_candidates_moves_staged_file_into_resumes(self):
+        """
+        Tests that the save API only needs the staged key: the staged file is moved
+        into 'resumes/' and attached to the new candidate.
+        """
+        staged_key = stage_upload(SimpleUploadedFile("cv.pdf", b"%PDF-1.4 staged"), self.company.id)
+        payload = {'candidates': [{
+            'first_name': 'Stan', 'last_name': 'Staged', 'email': 'stan@test.com',
+            'staged_key': staged_key, 'original_filename': 'cv.pdf',
+        }]}
+
+        response = self.client.post(reverse('api-save-candidates'), json.dumps(payload), content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        candidate = Candidate.objects.get(email='stan@test.com')
+        self.assertTrue(candidate.resume.name.startswith('resumes/'))
+        self.assertEqual(candidate.resume.read(), b"%PDF-1.4 staged")
+        # The file was moved, not copied.
+        self.assertFalse(os.path.exists(staged_path(self.company.id, staged_key)))
+
+    def test_staged_key_cannot_point_outside_the_staging_area(self):
+        """
+        SECURITY TEST: Only SHA-256 hex digests are accepted as staged keys.
+        """
+        with self.assertRaises(ValueError):
+            staged_path(self.company.id, '../../settings')
+
+    # --- Tests for the batched candidate saver ---
+
+    def _save_candidates(self, candidates):
+        """
+        A small helper that posts a list of candidates to the save API, the same way our JavaScript does.
+        """
+        return self.client.post(reverse('api-save-candidates'), json.dumps({'candidates': candidates}), content_type='application/json')
+
+    def test_save_candidates_reports_outcome_of_every_row(self):
+        """
+        Tests that the save API creates the new candidates and returns one report entry per row:
+        created, skipped (duplicate email) or error (invalid email).
+        """
+        Candidate.objects.create(first_name="Old", last_name="One", email="old@test.com", company=self.company, created_by=self.employee)
+
+        response = self._save_candidates([
+            {'first_name': 'New', 'last_name': 'One', 'email': 'new@test.com'},
+            {'first_name': 'Old', 'last_name': 'One', 'email': 'old@test.com'},
+            {'first_name': 'New', 'last_name': 'Again', 'email': 'new@test.com'},
+            {'first_name': 'No', 'last_name': 'Email', 'email': 'not-an-email'},
+        ])
+
+        data = response.json()
+        self.assertEqual([result['status'] for result in data['results']], ['created', 'skipped', 'skipped', 'error'])
+        self.assertEqual((data['created'], data['skipped'], data['failed']), (1, 2, 1))
+        self.assertEqual(data['results'][0]['id'], Candidate.objects.get(email='new@test.com').pk)
+
+    def test_save_candidates_query_count_does_not_grow_with_rows(self):
+        """
+        PERFORMANCE TEST: Saving 10 candidates must run exactly as many queries as saving 2.
+        """
+        def count_queries(prefix, row_count):
+            candidates = [{'first_name': 'A', 'last_name': 'B', 'email': f'{prefix}{i}@test.com'} for i in range(row_count)]
+            with CaptureQueriesContext(connection) as queries:
+                self._save_candidates(candidates)
+            return len(queries)
+
+        self.assertEqual(count_queries('small', 2), count_queries('large', 10))
+        self.assertEqual(Candidate.objects.filter(company=self.company).count(), 12)
+
+    @patch('portal.views.process_cv_batch.delay')
+    def test_batch_parse_api_queues_one_task_per_llm_batch(self, mock_delay):
+        """
+        Tests that the batch API groups the files of one request into a single batch task
+        and still returns one job per file, in order.
+        """
+        mock_delay.return_value = MagicMock(id='job-1')
+        fake_cv1 = SimpleUploadedFile("cv1.pdf", b"content1", content_type="application/pdf")
+        fake_cv2 = SimpleUploadedFile("cv2.pdf", b"content2", content_type="application/pdf")
+
+        response = self.client.post(reverse('api-parse-cv-batch'), {'cv_files': [fake_cv1, fake_cv2]})
+
+        self.assertEqual(response.status_code, 202)
+        jobs = response.json()['jobs']
+        self.assertEqual([(job['job_id'], job['original_filename']) for job in jobs], [('job-1:0', 'cv1.pdf'), ('job-1:1', 'cv2.pdf')])
+        self.assertEqual(mock_delay.call_count, 1)
+        self.assertEqual([name for _key, name in mock_delay.call_args.args[0]], ['cv1.pdf', 'cv2.pdf'])
+
+        # SECURITY TEST: without the CSRF token (e.g. a form on another site), the upload is refused.
+        csrf_client = Client(enforce_csrf_checks=True)
+        csrf_client.force_login(self.user)
+        fake_cv3 = SimpleUploadedFile("cv3.pdf", b"content3", content_type="application/pdf")
+        self.assertEqual(csrf_client.post(reverse('api-parse-cv-batch'), {'cv_files': [fake_cv3]}).status_code, 403)
+
+    @patch('portal.tasks.get_llm_client')
+    def test_process_cv_batch_maps_answers_and_falls_back_per_item(self, mock_get_llm_client):
+        """
+        Tests that one AI request parses the whole batch, that each answer is mapped back to its
+        file by id, and that a CV missing from the answer is parsed by the RegEx fallback.
+        """
+        # The AI answers out of order and forgets CV number 1.
+        mock_get_llm_client.return_value.generate.return_value = (
+            '[{"id": 2, "first_name": "Cem", "last_name": "Kaya", "email": "cem@test.com"},'
+            ' {"id": 0, "first_name": "Ada", "last_name": "Lovelace", "email": "ada@test.com"}]'
+        )
+        texts = ["Ada Lovelace ada@test.com", "Bob Stone bob@test.com", "Cem Kaya cem@test.com"]
+        staged_files = [[stage_upload(SimpleUploadedFile(f"cv{i}.pdf", text.encode()), self.company.id), f"cv{i}.pdf"] for i, text in enumerate(texts)]
+
+        with patch('portal.tasks.read_cv_text', side_effect=texts):
+            results = process_cv_batch(staged_files, self.company.id)
+
+        self.assertEqual(mock_get_llm_client.return_value.generate.call_count, 1)
+        self.assertEqual([result['email'] for result in results], ['ada@test.com', 'bob@test.com', 'cem@test.com'])
+        self.assertEqual(results[1]['first_name'], 'Bob')
+
+        # Each file of the batch can be followed through the normal status API.
+        with patch('portal.views.AsyncResult') as MockAsyncResult:
+            MockAsyncResult.return_value.ready.return_value = True
+            MockAsyncResult.return_value.failed.return_value = False
+            MockAsyncResult.return_value.result = results
+            response = self.client.get(reverse('api-parse-cv-status', kwargs={'job_id': 'job-1:2'}))
+        MockAsyncResult.assert_called_with('job-1')
+        self.assertEqual(response.json()['result']['email'], 'cem@test.com')
+
+    # --- Tests for the parse cache ---
+
+    @patch('portal.tasks.get_llm_client')
+    def test_same_pdf_is_parsed_by_the_ai_only_once(self, mock_get_llm_client):
+        """
+        Tests that the second upload of the same PDF is answered from the parse cache:
+        the AI is not called again, and the parse API returns the result without queuing a task.
+        """
+        mock_get_llm_client.return_value.generate.return_value = '{"first_name": "Cache", "last_name": "Hit", "email": "cache.hit@test.com"}'
+
+        with patch('portal.tasks.PyPDF2.PdfReader') as mock_pdf_reader:
+            mock_page = MagicMock()
+            mock_page.extract_text.return_value = "Some CV text."
+            mock_pdf_reader.return_value.pages = [mock_page]
+
+            staged_key = stage_upload(SimpleUploadedFile("cv.pdf", b"same pdf"), self.company.id)
+            first = process_single_cv(staged_key, "cv.pdf", self.company.id, self.user.id, create_candidate=False)
+            second = process_single_cv(staged_key, "cv.pdf", self.company.id, self.user.id, create_candidate=False)
+
+        self.assertEqual(mock_get_llm_client.return_value.generate.call_count, 1)
+        self.assertEqual(first['email'], second['email'])
+
+        # Uploading the same bytes again through the API returns the cached fields immediately.
+        with patch('portal.views.process_single_cv.delay') as mock_delay:
+            response = self.client.post(reverse('api-parse-cv'), {'cv_file': SimpleUploadedFile("again.pdf", b"same pdf")})
+        mock_delay.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['result']['email'], 'cache.hit@test.com')
+        self.assertEqual(response.json()['result']['original_filename'], 'again.pdf')
+
+    # --- Tests for the fast local extraction tier ---
+
+    @patch('portal.tasks.get_llm_client')
+    def test_obvious_cv_is_parsed_locally_without_ai(self, mock_get_llm_client):
+        """
+        Tests that a CV with one email and the name on its first line is answered by the
+        local extractor, that the AI is not called, and that the stats API counts it.
+        """
+        with patch('portal.tasks.PyPDF2.PdfReader') as mock_pdf_reader:
+            mock_page = MagicMock()
+            mock_page.extract_text.return_value = "MARIA GARCÍA\nSoftware Engineer\nmaria.garcia@test.com | +90 555 000 00 00"
+            mock_pdf_reader.return_value.pages = [mock_page]
+
+            staged_key = stage_upload(SimpleUploadedFile("cv.pdf", b"obvious pdf"), self.company.id)
+            result = process_single_cv(staged_key, "cv.pdf", self.company.id, self.user.id, create_candidate=False)
+
+        mock_get_llm_client.return_value.generate.assert_not_called()
+        self.assertEqual((result['first_name'], result['last_name'], result['email']), ('Maria', 'García', 'maria.garcia@test.com'))
+
+        stats = self.client.get(reverse('api-parse-cv-stats')).json()
+        self.assertEqual(stats['tiers']['local'], 1)
+        self.assertEqual(stats['tiers']['ai'], 0)
+
+    def test_local_extractor_is_unsure_about_ambiguous_cvs(self):
+        """
+        Tests that the confidence drops when the local extractor has to guess.
+        """
+        sure = local_extract("Jane Doe\njane.doe@test.com")
+        no_name = local_extract("Experienced engineer looking for new challenges.\njane.doe@test.com")
+        many_emails = local_extract("Contact: a@test.com, b@test.com\nJane Doe")
+
+        self.assertGreaterEqual(sure['confidence'], 0.9)
+        self.assertLess(no_name['confidence'], 0.9)
+        self.assertLess(many_emails['confidence'], 0.9)
+
+    def test_local_extractor_does_not_take_headings_for_names(self):
+        """
+        Tests that job titles and section headings are never taken for the candidate's name, and that
+        a name line is only trusted without the AI when the email confirms it.
+        """
+        for heading in ("Senior Software Engineer", "Key Skills", "Python Developer", "Curriculum Vitae"):
+            result = local_extract(f"{heading}\nsomeone@test.com")
+            self.assertIsNone(result['first_name'], heading)
+            self.assertLess(result['confidence'], 0.9, heading)
+
+        # A name-like line the email does not confirm goes to the AI.
+        self.assertLess(local_extract("Jane Doe\nrecruiting@test.com")['confidence'], 0.9)
+        # The email confirms the name, also with Turkish letters and below a job title.
+        sure = local_extract("Backend Developer\nAyşe Yılmaz\nayse.yilmaz@test.com")
+        self.assertEqual((sure['first_name'], sure['last_name']), ("Ayşe", "Yılmaz"))
+        self.assertGreaterEqual(sure['confidence'], 0.9)
+
+    def test_candidate_created_by_the_task_is_searchable_by_cv_text(self):
+        """
+        Tests that a candidate created from a CV can be found by words that only appear in the CV.
+        """
+        with patch('portal.tasks.PyPDF2.PdfReader') as mock_pdf_reader:
+            mock_page = MagicMock()
+            mock_page.extract_text.return_value = "Jane Doe\njane.doe@test.com\nSkills: Kubernetes, Terraform"
+            mock_pdf_reader.return_value.pages = [mock_page]
+            staged_key = stage_upload(SimpleUploadedFile("cv.pdf", b"searchable pdf"), self.company.id)
+            process_single_cv(staged_key, "cv.pdf", self.company.id, self.user.id)
+
+        results = self.client.get(reverse('api-candidate-search'), {'q': 'kubern'}).json()['results']
+        self.assertEqual([result['email'] for result in results], ['jane.doe@test.com'])
+
+    def test_cv_text_is_stored_once_and_backfilled_for_old_candidates(self):
+        """
+        Tests that the task stores the CV text of the candidate it creates, and that the
+        backfill command stores it for older candidates, skipping those that already have one.
+        """
+        with patch('portal.tasks.PyPDF2.PdfReader') as mock_pdf_reader:
+            mock_page = MagicMock()
+            mock_page.extract_text.return_value = "Jane Doe\njane.doe@test.com\nSkills: Django"
+            mock_pdf_reader.return_value.pages = [mock_page]
+            staged_key = stage_upload(SimpleUploadedFile("cv.pdf", b"stored pdf"), self.company.id)
+            process_single_cv(staged_key, "cv.pdf", self.company.id, self.user.id)
+            new_candidate = Candidate.objects.get(email='jane.doe@test.com')
+            self.assertEqual(CandidateCVText.objects.get(candidate=new_candidate).text, mock_page.extract_text.return_value)
+
+            # An older candidate whose resume was never read.
+            old_candidate = Candidate.objects.create(
+                company=self.company, first_name='Old', last_name='Timer', email='old@test.com',
+                resume=SimpleUploadedFile("old.pdf", b"old pdf")
+            )
+            mock_pdf_reader.reset_mock()
+            call_command('backfill_cv_text', '--batch-size', '1', '--workers', '1', stdout=StringIO())
+
+        # Only the old candidate's resume was read; the new one already had its text.
+        self.assertEqual(mock_pdf_reader.call_count, 1)
+        self.assertTrue(CandidateCVText.objects.filter(candidate=old_candidate).exists())
+        results = self.client.get(reverse('api-candidate-search'), {'q': 'django timer'}).json()['results']
+        self.assertEqual([result['email'] for result in results], ['old@test.com'])
+
+        # More threads than the process has pooled connections are not started.
+        output = StringIO()
+        with override_settings(DB_CONNECTION_MODE='pool', DB_POOL_MAX_SIZE=3):
+            call_command('backfill_cv_text', '--workers', '8', stdout=output)
+        self.assertIn("Using 3 worker(s)", output.getvalue())
+
+    # --- Tests for the page-bounded PDF reader ---
+
+    @override_settings(CV_PDF_MAX_PAGES=3)
+    def test_pdf_reading_stops_at_the_page_limit_or_when_fields_are_found(self):
+        """
+        Tests that a long PDF is not read to the end: reading stops at the page limit,
+        or even earlier once the name and the email have been found.
+        """
+        staged_key = stage_upload(SimpleUploadedFile("cv.pdf", b"long pdf"), self.company.id)
+        pdf_path = staged_path(self.company.id, staged_key)
+
+        with patch('portal.tasks.PyPDF2.PdfReader') as mock_pdf_reader:
+            # A 60-page portfolio with no contact details at all.
+            portfolio_pages = [MagicMock(**{'extract_text.return_value': "Project gallery page."}) for _ in range(60)]
+            mock_pdf_reader.return_value.pages = portfolio_pages
+            read_cv_text(pdf_path)
+        self.assertEqual(sum(page.extract_text.call_count for page in portfolio_pages), 3)
+
+        with patch('portal.tasks.PyPDF2.PdfReader') as mock_pdf_reader:
+            # A CV whose first page already has everything we need.
+            cv_pages = [MagicMock(**{'extract_text.return_value': "Jane Doe\njane.doe@test.com\n"})] + \
+                       [MagicMock(**{'extract_text.return_value': "Experience..."}) for _ in range(5)]
+            mock_pdf_reader.return_value.pages = cv_pages
+            text = read_cv_text(pdf_path)
+        self.assertEqual(cv_pages[1].extract_text.call_count, 0)
+        self.assertIn("jane.doe@test.com", text)
+
+    # --- Tests for the PDF sandbox ---
+
+    @override_settings(CV_PDF_SANDBOX=True)
+    def test_pdf_is_read_in_the_sandbox_process(self):
+        """
+        Tests that a real PDF is read by the sandboxed child process, and that a file
+        which is not a PDF at all only fails the child, not the task.
+        """
+        staged_key = stage_upload(SimpleUploadedFile("cv.pdf", make_text_pdf(["Jane Sandbox", "jane.sandbox@test.com"])), self.company.id)
+        result = process_single_cv(staged_key, "cv.pdf", self.company.id, self.user.id, create_candidate=False)
+        self.assertEqual((result['first_name'], result['last_name'], result['email']), ('Jane', 'Sandbox', 'jane.sandbox@test.com'))
+
+        broken_key = stage_upload(SimpleUploadedFile("broken.pdf", b"%PDF-1.4 this is not really a PDF"), self.company.id)
+        broken_result = process_single_cv(broken_key, "broken.pdf", self.company.id, self.user.id, create_candidate=False)
+        self.assertIn('error', broken_result)
+
+    def test_pdf_sandbox_child_applies_its_own_memory_limit(self):
+        """
+        Tests that the child process sets the memory limit it is given before it reads the PDF:
+        with a tiny limit it cannot even load the PDF library, so no page comes back.
+        """
+        pdf_path = os.path.join(settings.MEDIA_ROOT, "limits.pdf")
+        with open(pdf_path, 'wb') as pdf_file:
+            pdf_file.write(make_text_pdf(["Jane Limits", "jane.limits@test.com"]))
+        self.assertIn("Jane Limits", "".join(iter_pdf_pages_sandboxed(pdf_path, max_pages=2, time_limit=30)))
+        with override_settings(CV_PDF_SANDBOX_MEMORY_MB=1):
+            self.assertEqual(list(iter_pdf_pages_sandboxed(pdf_path, max_pages=2, time_limit=30)), [])
+
+    # --- Tests for the LLM client layer ---
+
+    @override_settings(LLM_BACKEND='gemini')
+    @patch('portal.llm.genai')
+    def test_gemini_client_is_created_once_and_reused(self, mock_genai):
+        """
+        Tests that the Gemini client is configured once and then shared by every call.
+        """
+        client = init_llm_client()
+        mock_genai.GenerativeModel.return_value.generate_content.return_value.text = 'answer'
+
+        self.assertIs(get_llm_client(), client)
+        self.assertEqual(get_llm_client().generate('first'), 'answer')
+        self.assertEqual(get_llm_client().generate('second'), 'answer')
+        self.assertEqual(mock_genai.configure.call_count, 1)
+        self.assertEqual(mock_genai.GenerativeModel.call_count, 1)
+
+    def test_process_single_cv_with_local_stub_server(self):
+        """
+        Tests the whole task against the local stub server (the 'stub' backend), without any real AI.
+        """
+        # Port 0 asks the operating system for any free port.
+        server = ThreadingHTTPServer(('127.0.0.1', 0), StubRequestHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        stub_url = f"http://127.0.0.1:{server.server_address[1]}/generate"
+        with override_settings(LLM_BACKEND='stub', LLM_STUB_URL=stub_url), patch('portal.tasks.PyPDF2.PdfReader') as mock_pdf_reader:
+            init_llm_client()
+            mock_page = MagicMock()
+            # Two addresses make the local extractor unsure, so the task has to ask the stub server.
+            mock_page.extract_text.return_value = "Stubby Person\nstubby.person@test.com\nReferences: ref.one@test.com"
+            mock_pdf_reader.return_value.pages = [mock_page]
+
+            staged_key = stage_upload(SimpleUploadedFile("cv.pdf", b"stub pdf"), self.company.id)
+            result = process_single_cv(staged_key, "cv.pdf", self.company.id, self.user.id, create_candidate=False)
+
+        self.assertEqual((result['first_name'], result['last_name'], result['email']), ('Stubby', 'Person', 'stubby.person@test.com'))
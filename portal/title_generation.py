@@ -0,0 +1,201 @@
+"""
+Generates a job title from a job description with the Hugging Face summarization model.
+
+Calling the model is slow (seconds) and every call costs us, so we avoid calls wherever we can:
+
+1. CACHE: The title of every description is kept in the shared default cache (Redis). The key is
+   a hash of the normalized description, so the same text with different spaces or line breaks
+   gives the same key, and a second click on "Generate Title" is answered right away.
+
+2. SINGLE-FLIGHT: When the same description is requested several times at once (e.g. a double
+   click, or two recruiters working on the same posting), only ONE request goes to the model:
+   - inside a process, the other requests wait for the same asyncio task,
+   - across processes, a short lock in the cache lets one process call the model while the
+     others wait for the title to appear in the cache.
+
+3. RETRIES: When the model is still loading ("warming up"), Hugging Face answers 503 with an
+   'estimated_time'. We wait that long (up to AI_TITLE_MAX_WARMUP_WAIT seconds in total) and try
+   again ourselves, instead of sending the error to the user, who would only click again.
+   Network errors and other temporary errors (429, 502, 504) are retried with a growing pause.
+"""
+import asyncio
+import hashlib
+import json
+import re
+import weakref
+
+import httpx
+from django.conf import settings
+from django.core.cache import cache
+
+from .ai_http import get_async_http_client
+
+# The title used when the model answers without a summary.
+DEFAULT_TITLE = "New Job Posting"
+
+# The HTTP statuses that are worth another try after a short pause.
+RETRYABLE_STATUSES = {429, 502, 503, 504}
+
+# The requests that are currently waiting for the model, per event loop: {description hash: task}.
+_in_flight = weakref.WeakKeyDictionary()
+
+
+class TitleGenerationError(Exception):
+    """
+    The model could not give a title. 'message' is meant for the user, 'status' is the HTTP status to answer with.
+    """
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def normalize_description(description):
+    """
+    Removes the differences that do not change the meaning of a description: extra spaces and line breaks.
+    """
+    return ' '.join(description.split())
+
+
+def _description_hash(description):
+    # The model's address is part of the hash, so switching to another model gives new titles.
+    text = f"{settings.AI_SUMMARIZATION_MODEL_URL}\n{description}"
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def first_sentence_title(result):
+    """
+    Turns the model's answer into a title: the first sentence of its summary.
+    """
+    generated_title = DEFAULT_TITLE
+    # Safely check if the response is in the expected format (a list with at least one item).
+    if result and isinstance(result, list) and isinstance(result[0], dict):
+        title_from_api = result[0].get('summary_text')
+        if title_from_api:
+            # This is our logic to fix the "long sentence" problem.
+            # We split the summary into sentences and take only the first one.
+            sentences = re.split(r'(?<=[.!?])\s+', title_from_api.strip())
+            if sentences and sentences[0]:
+                generated_title = sentences[0]
+    return generated_title.strip()
+
+
+async def _call_model(description):
+    """
+    Sends the description to the model and returns its title, retrying temporary errors.
+    """
+    headers = {"Authorization": f"Bearer {settings.HUGGING_FACE_API_KEY}"}
+    payload = {"inputs": description, "parameters": {"max_length": 50, "min_length": 5}}
+    warmup_budget = settings.AI_TITLE_MAX_WARMUP_WAIT
+
+    for attempt in range(settings.AI_TITLE_MAX_RETRIES + 1):
+        is_last_attempt = attempt == settings.AI_TITLE_MAX_RETRIES
+        # A growing pause between tries: 0.5, 1, 2, ... seconds.
+        pause = 0.5 * 2 ** attempt
+        try:
+            response = await get_async_http_client().post(settings.AI_SUMMARIZATION_MODEL_URL, headers=headers, json=payload)
+        except httpx.TransportError:
+            # The connection failed or timed out. After the last try, the view answers the error.
+            if is_last_attempt:
+                raise
+            await asyncio.sleep(pause)
+            continue
+
+        if response.status_code == 200:
+            return first_sentence_title(response.json())
+
+        try:
+            error_data = response.json()
+        except json.JSONDecodeError:
+            error_data = {}
+        if not isinstance(error_data, dict):
+            error_data = {}
+        api_error_message = error_data.get('error', 'Unknown API error.')
+
+        if 'is currently loading' in str(api_error_message):
+            # The model is warming up. We wait as long as Hugging Face estimates, if our budget allows it.
+            estimated_time = float(error_data.get('estimated_time', 20))
+            if is_last_attempt or estimated_time > warmup_budget:
+                raise TitleGenerationError(
+                    f"The AI model is currently warming up. Please try again in {estimated_time:.0f} seconds.", 503
+                )
+            warmup_budget -= estimated_time
+            await asyncio.sleep(estimated_time)
+            continue
+
+        if response.status_code in RETRYABLE_STATUSES and not is_last_attempt:
+            await asyncio.sleep(pause)
+            continue
+
+        if not error_data:
+            raise TitleGenerationError(f"API returned a non-JSON response: {response.text}", response.status_code)
+        raise TitleGenerationError(f"API Error: {api_error_message}", response.status_code)
+
+
+async def _generate_and_cache(description, key):
+    """
+    Calls the model for one description, unless another process is already doing it.
+    """
+    lock_key = f"{key}:lock"
+    # cache.add() only succeeds if the key does not exist yet, so exactly one process gets the lock.
+    # The lock expires on its own, in case its process dies before removing it.
+    lock_timeout = _lock_timeout()
+    lock_acquired = await cache.aadd(lock_key, 1, timeout=lock_timeout)
+    if not lock_acquired:
+        # Another process is asking the model: we wait for its title to appear in the cache.
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + lock_timeout
+        while loop.time() < deadline:
+            await asyncio.sleep(0.25)
+            title = await cache.aget(key)
+            if title is not None:
+                return title
+            if await cache.aget(lock_key) is None:
+                break # The other process has failed; we try ourselves.
+    try:
+        title = await _call_model(description)
+        await cache.aset(key, title, timeout=settings.AI_TITLE_CACHE_TIMEOUT)
+        return title
+    finally:
+        # Only the process that holds the lock removes it. A process that gave up waiting must not
+        # remove a lock that another process has taken in the meantime.
+        if lock_acquired:
+            await cache.adelete(lock_key)
+
+
+def _lock_timeout():
+    """
+    The longest time (in seconds) one _call_model() can take: every try may wait for the full
+    AI_TITLE_TIMEOUT, with the growing pauses between the tries and the model's warm-up on top.
+    The lock must not expire before that, or a second process would call the model as well.
+    """
+    retries = settings.AI_TITLE_MAX_RETRIES
+    requests_time = (retries + 1) * settings.AI_TITLE_TIMEOUT
+    pauses_time = sum(0.5 * 2 ** attempt for attempt in range(retries))
+    return int(requests_time + pauses_time + settings.AI_TITLE_MAX_WARMUP_WAIT) + 10
+
+
+async def generate_title(description):
+    """
+    Returns the title of a job description, from the cache whenever possible.
+    Raises TitleGenerationError (or an httpx error) when the model cannot give one.
+    """
+    description = normalize_description(description)
+    # A description of only spaces has nothing to summarize: it is neither cached nor sent to the model.
+    if not description:
+        raise TitleGenerationError("Description cannot be empty.", 400)
+    key = f"job-title:{_description_hash(description)}"
+
+    title = await cache.aget(key)
+    if title is not None:
+        return title
+
+    # Single-flight inside this process: identical requests share one task.
+    in_flight = _in_flight.setdefault(asyncio.get_running_loop(), {})
+    task = in_flight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_generate_and_cache(description, key))
+        in_flight[key] = task
+        task.add_done_callback(lambda finished_task: in_flight.pop(key, None))
+    # 'shield' keeps the shared task running if THIS request is cancelled (e.g. the user left the page).
+    return await asyncio.shield(task)
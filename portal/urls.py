@@ -21,6 +21,15 @@ urlpatterns = [
     # Path for the main user dashboard.
     path('dashboard/', DashboardView.as_view(), name='dashboard'),
 
+    # The next pages of the dashboard's tables, loaded while the user scrolls.
+    # Example URL: /portal/api/dashboard/candidates/?cursor=WyJEb2UiLCAiSmFuZSIsIDQyXQ==
+    path('api/dashboard/job-postings/', views.dashboard_job_postings_api_view, name='api-dashboard-job-postings'),
+    path('api/dashboard/candidates/', views.dashboard_candidates_api_view, name='api-dashboard-candidates'),
+
+    # Ranked, paginated search over the company's candidates (name, email and CV text).
+    # Example URL: /portal/api/candidates/search/?q=jane&page=1
+    path('api/candidates/search/', views.candidate_search_api_view, name='api-candidate-search'),
+
     # Path for creating a new job posting.
     path('jobs/new/', JobPostingCreateView.as_view(), name='job-create'),
 
@@ -63,6 +72,16 @@ urlpatterns = [
     # Example URL: /portal/application/12/update/
     path('application/<int:pk>/update/', ApplicationUpdateView.as_view(), name='application-update'),
 
+    # Applies a whole list of candidates (or every match of a candidate search) to a job posting.
+    # Example URL: /portal/api/jobs/7/applications/bulk/
+    path('api/jobs/<int:pk>/applications/bulk/', views.bulk_apply_api_view, name='api-bulk-apply'),
+
+    # A long list is applied by a Celery worker; the result can be polled here.
+    path('api/jobs/<int:pk>/applications/bulk/<str:task_id>/status/', views.bulk_apply_status_api_view, name='api-bulk-apply-status'),
+
+    # Moves many applications to a new status at once (e.g. rejects everyone left when a role is closed).
+    path('api/applications/bulk-status/', views.bulk_application_status_api_view, name='api-bulk-application-status'),
+
     # Path for generating a job title using an external API.
     # This URL will be used to send a request to the API to generate a job title.
     path('api/generate-title/', generate_job_title_view, name='api-generate-title'),
@@ -77,6 +96,24 @@ urlpatterns = [
     # This endpoint will receive a single CV file, parse it using our task's logic,
     # and return the extracted data as JSON.
     path('api/parse-cv/', views.parse_cv_api_view, name='api-parse-cv'),
+
+    # The parse endpoints only queue the work and return a job id.
+    # The JavaScript then polls this URL until the parsed fields are ready.
+    # Example URL: /portal/api/parse-cv/0b6f.../status/
+    path('api/parse-cv/<str:job_id>/status/', views.cv_parse_status_api_view, name='api-parse-cv-status'),
+
+    # This endpoint receives MANY CV files in one request and queues one parsing task per file.
+    path('api/parse-cv/batch/', views.parse_cv_batch_api_view, name='api-parse-cv-batch'),
+
+    # The bulk upload page asks for the status of all its unfinished jobs in one request here.
+    # Example URL: /portal/api/parse-cv/status/?job_id=a&job_id=b
+    path('api/parse-cv/status/', views.cv_parse_batch_status_api_view, name='api-parse-cv-batch-status'),
+
+    # Shows how often each parsing tier (cache, local extractor, AI, RegEx) answered a CV.
+    path('api/parse-cv/stats/', views.cv_parse_stats_api_view, name='api-parse-cv-stats'),
+
+    # Shows the database connections of our processes (staff only), to size PostgreSQL and the pools.
+    path('api/metrics/db/', views.db_connection_metrics_api_view, name='api-db-metrics'),
     
     # This endpoint will receive a list of user-approved/edited candidate data
     # and save them to the database in bulk.
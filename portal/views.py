@@ -1,6 +1,5 @@
 import json  # For working with JSON data format (used in our API view).
-import re    # For using regular expressions (used to split the AI's response).
-import requests # For making HTTP requests to external services (like the Hugging Face API).
+import httpx # The HTTP library of our AI calls; we catch its timeout error in the title view.
 import os  # For accessing environment variables (like API keys).
 # --- Django Core Libraries ---
 from django.views import View # The base class for creating class-based views.
@@ -14,15 +13,32 @@ from django.views.decorators.csrf import csrf_exempt # To bypass security checks
 from django.views.generic import TemplateView, CreateView, UpdateView, DeleteView, DetailView # Django's built-in "factories" for common tasks.
 from django.contrib import messages # To show messages to the user (like success or error notifications).
 
-from .tasks import process_single_cv # We import our new Celery task.
-import base64 # We need this to encode the file content.
-from django.core.files.base import ContentFile
+from .tasks import process_single_cv, process_cv_batch, store_candidate_cv_texts, bulk_apply_candidates, CV_PARSER_VERSION # We import our new Celery task.
+from .cv_cache import get_cached_parse # The cache of already parsed CVs.
+from .extraction import record_tier_win, get_tier_stats # The counters of which parsing tier answered each CV.
+from .db_connections import database_connection_stats # The numbers about our database connections.
+from .title_generation import generate_title, TitleGenerationError # Cached, de-duplicated job title generation.
+from .mixins import CompanyScopedMixin # Loads the objects of a view once per request, limited to the user's company.
+from .selectors import job_postings_page, candidates_page, job_posting_applications_page, InvalidCursor # The query-efficient, paginated loaders of our list pages.
+from .search import candidate_search_queryset, refresh_candidate_search_vectors, search_candidates # The PostgreSQL full-text candidate search.
+from .ranking import rank_candidates_for_job # Ranks the company's candidates against a job posting.
+from .fragment_cache import company_cache_version, invalidate_company_cache # Versioned keys of the cached page fragments.
+from .pipeline import apply_candidates_to_job, change_application_statuses # Bulk changes to applications that keep the pipeline counters right.
+from celery.result import AsyncResult # To look up the state and result of a queued Celery task by its id.
 from django.urls import reverse
+from django.utils.functional import SimpleLazyObject, cached_property # Values that are only calculated when they are first used.
+from django.template.loader import render_to_string # To render the rows of a dashboard page for the infinite scrolling API.
+from urllib.parse import urlencode
+from .staging import stage_upload, promote_staged, restore_staged # The staging area where uploaded CVs are written once.
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction # To run several database queries as one all-or-nothing unit.
 
 # --- Local Application Imports ---
 # Imports from other files within this 'portal' app. The '.' means 'from the same directory'.
 from .forms import CandidateForm, JobPostingForm, ApplicationForm, ApplicationStatusForm
-from .models import Candidate, Employee, JobPosting, Application
+from .models import Candidate, CandidateCVText, CompanyPipelineCounts, Employee, JobPosting, Application, PIPELINE_COUNT_FIELDS
+from accounts.models import Company
 
 
 class DashboardView(LoginRequiredMixin, TemplateView):
@@ -40,18 +56,125 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         
         try:
             employee = self.request.user.employee
-            context['company'] = employee.company
-            context['job_postings'] = JobPosting.objects.filter(company=employee.company)
-            context['candidates'] = Candidate.objects.filter(company=employee.company)
+            # The company is loaded together with its pipeline counters (see pipeline.py), in one query.
+            company = Company.objects.select_related('pipeline_counts').get(pk=employee.company_id)
+            context['company'] = company
+            # A company without any application has no row of counters yet: all of its counters are zero.
+            context['pipeline'] = getattr(company, 'pipeline_counts', None) or CompanyPipelineCounts(company=company)
+            # Only the first page of each table is rendered; the rest is loaded while the user scrolls.
+            # The selectors load each page with a single query, including the creator's username (see selectors.py).
+            # The tables are cached as HTML fragments, so their queries only run when the cache has no
+            # up-to-date copy for this company (see fragment_cache.py).
+            context['cache_version'] = company_cache_version(company.pk)
+            context['fragment_cache_timeout'] = settings.FRAGMENT_CACHE_TIMEOUT
+            context['job_postings'], context['job_postings_next_url'] = _lazy_dashboard_page(job_postings_page, company, 'api-dashboard-job-postings')
+            context['candidates'], context['candidates_next_url'] = _lazy_dashboard_page(candidates_page, company, 'api-dashboard-candidates')
         except Employee.DoesNotExist:
             # Safely handle cases where a user (like a superuser) has no employee profile.
             context['company'] = None
             context['job_postings'] = []
             context['candidates'] = []
+            # The template's {% cache %} tags still need these values. A timeout of 0 caches nothing,
+            # so the empty tables are simply rendered on every request.
+            context['cache_version'] = None
+            context['fragment_cache_timeout'] = 0
 
         context['user'] = self.request.user
         return context
 
+
+def _lazy_dashboard_page(page_loader, company, url_name):
+    """
+    Returns the rows and the next page URL of the first page of a dashboard table as "lazy" objects:
+    the query runs the first time the template uses one of them, and never if the template takes
+    the table from the fragment cache instead.
+    """
+    page = SimpleLazyObject(lambda: page_loader(company, page_size=settings.DASHBOARD_PAGE_SIZE))
+    return SimpleLazyObject(lambda: page[0]), SimpleLazyObject(lambda: _next_page_url(url_name, page[1]))
+
+
+def _next_page_url(url_name, next_cursor):
+    """
+    Builds the URL of the next page of a dashboard table, or None if there is no next page.
+    """
+    if next_cursor is None:
+        return None
+    return f"{reverse(url_name)}?{urlencode({'cursor': next_cursor})}"
+
+
+def _dashboard_page_response(request, load_page, template_name, context_name, url_name):
+    """
+    The shared logic of the dashboard's paginated table APIs: loads the page that starts
+    at the '?cursor=' parameter and answers with the rendered rows and the next page's URL.
+    """
+    try:
+        rows, next_cursor = load_page(
+            request.user.employee.company,
+            cursor=request.GET.get('cursor'),
+            page_size=settings.DASHBOARD_PAGE_SIZE
+        )
+    except InvalidCursor as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    return JsonResponse({
+        'html': render_to_string(template_name, {context_name: rows}, request=request),
+        'count': len(rows),
+        'next_url': _next_page_url(url_name, next_cursor),
+    })
+
+
+@login_required
+def dashboard_job_postings_api_view(request):
+    """
+    API endpoint that returns the next page of the dashboard's job postings table.
+    """
+    return _dashboard_page_response(request, job_postings_page, 'portal/includes/job_posting_rows.html', 'job_postings', 'api-dashboard-job-postings')
+
+
+@login_required
+def dashboard_candidates_api_view(request):
+    """
+    API endpoint that returns the next page of the dashboard's candidates table.
+    """
+    return _dashboard_page_response(request, candidates_page, 'portal/includes/candidate_rows.html', 'candidates', 'api-dashboard-candidates')
+
+
+@login_required
+def candidate_search_api_view(request):
+    """
+    API endpoint that searches the candidates of the user's company.
+    Example: /portal/api/candidates/search/?q=jane&page=2
+    The results are ranked (best match first) and returned one page at a time.
+    With '&exclude_job=<id>', candidates who already applied to that job posting are left out.
+    """
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+        exclude_job = int(request.GET['exclude_job']) if request.GET.get('exclude_job') else None
+    except ValueError:
+        return JsonResponse({'error': 'Invalid page number or job posting id.'}, status=400)
+
+    rows, has_next = search_candidates(
+        request.user.employee.company,
+        request.GET.get('q', ''),
+        page=page,
+        page_size=settings.CANDIDATE_SEARCH_PAGE_SIZE,
+        exclude_job_posting_id=exclude_job
+    )
+    return JsonResponse({
+        'results': [
+            {
+                'id': candidate.pk,
+                'first_name': candidate.first_name,
+                'last_name': candidate.last_name,
+                'email': candidate.email,
+                'url': reverse('candidate-update', kwargs={'pk': candidate.pk}),
+            }
+            for candidate in rows
+        ],
+        'page': page,
+        'has_next': has_next,
+    })
+
 """
 # --- Function-Based Equivalent for DashboardView ---
 @login_required
@@ -219,7 +342,14 @@ class CandidateCreateView(LoginRequiredMixin, CreateView):
         """
         form.instance.company = self.request.user.employee.company
         form.instance.created_by = self.request.user.employee
-        return super().form_valid(form)
+        response = super().form_valid(form)
+        # Make the new candidate findable by the candidate search (see search.py).
+        refresh_candidate_search_vectors([self.object.pk])
+        # A worker stores the text of the resume, so it never has to be parsed again.
+        if self.object.resume:
+            candidate_id = self.object.pk
+            transaction.on_commit(lambda: store_candidate_cv_texts.delay([candidate_id]))
+        return response
 
 """
 # --- Function-Based Equivalent for CandidateCreateView ---
@@ -268,7 +398,16 @@ class CandidateUpdateView(LoginRequiredMixin, UpdateView):
         Adds a success message when the form is successfully updated.
         """
         messages.success(self.request, f"Candidate profile for {self.object.first_name} {self.object.last_name} has been updated.")
-        return super().form_valid(form)
+        response = super().form_valid(form)
+        # A new resume means a new CV text; a removed resume means no CV text anymore.
+        if 'resume' in form.changed_data:
+            CandidateCVText.objects.filter(candidate=self.object).delete()
+            if self.object.resume:
+                candidate_id = self.object.pk
+                transaction.on_commit(lambda: store_candidate_cv_texts.delay([candidate_id]))
+        # The name or email may have changed, so the candidate search must see the new values.
+        refresh_candidate_search_vectors([self.object.pk])
+        return response
     
 #-----------------------------------------------------------------------------------------------------------
 class CandidateDeleteView(LoginRequiredMixin, DeleteView):
@@ -363,7 +502,55 @@ class JobPostingDetailView(LoginRequiredMixin, DetailView):
         # Get the default queryset (which is all JobPosting objects).
         queryset = super().get_queryset()
         # Filter it down to only the objects associated with the current user's company.
-        return queryset.filter(company=self.request.user.employee.company)
+        # Filtering by the id saves loading the company itself, and the creator shown on the page
+        # (created_by.user.username) is loaded in the same query as the posting.
+        return queryset.filter(company_id=self.request.user.employee.company_id).select_related('created_by__user')
+
+    def get_context_data(self, **kwargs):
+        """
+        Adds one page of the posting's applications, and the company's best matching candidates for
+        this posting (see ranking.py). Each list is loaded with ONE query, however long it is.
+        """
+        context = super().get_context_data(**kwargs)
+        try:
+            page = int(self.request.GET.get('page', 1))
+        except ValueError:
+            page = 1
+        context['applications'], context['page'], context['num_pages'] = job_posting_applications_page(
+            self.object, page=page, page_size=settings.JOB_APPLICATIONS_PAGE_SIZE
+        )
+        # Both lists are cached as HTML fragments (see fragment_cache.py). They are only loaded when
+        # the template renders them, i.e. when the cache has no up-to-date copy for this company.
+        context['cache_version'] = company_cache_version(self.object.company_id)
+        context['fragment_cache_timeout'] = settings.FRAGMENT_CACHE_TIMEOUT
+        context['ranked_candidates'] = SimpleLazyObject(lambda: self._ranking[0])
+        context['ranking_pending'] = SimpleLazyObject(lambda: self._ranking[1])
+        return context
+
+    @cached_property
+    def _ranking(self):
+        """
+        Returns (candidates, pending): the candidates that best match this posting, best first, each
+        with a 'match_percent'. While the company's ranking index is still being built (see ranking.py),
+        'pending' is True and the first candidates with a CV are returned in name order, without a score.
+        """
+        candidates = Candidate.objects.filter(company_id=self.object.company_id).only('first_name', 'last_name', 'email', 'resume')
+        ranking = rank_candidates_for_job(
+            self.object, limit=settings.JOB_RANKING_TOP_N, cache_timeout=settings.JOB_RANKING_CACHE_TIMEOUT
+        )
+        if ranking is None:
+            unranked = candidates.filter(cv_text__isnull=False).order_by('last_name', 'first_name', 'id')[:settings.JOB_RANKING_TOP_N]
+            return list(unranked), True
+
+        candidates = candidates.in_bulk([candidate_id for candidate_id, score in ranking])
+        ranked_candidates = []
+        for candidate_id, score in ranking:
+            # A candidate may have been deleted after the ranking was cached.
+            if candidate_id in candidates:
+                candidate = candidates[candidate_id]
+                candidate.match_percent = round(score * 100)
+                ranked_candidates.append(candidate)
+        return ranked_candidates, False
 
 
 """
@@ -391,12 +578,16 @@ def job_posting_detail_function(request, pk):
 #-----------------------------------------------------------------------------------------------------------
 
 # These decorators run before the view function. They are like security guards.
+# Both guards also work with 'async' views like this one.
 @csrf_exempt      # This guard allows requests from our JavaScript without a standard form CSRF token.
 @login_required   # This guard checks if the user is logged in before allowing them to proceed.
-def generate_job_title_view(request):
+async def generate_job_title_view(request):
     """
     Acts as a private API endpoint. It does not render a page but
     communicates with an external AI service and returns data (JSON).
+
+    PERFORMANCE: This is an ASYNC view. While it waits for the AI service, the worker process is
+    free to serve other requests, instead of being blocked.
     """
     # First, we only allow this function to work if data is being SENT to it.
     if request.method == 'POST':
@@ -409,67 +600,23 @@ def generate_job_title_view(request):
             # Safely get the 'description' value from the data. If it doesn't exist, use an empty string.
             description = data.get('description', '')
 
-            # If the user didn't send any description text, return an error immediately.
-            if not description:
+            # If the user didn't send any description text (or only spaces), return an error immediately.
+            if not isinstance(description, str) or not description.strip():
                 return JsonResponse({'error': 'Description cannot be empty.'}, status=400)
 
-            # This is the data package (payload) we will send to the Hugging Face API.
-            # It contains the text we want the AI to process.
-            api_payload = {
-                "inputs": description,
-                "parameters": {"max_length": 50, "min_length": 5}
-            }
-            
-            # This is our "ID card" for the API. It proves we have permission to use the service.
-            # The secret key is read safely from settings.py, which reads it from the .env file.
-            headers = {"Authorization": f"Bearer {settings.HUGGING_FACE_API_KEY}"}
-
-            # This is where our server talks to the outside world.
-            # It sends our payload and headers to the AI service and waits for a response.
-            # The 'timeout=30' prevents our server from waiting forever if the AI is slow.
-            response = requests.post(
-                settings.AI_SUMMARIZATION_MODEL_URL, 
-                headers=headers, 
-                json=api_payload,
-                timeout=30
-            )
-
-            # This is a smart way to handle API errors. If the response is not successful (e.g., 404, 500),
-            # this block tries to give a more user-friendly error message.
-            if response.status_code != 200:
-                try:
-                    error_data = response.json()
-                    api_error_message = error_data.get('error', 'Unknown API error.')
-                    # Specifically check if the error is because the AI model is loading.
-                    if 'is currently loading' in api_error_message:
-                        estimated_time = error_data.get('estimated_time', 20)
-                        user_message = f"The AI model is currently warming up. Please try again in {estimated_time:.0f} seconds."
-                        return JsonResponse({'error': user_message}, status=503) # 503 means "Service Unavailable"
-                    return JsonResponse({'error': f"API Error: {api_error_message}"}, status=response.status_code)
-                except json.JSONDecodeError:
-                    return JsonResponse({'error': f"API returned a non-JSON response: {response.text}"}, status=response.status_code)
-
-            # If the request was successful, parse the JSON response from the AI.
-            result = response.json()
-            
-            # Prepare a default title, just in case the AI fails to generate one.
-            generated_title = "New Job Posting"
-            # Safely check if the response is in the expected format (a list with at least one item).
-            if result and isinstance(result, list) and len(result) > 0:
-                # Safely get the 'summary_text' from the response.
-                title_from_api = result[0].get('summary_text')
-                if title_from_api:
-                    # This is our logic to fix the "long sentence" problem.
-                    # We split the summary into sentences and take only the first one.
-                    sentences = re.split(r'(?<=[.!?])\s+', title_from_api)
-                    if sentences and sentences[0]:
-                        generated_title = sentences[0]
+            # The title comes from the cache if this description was seen before. Otherwise ONE request
+            # goes to the AI service, even when the same description is asked for several times at once,
+            # and a model that is still warming up is waited for (see title_generation.py).
+            generated_title = await generate_title(description)
 
             # Send the final, cleaned title back to the JavaScript that made the request.
-            return JsonResponse({'title': generated_title.strip()})
+            return JsonResponse({'title': generated_title})
 
+        # The AI service answered with an error we could not get around (e.g. it is still warming up).
+        except TitleGenerationError as e:
+            return JsonResponse({'error': e.message}, status=e.status)
         # This catches specific errors, like the request taking too long.
-        except requests.exceptions.Timeout:
+        except httpx.TimeoutException:
             return JsonResponse({'error': 'The request to the AI model timed out. The model might be loading. Please try again.'}, status=504)
         # This is a general catch-all for any other unexpected errors.
         except Exception as e:
@@ -479,9 +626,11 @@ def generate_job_title_view(request):
     return JsonResponse({'error': 'Invalid request method.'}, status=405)
 
 #-----------------------------------------------------------------------------------------------------------
-class ApplicationCreateView(LoginRequiredMixin, CreateView):
+class ApplicationCreateView(LoginRequiredMixin, CompanyScopedMixin, CreateView):
     """
     Handles the creation of a new Application, linking a Candidate to a JobPosting.
+    The job posting is loaded ONCE per request, and only if it belongs to the user's company
+    (see CompanyScopedMixin in mixins.py).
     """
     model = Application
     form_class = ApplicationForm
@@ -494,8 +643,7 @@ class ApplicationCreateView(LoginRequiredMixin, CreateView):
         available for use directly within the template.
         """
         context = super().get_context_data(**kwargs)
-        # Get the JobPosting object from the URL's pk and add it to the context.
-        context['job_posting'] = get_object_or_404(JobPosting, pk=self.kwargs['pk'])
+        context['job_posting'] = self.get_job_posting()
         return context
 
     def get_form_kwargs(self):
@@ -504,7 +652,7 @@ class ApplicationCreateView(LoginRequiredMixin, CreateView):
         __init__ method, so the form can correctly filter the candidate list.
         """
         kwargs = super().get_form_kwargs()
-        kwargs['job_posting'] = get_object_or_404(JobPosting, pk=self.kwargs['pk'])
+        kwargs['job_posting'] = self.get_job_posting()
         return kwargs
 
     def form_valid(self, form):
@@ -512,7 +660,7 @@ class ApplicationCreateView(LoginRequiredMixin, CreateView):
         This method automatically sets the 'job_posting' for the new application
         before it is saved to the database.
         """
-        job_posting = get_object_or_404(JobPosting, pk=self.kwargs['pk'])
+        job_posting = self.get_job_posting()
         form.instance.job_posting = job_posting
         
         messages.success(self.request, f"Successfully applied {form.instance.candidate.first_name} to the job '{job_posting.title}'.")
@@ -549,8 +697,8 @@ class ApplicationUpdateView(LoginRequiredMixin, UpdateView):
         """
         context = super().get_context_data(**kwargs)
         # The 'object' is automatically provided by DetailView/UpdateView.
-        # We add it to the context with a more descriptive name.
-        context['application'] = self.get_object()
+        # We add it to the context with a more descriptive name (without loading it a second time).
+        context['application'] = self.object
         return context
 
     def get_queryset(self):
@@ -578,6 +726,141 @@ class ApplicationUpdateView(LoginRequiredMixin, UpdateView):
         messages.success(self.request, f"Status for {self.object.candidate.first_name}'s application has been updated.")
         return super().form_valid(form)
 
+#-----------------------------------------------------------------------------------------------------------
+# ==============================================================================
+# API VIEW: Bulk Applications
+# Description: Applies a whole shortlist of candidates to one job posting in a
+#              single request, instead of one form submission per candidate.
+# ==============================================================================
+@login_required
+def bulk_apply_api_view(request, pk):
+    """
+    API endpoint that applies many candidates to a job posting at once.
+    It expects a JSON body with EITHER a list of candidate ids:
+        {"candidate_ids": [12, 15, 18]}
+    OR a candidate search, whose every match is applied ("apply everyone who matches 'django'"):
+        {"search": "django"}
+
+    Candidates who already applied are skipped, and ids that are not candidates of the user's
+    company are reported as invalid. Short lists are applied right away and the counts are returned;
+    lists longer than BULK_APPLY_SYNC_LIMIT are handed to a Celery worker, and the response
+    contains the URL where the result can be polled.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request method.'}, status=405)
+
+    company_id = request.user.employee.company_id
+    # SECURITY FEATURE: only postings of the user's own company can be used.
+    job_posting = JobPosting.objects.filter(pk=pk, company_id=company_id).only('id').first()
+    if job_posting is None:
+        return JsonResponse({'error': 'Job posting not found.'}, status=404)
+
+    try:
+        data = json.loads(request.body)
+        if data.get('search'):
+            queryset = candidate_search_queryset(request.user.employee.company, str(data['search']))
+            requested_ids = list(queryset.values_list('id', flat=True)[:settings.BULK_APPLY_MAX_CANDIDATES + 1]) if queryset is not None else []
+        else:
+            candidate_ids = data.get('candidate_ids', [])
+            # A text like "123" must not be read as the ids 1, 2 and 3.
+            if not isinstance(candidate_ids, list):
+                raise TypeError('"candidate_ids" must be a list.')
+            requested_ids = [int(candidate_id) for candidate_id in candidate_ids]
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'error': 'Send a JSON object with a "candidate_ids" list of numbers or a "search" text.'}, status=400)
+
+    if len(requested_ids) > settings.BULK_APPLY_MAX_CANDIDATES:
+        return JsonResponse({'error': f'At most {settings.BULK_APPLY_MAX_CANDIDATES} candidates can be applied at once.'}, status=400)
+
+    # Step 1: Keep only the candidates of the user's company, with ONE query.
+    requested_ids = list(dict.fromkeys(requested_ids))
+    valid_ids = set(Candidate.objects.filter(company_id=company_id, id__in=requested_ids).values_list('id', flat=True))
+    candidate_ids = [candidate_id for candidate_id in requested_ids if candidate_id in valid_ids]
+    invalid_count = len(requested_ids) - len(candidate_ids)
+
+    # Step 2a: A very long list is applied by a worker, so the request returns right away.
+    if len(candidate_ids) > settings.BULK_APPLY_SYNC_LIMIT:
+        task = bulk_apply_candidates.delay(job_posting.pk, candidate_ids, company_id)
+        return JsonResponse({
+            'status': 'queued',
+            'task_id': task.id,
+            'invalid': invalid_count,
+            'status_url': reverse('api-bulk-apply-status', kwargs={'pk': job_posting.pk, 'task_id': task.id}),
+        }, status=202)
+
+    # Step 2b: Otherwise we apply them now.
+    result = apply_candidates_to_job(job_posting.pk, candidate_ids)
+    return JsonResponse({'status': 'done', 'invalid': invalid_count, **result})
+
+
+@login_required
+def bulk_application_status_api_view(request):
+    """
+    API endpoint that moves many applications to a new status in one request, e.g. to reject
+    every remaining applicant when a role is closed. It expects a JSON body with the new status and
+    EITHER a list of application ids OR a job posting, whose applications are all changed:
+        {"status": "Rejected", "application_ids": [31, 32, 40]}
+        {"status": "Rejected", "job_posting_id": 7}
+
+    Only the changes in ALLOWED_STATUS_TRANSITIONS are made (e.g. a hire is never undone).
+    The response reports the outcome of every application (see change_application_statuses()).
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request method.'}, status=405)
+
+    company_id = request.user.employee.company_id
+    try:
+        data = json.loads(request.body)
+        new_status = data.get('status')
+        if data.get('job_posting_id') is not None:
+            # SECURITY FEATURE: the applications are looked up within the user's own company only.
+            application_ids = list(
+                Application.objects
+                .filter(job_posting_id=int(data['job_posting_id']), job_posting__company_id=company_id)
+                .order_by('id')
+                .values_list('id', flat=True)[:settings.BULK_STATUS_MAX_APPLICATIONS + 1]
+            )
+        else:
+            application_ids = data.get('application_ids', [])
+            # A text like "123" must not be read as the ids 1, 2 and 3.
+            if not isinstance(application_ids, list):
+                raise TypeError('"application_ids" must be a list.')
+            application_ids = [int(application_id) for application_id in application_ids]
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'error': 'Send a JSON object with a "status" and an "application_ids" list or a "job_posting_id".'}, status=400)
+
+    # The status must be checked to be text first: a list or a dict cannot be looked up in PIPELINE_COUNT_FIELDS.
+    if not isinstance(new_status, str) or new_status not in PIPELINE_COUNT_FIELDS:
+        return JsonResponse({'error': f'Unknown status. Use one of: {", ".join(PIPELINE_COUNT_FIELDS)}.'}, status=400)
+    if len(application_ids) > settings.BULK_STATUS_MAX_APPLICATIONS:
+        return JsonResponse({'error': f'At most {settings.BULK_STATUS_MAX_APPLICATIONS} applications can be changed at once.'}, status=400)
+
+    results = change_application_statuses(company_id, application_ids, new_status)
+    return JsonResponse({
+        'status': new_status,
+        'updated': sum(1 for result in results if result['outcome'] == 'updated'),
+        'results': results,
+    })
+
+
+@login_required
+def bulk_apply_status_api_view(request, pk, task_id):
+    """
+    API endpoint that returns the result of a queued bulk application:
+    {"status": "pending"} while the worker is busy, then {"status": "done", "created": .., "skipped": ..}.
+    """
+    task_result = AsyncResult(task_id)
+    if not task_result.ready():
+        return JsonResponse({'status': 'pending'})
+    if task_result.failed():
+        return JsonResponse({'status': 'failed', 'error': 'The candidates could not be applied.'})
+
+    # SECURITY FEATURE: the task records its company; other companies cannot read its result.
+    result_data = task_result.result
+    if not isinstance(result_data, dict) or result_data.get('company_id') != request.user.employee.company_id:
+        return JsonResponse({'error': 'Task not found.'}, status=404)
+    return JsonResponse({'status': 'done', 'created': result_data['created'], 'skipped': result_data['skipped']})
+
 #-----------------------------------------------------------------------------------------------------------
 """
 # We use a class-based view (CBV) for better organization of GET and POST logic.
@@ -655,8 +938,28 @@ class BulkCVUploadView(LoginRequiredMixin, View):
         This method is called when a user navigates to this page with a GET request.
         Its only job is to render and return the corresponding HTML template.
         All the complex logic is now handled by the JavaScript on that page and the API views below.
+        The upload limits from settings.py are passed to the page's JavaScript.
         """
-        return render(request, 'portal/bulk_cv_upload.html')
+        context = {
+            'upload_batch_size': settings.CV_UPLOAD_BATCH_SIZE,
+            'upload_concurrency': settings.CV_UPLOAD_CONCURRENCY,
+        }
+        return render(request, 'portal/bulk_cv_upload.html', context)
+
+    def post(self, request, *args, **kwargs):
+        """
+        A fallback for browsers without JavaScript: the plain form submits the files here.
+        There is no review step in this case, so every CV is queued to be saved
+        as a candidate directly, and the user is sent back to the dashboard.
+        """
+        cv_files = request.FILES.getlist('cv_files')
+        if not cv_files:
+            messages.error(request, "No files were selected for upload.")
+            return redirect('candidate-bulk-upload')
+
+        _queue_cv_files(request, cv_files, create_candidate=True)
+        messages.success(request, f"{len(cv_files)} CVs have been successfully queued for processing. You can continue working.")
+        return redirect('dashboard')
 
 #-------------------------------------------------------------------------------------------
 
@@ -673,9 +976,10 @@ class BulkCVUploadView(LoginRequiredMixin, View):
 @login_required
 def parse_cv_api_view(request):
     """
-    API endpoint that receives a single CV file, processes it to extract
-    information, but DOES NOT save it to the database.
-    It returns the extracted information as JSON for the frontend JavaScript.
+    API endpoint that receives a single CV file and queues it for parsing,
+    but DOES NOT save it to the database.
+    It returns a job id right away; the frontend JavaScript then polls the
+    status endpoint ('api-parse-cv-status') until the extracted information is ready.
     """
     # Step 1: Check if the request is a POST request and contains a file. This is a security and validation step.
     if request.method == 'POST' and request.FILES.get('cv_file'):
@@ -683,35 +987,212 @@ def parse_cv_api_view(request):
         # Step 2: Get the file object from the request.
         cv_file = request.FILES['cv_file']
         
-        # Step 3: Read the binary content of the file and encode it into a Base64 string.
-        # Base64 is a safe way to transport binary data (like a PDF) within text-based systems like JSON or Celery tasks.
-        file_content_b64 = base64.b64encode(cv_file.read()).decode('utf-8')
+        # Step 3: Write the file once into the staging area and send the work to a Celery worker.
+        # The task only gets a short 'staged key' (the SHA-256 hash of the file), and queuing it returns
+        # immediately, so the web worker is not blocked by the PDF extraction and the AI round trip.
+        # We explicitly tell it NOT to create a candidate.
+        # CRITICAL: create_candidate=False ensures we only parse the data, not save it.
+        job = _queue_cv_files(request, [cv_file], create_candidate=False)[0]
         
-        # Step 4: Call our main background task/function ('process_single_cv') to do the actual work.
-        # This view acts as a "bridge" to our core logic. We explicitly tell it NOT to create a candidate.
-        result_data = process_single_cv(
-            file_content_b64,
-            cv_file.name,
-            request.user.employee.company.id,
-            request.user.id,
-            create_candidate=False  # CRITICAL: This ensures we only parse the data, not save it.
-        )
-        
-        # Step 5: Check the result from the task.
-        if isinstance(result_data, dict) and 'error' not in result_data:
-            # If the result is a dictionary without an error key, it was successful.
-            # Return the data as a JSON response with a 200 OK status.
-            return JsonResponse(result_data)
-        else:
-            # If the task returned an error, package it into a JSON error response.
-            error_message = result_data.get('error') if isinstance(result_data, dict) else str(result_data)
-            # Return with a status of 400 (Bad Request) to indicate a client-side or processing error.
-            return JsonResponse({'error': error_message, 'original_filename': cv_file.name}, status=400)
+        # Step 4: Return the job id with a 202 (Accepted) status. The parsed fields are not ready yet,
+        # unless this PDF was already in the parse cache.
+        return JsonResponse(job, status=200 if job.get('status') == 'done' else 202)
             
     # If the request is not POST or doesn't have a file, return a generic error.
     return JsonResponse({'error': 'Invalid request.'}, status=400)
 
 
+def _cv_parse_job_payload(job_id, original_filename):
+    """
+    Builds the JSON body returned when a CV parsing job has been queued.
+    It tells the JavaScript which job to follow and where to ask for its status.
+    """
+    return {
+        'job_id': job_id,
+        'status_url': reverse('api-parse-cv-status', kwargs={'job_id': job_id}),
+        'original_filename': original_filename,
+    }
+
+
+# ==============================================================================
+# API VIEW 1b: The CV Parsing Job Status
+# Description: Polled by the JavaScript after a CV has been queued. It reports
+#              whether the Celery task is still running and, once it has finished,
+#              returns the parsed fields (or the error).
+# ==============================================================================
+@login_required
+def cv_parse_status_api_view(request, job_id):
+    """
+    API endpoint that returns the state of a queued CV parsing job.
+    - While the task is waiting or running: {'status': 'pending'}
+    - When it has finished successfully:    {'status': 'done', 'result': {...}}
+    - When it has failed:                   {'status': 'failed', 'error': '...'}
+    """
+    job_status = _cv_parse_job_status(job_id, request.user.employee.company.id)
+    if job_status is None:
+        return JsonResponse({'error': 'Job not found.'}, status=404)
+    return JsonResponse(job_status)
+
+
+@login_required
+def cv_parse_batch_status_api_view(request):
+    """
+    API endpoint that returns the state of many CV parsing jobs at once.
+    The bulk upload page sends all of its unfinished job ids in one request
+    (e.g. ?job_id=a&job_id=b), instead of polling every job separately.
+    """
+    # We cap the number of ids per request so one call cannot ask for an unlimited amount of work.
+    job_ids = request.GET.getlist('job_id')[:settings.CV_STATUS_BATCH_LIMIT]
+    company_id = request.user.employee.company.id
+
+    jobs = {}
+    for job_id in job_ids:
+        # A job that belongs to another company is reported exactly like an unknown one.
+        jobs[job_id] = _cv_parse_job_status(job_id, company_id) or {'status': 'failed', 'job_id': job_id, 'error': 'Job not found.'}
+    return JsonResponse({'jobs': jobs})
+
+
+def _cv_parse_job_status(job_id, company_id):
+    """
+    Looks up one CV parsing job and builds its status dictionary.
+    Returns None if the job's result belongs to a different company.
+    """
+    # A job id like '<task id>:<n>' is the n-th file of a 'process_cv_batch' task.
+    task_id, _separator, position = job_id.partition(':')
+
+    # AsyncResult reads the task's state from our Celery result backend (Redis).
+    # It does not block; it only looks at what the worker has stored so far.
+    task_result = AsyncResult(task_id)
+
+    if not task_result.ready():
+        return {'status': 'pending', 'job_id': job_id}
+
+    # If the task raised an exception inside the worker, Celery marks it as failed.
+    if task_result.failed():
+        return {'status': 'failed', 'job_id': job_id, 'error': 'The CV could not be processed.'}
+
+    result_data = task_result.result
+
+    # A batch task returns a list of results; we pick the one of this file.
+    if position:
+        if not position.isdigit() or not isinstance(result_data, list) or int(position) >= len(result_data):
+            return None
+        result_data = result_data[int(position)]
+
+    # SECURITY FEATURE: The task records which company the CV was uploaded for.
+    # A user can only read the results of jobs that belong to their own company.
+    if not isinstance(result_data, dict) or result_data.get('company_id') != company_id:
+        return None
+
+    # The company id is only needed for the check above; we don't send it to the browser.
+    result_data = {key: value for key, value in result_data.items() if key != 'company_id'}
+
+    if 'error' in result_data:
+        return {'status': 'failed', 'job_id': job_id, 'error': result_data['error']}
+
+    return {'status': 'done', 'job_id': job_id, 'result': result_data}
+
+
+@login_required
+def cv_parse_stats_api_view(request):
+    """
+    API endpoint that shows how often each parsing tier produced a CV's answer:
+    the parse cache, the fast local extractor, the AI or the RegEx fallback.
+    Every CV answered by 'cache' or 'local' is an AI request we did not have to pay for.
+    """
+    return JsonResponse(get_tier_stats())
+
+
+@login_required
+def db_connection_metrics_api_view(request):
+    """
+    API endpoint that shows the database connections: the connection pool of the process that
+    answers (it is different for every Gunicorn worker), and the connections that ALL our web and
+    Celery processes hold on the PostgreSQL server, grouped by role and state.
+    """
+    # SECURITY FEATURE: these numbers are about the whole server, not about one company,
+    # so only staff members may see them.
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Only staff members can see the database metrics.'}, status=403)
+    return JsonResponse(database_connection_stats())
+
+
+# ==============================================================================
+# API VIEW 1c: The Batch CV Parser (For the Bulk Upload feature)
+# Description: Receives MANY CV files in one request and fans them out to the
+#              Celery workers in batches; each batch is parsed with one AI request.
+# The bulk upload page sends its CSRF token in the 'X-CSRFToken' header, so this endpoint keeps Django's CSRF check.
+# ==============================================================================
+@login_required
+def parse_cv_batch_api_view(request):
+    """
+    API endpoint that receives several CV files (sent as 'cv_files'), queues the
+    parsing tasks and returns one job id per file right away.
+    Like 'parse_cv_api_view', it only parses; nothing is saved to the database.
+    """
+    cv_files = request.FILES.getlist('cv_files')
+    if request.method != 'POST' or not cv_files:
+        return JsonResponse({'error': 'Invalid request. At least one file must be provided.'}, status=400)
+
+    jobs = _queue_cv_files(request, cv_files, create_candidate=False)
+    return JsonResponse({'jobs': jobs}, status=202)
+
+
+def _queue_cv_files(request, cv_files, create_candidate):
+    """
+    Stages every uploaded file and sends it to the Celery workers.
+    - When candidates are created, every file gets its own 'process_single_cv' task.
+    - When we only parse (the review flow), the files are grouped into batches of
+      CV_LLM_BATCH_SIZE and each batch becomes ONE 'process_cv_batch' task, which asks
+      the AI about all of its CVs in a single request. Each file in a batch gets the job id
+      '<task id>:<position in the batch>', so it can still be followed on its own.
+    All tasks are queued before any of them has to finish, so the files are parsed
+    in parallel by however many Celery workers are running.
+    Returns the job payloads (job id, status URL, filename) in the same order as the files.
+    """
+    company_id = request.user.employee.company.id
+    jobs = [None] * len(cv_files)
+    to_parse = [] # (position in 'cv_files', staged key) of the files that still need a task.
+    for index, cv_file in enumerate(cv_files):
+        staged_key = stage_upload(cv_file, company_id)
+
+        # If this exact PDF was parsed before, we answer straight from the parse cache:
+        # no task, no waiting and no AI cost. (Saving a candidate still goes through the task.)
+        cached_fields = None if create_candidate else get_cached_parse(staged_key, CV_PARSER_VERSION)
+        if cached_fields is not None:
+            record_tier_win('cache')
+            jobs[index] = {
+                'job_id': None,
+                'status': 'done',
+                'result': {**cached_fields, 'staged_key': staged_key, 'original_filename': cv_file.name},
+                'original_filename': cv_file.name,
+            }
+            continue
+        to_parse.append((index, staged_key))
+
+    batch_size = 1 if create_candidate else settings.CV_LLM_BATCH_SIZE
+    for start in range(0, len(to_parse), batch_size):
+        batch = to_parse[start:start + batch_size]
+
+        # A batch of one file is simply a normal single-CV task.
+        if len(batch) == 1:
+            index, staged_key = batch[0]
+            task = process_single_cv.delay(
+                staged_key,
+                cv_files[index].name,
+                company_id,
+                request.user.id,
+                create_candidate=create_candidate
+            )
+            jobs[index] = _cv_parse_job_payload(task.id, cv_files[index].name)
+            continue
+
+        task = process_cv_batch.delay([[staged_key, cv_files[index].name] for index, staged_key in batch], company_id)
+        for position, (index, staged_key) in enumerate(batch):
+            jobs[index] = _cv_parse_job_payload(f"{task.id}:{position}", cv_files[index].name)
+    return jobs
+
+
 # ==============================================================================
 # API VIEW 2: The Candidate Saver (For the Bulk Upload feature)
 # Description: This API endpoint receives the final, user-approved list of candidates
@@ -723,44 +1204,108 @@ def save_candidates_api_view(request):
     """
     API endpoint that receives a list of approved candidate data in JSON format,
     creates the Candidate objects, and saves their resume files.
+
+    The whole list is saved as one batch: one query finds the emails that already exist,
+    one 'bulk_create' inserts all the new candidates, and everything runs inside a single
+    transaction, so a failure never leaves half of the list saved.
+    The response contains a report with the outcome of every row, in the order they were sent.
     """
     if request.method == 'POST':
         try:
             # Step 1: Parse the JSON data sent in the body of the request from our JavaScript.
             data = json.loads(request.body)
             candidates_to_save = data.get('candidates', [])
-            
-            # Step 2: Loop through each candidate object in the received list.
-            for cand_data in candidates_to_save:
-                email = cand_data.get('email')
-                
-                # Step 3: Check if a candidate with this email already exists for this company to avoid duplicates.
-                if email and not Candidate.objects.filter(email=email, company=request.user.employee.company).exists():
-                    
-                    # Step 4: Create a new Candidate object in the database with the provided data.
-                    new_candidate = Candidate.objects.create(
-                        company=request.user.employee.company,
-                        first_name=cand_data.get('first_name', 'Unknown'),
-                        last_name=cand_data.get('last_name', 'Unknown'),
-                        email=email,
-                        created_by=request.user.employee
-                    )
-                    
-                    # Step 5: Handle the resume file.
-                    file_content_b64 = cand_data.get('file_content_b64')
-                    original_filename = cand_data.get('original_filename', 'resume.pdf')
-                    
-                    if file_content_b64:
-                        # Decode the Base64 string back into its original binary bytes.
-                        file_content = base64.b64decode(file_content_b64)
-                        # Use Django's 'ContentFile' to treat these bytes as a file and save it to the 'resume' field.
-                        new_candidate.resume.save(original_filename, ContentFile(file_content), save=True)
-
-            # Step 6: After the loop finishes, return a successful JSON response.
-            # This response includes a 'redirect_url', which the JavaScript will use to navigate the user to the dashboard.
+            employee = request.user.employee
+            company = employee.company
+
+            # Step 2: Validate every row and prepare its entry in the report.
+            results = []
+            valid_rows = []
+            for index, cand_data in enumerate(candidates_to_save):
+                email = (cand_data.get('email') or '').strip()
+                result = {'index': index, 'email': email}
+                results.append(result)
+                try:
+                    validate_email(email)
+                except ValidationError:
+                    result.update(status='error', message='A valid email address is required.')
+                    continue
+                valid_rows.append((result, cand_data, email))
+
+            # Step 3: Check for duplicates with ONE query for the whole list.
+            # Candidate emails are unique across the whole table, so we must check all companies,
+            # otherwise the INSERT below would fail on the database constraint.
+            existing_emails = set(
+                Candidate.objects.filter(email__in=[email for _, _, email in valid_rows]).values_list('email', flat=True)
+            )
+
+            # Step 4: Build the new Candidate objects in memory and move their resume files out of the staging area.
+            new_candidates = []
+            promoted_files = [] # (staged_key, resume_name) pairs, so we can undo the moves if the INSERT fails.
+            for result, cand_data, email in valid_rows:
+                if email in existing_emails:
+                    result.update(status='skipped', message='A candidate with this email already exists.')
+                    continue
+                # This also catches the same email appearing twice in the list.
+                existing_emails.add(email)
+
+                resume_name = None
+                staged_key = cand_data.get('staged_key')
+                if staged_key:
+                    try:
+                        resume_name = promote_staged(company.id, staged_key, cand_data.get('original_filename', 'resume.pdf'))
+                    except (ValueError, FileNotFoundError) as e:
+                        result.update(status='error', message=str(e))
+                        continue
+                    promoted_files.append((staged_key, resume_name))
+
+                new_candidates.append(Candidate(
+                    company=company,
+                    first_name=cand_data.get('first_name') or 'Unknown',
+                    last_name=cand_data.get('last_name') or 'Unknown',
+                    email=email,
+                    created_by=employee,
+                    resume=resume_name
+                ))
+                result['status'] = 'created'
+
+            # Step 5: Insert all the new candidates at once, inside a single transaction.
+            try:
+                with transaction.atomic():
+                    created_candidates = Candidate.objects.bulk_create(new_candidates, batch_size=500)
+                    # bulk_create() skips save(), so we fill in the search vectors of all new rows with one UPDATE.
+                    created_ids = [candidate.pk for candidate in created_candidates]
+                    refresh_candidate_search_vectors(created_ids)
+                    # bulk_create() sends no signals either, so we mark the company's cached pages as outdated ourselves.
+                    invalidate_company_cache(company.pk)
+                    # Once the rows are really saved, a worker stores the text of their CVs (see store_cv_texts()).
+                    if created_ids:
+                        transaction.on_commit(lambda: store_candidate_cv_texts.delay(created_ids))
+            except Exception:
+                # The database rolled everything back, so we also put the files back into the staging area.
+                for staged_key, resume_name in promoted_files:
+                    restore_staged(company.id, staged_key, resume_name)
+                raise
+
+            # Step 6: Add the new ids to the report. On PostgreSQL, bulk_create fills in the primary keys.
+            candidates_by_email = {candidate.email: candidate for candidate in created_candidates}
+            for result in results:
+                if result.get('status') == 'created':
+                    result['id'] = candidates_by_email[result['email']].pk
+
+            created_count = len(created_candidates)
+            skipped_count = sum(1 for result in results if result['status'] == 'skipped')
+            failed_count = sum(1 for result in results if result['status'] == 'error')
+
+            # Step 7: Return the report. It also includes a 'redirect_url',
+            # which the JavaScript will use to navigate the user to the dashboard.
             return JsonResponse({
                 'success': True,
-                'message': f'{len(candidates_to_save)} candidates were processed.',
+                'message': f'{created_count} candidates were created, {skipped_count} skipped, {failed_count} failed.',
+                'created': created_count,
+                'skipped': skipped_count,
+                'failed': failed_count,
+                'results': results,
                 'redirect_url': reverse('dashboard')
             })
 
@@ -780,31 +1325,22 @@ def save_candidates_api_view(request):
 @login_required
 def parse_cv_for_autofill_api(request):
     """
-    API endpoint that receives a single CV file, calls our existing AI task to parse it,
-    and returns the extracted data as JSON to the form's JavaScript.
+    API endpoint that receives a single CV file and queues our existing AI task to parse it.
+    It returns a job id; the form's JavaScript polls the status endpoint and fills the fields
+    once the extracted data is ready.
     It is architecturally clean to have a separate endpoint for this distinct feature.
     """
     # Step 1: Check for a POST request with a file.
     if request.method == 'POST' and request.FILES.get('cv_file'):
         
-        # Step 2: Get the file and encode it to Base64.
+        # Step 2: Get the file.
         cv_file = request.FILES['cv_file']
-        file_content_b64 = base64.b64encode(cv_file.read()).decode('utf-8')
         
         # Step 3: REUSE our main 'process_single_cv' task. This is efficient and avoids code duplication.
-        result_data = process_single_cv(
-            file_content_b64=file_content_b64,
-            original_filename=cv_file.name,
-            company_id=request.user.employee.company.id,
-            created_by_id=request.user.id,
-            create_candidate=False # Again, we ensure no candidate is created here.
-        )
+        # The file is staged and the task runs on a Celery worker, so this request returns immediately.
+        job = _queue_cv_files(request, [cv_file], create_candidate=False)[0] # Again, we ensure no candidate is created here.
         
-        # Step 4: Check the result and return the appropriate JSON response.
-        if isinstance(result_data, dict) and 'error' not in result_data:
-            return JsonResponse(result_data)
-        else:
-            error_message = result_data.get('error') if isinstance(result_data, dict) else str(result_data)
-            return JsonResponse({'error': error_message}, status=400)
+        # Step 4: Return the job id so the JavaScript can follow the job (or the cached result straight away).
+        return JsonResponse(job, status=200 if job.get('status') == 'done' else 202)
             
-    return JsonResponse({'error': 'Invalid request. A file must be provided.'}, status=400)
\ No newline at end of file
+    return JsonResponse({'error': 'Invalid request. A file must be provided.'}, status=400)